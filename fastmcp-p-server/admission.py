@@ -0,0 +1,157 @@
+"""
+アドミッション制御
+セッションごとのレート制限と、セッション間で公平なツール実行の順番待ち
+
+    bucket = TokenBucket(rate=50, burst=100, now=loop.time())
+    retry_after = bucket.take(loop.time())   # 0 なら受け付け、それ以外は待つべき秒数
+
+    scheduler = FairScheduler(capacity=64, max_queued=1024, max_queued_per_owner=32)
+    await scheduler.acquire(session_id)      # あふれたら Overloaded
+    try:
+        ...
+    finally:
+        scheduler.release(elapsed)
+
+- 実行枠が空くと、待っている持ち主（セッション）を順番に1件ずつ回す（ラウンドロビン）
+  ので、1つのセッションが大量に投げても他のセッションの順番は後回しにならない
+- 待ち行列があふれた呼び出しは待たせずに Overloaded で断り、
+  直近の実行時間から見積もった再試行までの秒数を添える
+"""
+import asyncio
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Optional
+
+# 再試行までの秒数の見積もりの範囲
+MIN_RETRY_AFTER = 0.05
+MAX_RETRY_AFTER = 30.0
+
+# 実行時間の移動平均の重み
+SERVICE_TIME_WEIGHT = 0.2
+
+
+class Overloaded(Exception):
+    """混雑のため受け付けなかった"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"Server overloaded ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """rate 件/秒で貯まり、burst 件まで貯められるトークンバケット（rate が0以下なら無制限）"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.tokens = self.burst
+        self.updated = now
+
+    def take(self, now: float, cost: float = 1.0) -> float:
+        """トークンを取れたら 0、取れなければ貯まるまでの秒数を返す"""
+        if self.rate <= 0:
+            return 0.0
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        # burst を超えるバッチでも、満タンなら受け付ける
+        cost = min(cost, self.burst)
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+class FairScheduler:
+    """
+    同時実行数を capacity に制限し、空いた枠を持ち主ごとのラウンドロビンで割り当てる
+
+    イベントループのスレッドからのみ使う前提です。
+    """
+
+    def __init__(self, capacity: int, max_queued: int, max_queued_per_owner: int):
+        self.capacity = capacity
+        self.max_queued = max_queued
+        self.max_queued_per_owner = max_queued_per_owner
+        self.active = 0
+        # 持ち主 → 待っている Future。先頭の持ち主から順に1件ずつ枠を渡す
+        self.waiting: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self.queued = 0
+        # 1件あたりの実行時間の移動平均（再試行までの秒数の見積もりに使う）
+        self.service_time = 0.0
+        self.rejected: Dict[str, int] = {}
+
+    def retry_after(self) -> float:
+        """今から並んだ場合に枠が回ってくるまでの見積もり（秒）"""
+        estimate = self.service_time * (self.queued + 1) / max(self.capacity, 1)
+        return round(min(max(estimate, MIN_RETRY_AFTER), MAX_RETRY_AFTER), 3)
+
+    def _reject(self, reason: str) -> Overloaded:
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        return Overloaded(reason, self.retry_after())
+
+    async def acquire(self, owner: str) -> None:
+        """実行枠を取得する（待ち行列があふれていれば Overloaded）"""
+        if self.active < self.capacity and not self.queued:
+            self.active += 1
+            return
+        queue = self.waiting.get(owner)
+        if self.queued >= self.max_queued:
+            raise self._reject("queue_full")
+        if queue is not None and len(queue) >= self.max_queued_per_owner:
+            raise self._reject("session_queue_full")
+        if queue is None:
+            queue = self.waiting[owner] = deque()
+        future = asyncio.get_running_loop().create_future()
+        queue.append(future)
+        self.queued += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 枠を受け取った直後にキャンセルされたので、次の待ち手に回す
+                self.release()
+            else:
+                self._discard(owner, future)
+            raise
+
+    def _discard(self, owner: str, future: asyncio.Future) -> None:
+        queue = self.waiting.get(owner)
+        if queue is None or future not in queue:
+            return
+        queue.remove(future)
+        self.queued -= 1
+        if not queue:
+            del self.waiting[owner]
+
+    def release(self, elapsed: Optional[float] = None) -> None:
+        """実行枠を返し、次の持ち主の待ち手に渡す"""
+        if elapsed is not None:
+            self.service_time += (elapsed - self.service_time) * SERVICE_TIME_WEIGHT
+        while self.waiting:
+            owner, queue = next(iter(self.waiting.items()))
+            future = queue.popleft()
+            self.queued -= 1
+            if queue:
+                self.waiting.move_to_end(owner)
+            else:
+                del self.waiting[owner]
+            if not future.done():
+                # 枠はそのまま引き継ぐので active は変わらない
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """/health 用の統計"""
+        return {
+            "capacity": self.capacity,
+            "active": self.active,
+            "queued": self.queued,
+            "queued_owners": len(self.waiting),
+            "max_queued": self.max_queued,
+            "max_queued_per_owner": self.max_queued_per_owner,
+            "service_time": round(self.service_time, 4),
+            "rejected": self.rejected,
+        }
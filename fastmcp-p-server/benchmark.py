@@ -0,0 +1,1184 @@
+#!/usr/bin/env python3
+"""
+SSE MCPサーバーのベンチマーク
+
+実際にサーバーをサブプロセスとして起動し、SSEクライアントから計測します。
+結果はJSONで標準出力に書き出すため、コミット間で比較できます。
+
+使い方:
+  python benchmark.py responsiveness --backend process
+  python benchmark.py responsiveness --backend thread
+  python benchmark.py concurrency --calls 50 --workers 8
+  python benchmark.py batch --size 20
+  python benchmark.py codec
+  python benchmark.py streamable
+  python benchmark.py websocket --calls 500 --window 32
+  python benchmark.py burst --frames 2000
+  python benchmark.py broadcast --sessions 10000
+  python benchmark.py dispatch --tools 1000
+  python benchmark.py load --sessions 50 --rate 500 --duration 10
+"""
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+from httpx_sse import aconnect_sse
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+SERVER_SCRIPT = Path(__file__).parent / "server_http_sse.py"
+
+
+# ========================================
+# 計測用ユーティリティ
+# ========================================
+
+def percentile(values: List[float], pct: float) -> float:
+    """パーセンタイル値を返す（最近傍法）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(values_ms: List[float]) -> Dict[str, float]:
+    """レイテンシの統計をまとめる"""
+    return {
+        "count": len(values_ms),
+        "p50_ms": round(percentile(values_ms, 50), 3),
+        "p95_ms": round(percentile(values_ms, 95), 3),
+        "p99_ms": round(percentile(values_ms, 99), 3),
+        "max_ms": round(max(values_ms), 3) if values_ms else 0.0,
+        "mean_ms": round(statistics.fmean(values_ms), 3) if values_ms else 0.0,
+    }
+
+
+class ServerProcess:
+    """ベンチマーク対象のサーバーをサブプロセスで起動する"""
+
+    def __init__(self, port: int, extra_args: Optional[List[str]] = None):
+        self.port = port
+        self.extra_args = extra_args or []
+        self.base_url = f"http://127.0.0.1:{port}"
+        self.process: Optional[subprocess.Popen] = None
+
+    async def __aenter__(self) -> "ServerProcess":
+        self.process = subprocess.Popen(
+            [sys.executable, str(SERVER_SCRIPT), "--port", str(self.port), *self.extra_args],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        async with httpx.AsyncClient() as client:
+            for _ in range(100):
+                try:
+                    response = await client.get(f"{self.base_url}/health")
+                    if response.status_code == 200:
+                        return self
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.1)
+        self.process.kill()
+        raise RuntimeError("Server did not become healthy")
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+    async def __aexit__(self, *exc) -> None:
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+class BenchSession:
+    """1つのSSEセッションを保持し、レスポンスをIDで待ち合わせる"""
+
+    def __init__(self, client: httpx.AsyncClient, base_url: str):
+        self.client = client
+        self.base_url = base_url
+        self.session_id: Optional[str] = None
+        self.waiters: Dict[Any, asyncio.Future] = {}
+        self.ping_times: List[float] = []
+        self.message_events = 0
+        self.next_id = 0
+        self._connected = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def connect(self) -> None:
+        """SSEストリームに接続し、session_idを受け取るまで待つ"""
+        self._task = asyncio.create_task(self._listen())
+        await asyncio.wait_for(self._connected.wait(), timeout=10)
+
+    async def _listen(self) -> None:
+        async with aconnect_sse(self.client, "GET", f"{self.base_url}/sse") as source:
+            async for event in source.aiter_sse():
+                if event.event == "connected":
+                    self.session_id = json.loads(event.data)["session_id"]
+                    self._connected.set()
+                elif event.event == "message":
+                    self.message_events += 1
+                    data = json.loads(event.data)
+                    # バッチレスポンスは要素ごとに待ち合わせを解決する
+                    for response in data if isinstance(data, list) else [data]:
+                        waiter = self.waiters.pop(response.get("id"), None)
+                        if waiter and not waiter.done():
+                            waiter.set_result(response)
+                elif event.event == "ping":
+                    self.ping_times.append(time.perf_counter())
+
+    async def call(self, method: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """リクエストを送信し、SSE経由のレスポンスを待つ"""
+        self.next_id += 1
+        request_id = self.next_id
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters[request_id] = waiter
+        await self.client.post(
+            f"{self.base_url}/messages",
+            json={"jsonrpc": "2.0", "id": request_id, "method": method, "params": params or {}},
+            headers={"X-Session-Id": self.session_id},
+        )
+        return await waiter
+
+    async def call_batch(self, calls: List[tuple]) -> List[Dict[str, Any]]:
+        """(method, params) のリストを1つのバッチとして送信し、全レスポンスを待つ"""
+        batch = []
+        waiters = []
+        for method, params in calls:
+            self.next_id += 1
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters[self.next_id] = waiter
+            waiters.append(waiter)
+            batch.append({"jsonrpc": "2.0", "id": self.next_id, "method": method, "params": params or {}})
+        await self.client.post(
+            f"{self.base_url}/messages",
+            json=batch,
+            headers={"X-Session-Id": self.session_id},
+        )
+        return list(await asyncio.gather(*waiters))
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+
+class WebSocketBenchSession:
+    """/ws の接続1本を保持し、レスポンスをIDで待ち合わせる（BenchSession と同じ呼び出し方）"""
+
+    def __init__(self, base_url: str):
+        self.url = "ws" + base_url[len("http"):] + "/ws"
+        self.connection = None
+        self.waiters: Dict[Any, asyncio.Future] = {}
+        self.message_events = 0
+        self.next_id = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def connect(self) -> None:
+        if websockets is None:
+            raise RuntimeError("websockets is not installed (pip install websockets)")
+        self.connection = await websockets.connect(self.url, subprotocols=["mcp"], max_size=None)
+        self._task = asyncio.create_task(self._listen())
+
+    async def _listen(self) -> None:
+        async for raw in self.connection:
+            self.message_events += 1
+            data = json.loads(raw)
+            for response in data if isinstance(data, list) else [data]:
+                waiter = self.waiters.pop(response.get("id"), None)
+                if waiter and not waiter.done():
+                    waiter.set_result(response)
+
+    async def call(self, method: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """リクエストを送信し、同じ接続で返るレスポンスを待つ"""
+        self.next_id += 1
+        request_id = self.next_id
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters[request_id] = waiter
+        await self.connection.send(
+            json.dumps({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params or {}})
+        )
+        return await waiter
+
+    async def close(self) -> None:
+        if self.connection is not None:
+            await self.connection.close()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+
+async def stream_bytes_sent(client: httpx.AsyncClient, base_url: str) -> float:
+    """/metrics から、SSEストリームとWebSocketに書き込んだバイト数の合計を読む"""
+    response = await client.get(f"{base_url}/metrics")
+    total = 0.0
+    for line in response.text.splitlines():
+        if line.startswith(("mcp_sse_bytes_sent_total ", "mcp_ws_bytes_sent_total ")):
+            total += float(line.split()[1])
+    return total
+
+
+# ========================================
+# シナリオ: 遅いツール実行中の応答性
+# ========================================
+
+async def bench_responsiveness(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    遅いツールの実行中に、他のセッションとキープアライブが
+    どれだけ遅延するかを計測する
+    """
+    server_args = [
+        "--keepalive", str(args.keepalive),
+        "--tool-backend", f"count_primes={args.backend}",
+    ]
+    async with ServerProcess(args.port, server_args) as server:
+        async with httpx.AsyncClient(timeout=120.0) as client:
+            monitor = BenchSession(client, server.base_url)
+            probe = BenchSession(client, server.base_url)
+            slow = BenchSession(client, server.base_url)
+            for session in (monitor, probe, slow):
+                await session.connect()
+
+            # プロセスプールのウォームアップ
+            await slow.call("tools/call", {"name": "count_primes", "arguments": {"limit": 10}})
+
+            start = time.perf_counter()
+            slow_task = asyncio.create_task(
+                slow.call("tools/call", {"name": "count_primes", "arguments": {"limit": args.limit}})
+            )
+            monitor.ping_times.clear()
+            probe_latencies = []
+            while not slow_task.done():
+                t0 = time.perf_counter()
+                await probe.call("tools/call", {"name": "add", "arguments": {"a": 1, "b": 2}})
+                probe_latencies.append((time.perf_counter() - t0) * 1000)
+                await asyncio.sleep(args.probe_interval)
+            await slow_task
+            slow_elapsed = time.perf_counter() - start
+
+            ping_times = [start] + monitor.ping_times
+            gaps = [(b - a) * 1000 for a, b in zip(ping_times, ping_times[1:])]
+
+            for session in (monitor, probe, slow):
+                await session.close()
+
+    return {
+        "scenario": "responsiveness",
+        "backend": args.backend,
+        "limit": args.limit,
+        "slow_call_s": round(slow_elapsed, 3),
+        "probe_latency": summarize(probe_latencies),
+        "keepalive_interval_ms": args.keepalive * 1000,
+        "pings_received": len(monitor.ping_times),
+        "max_ping_gap_ms": round(max(gaps), 3) if gaps else None,
+    }
+
+
+# ========================================
+# シナリオ: 1セッション内の並行処理
+# ========================================
+
+async def bench_concurrency(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    1つのセッションから tools/call を同時に投げ、
+    実行プールのサイズに近いスループットが出るかを計測する
+    """
+    server_args = [
+        "--thread-workers", str(args.workers),
+        "--process-workers", str(args.workers),
+        "--session-inflight", str(args.inflight),
+    ]
+    if args.tool == "wait":
+        params = {"name": "wait", "arguments": {"seconds": args.seconds}}
+    else:
+        params = {"name": "count_primes", "arguments": {"limit": args.limit}}
+    async with ServerProcess(args.port, server_args) as server:
+        async with httpx.AsyncClient(timeout=300.0) as client:
+            session = BenchSession(client, server.base_url)
+            await session.connect()
+
+            # ウォームアップ（プロセスプールの起動）と単発の所要時間
+            await asyncio.gather(*(session.call("tools/call", params) for _ in range(args.workers)))
+            t0 = time.perf_counter()
+            await session.call("tools/call", params)
+            single_s = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            await asyncio.gather(*(session.call("tools/call", params) for _ in range(args.calls)))
+            wall_s = time.perf_counter() - t0
+
+            await session.close()
+
+    return {
+        "scenario": "concurrency",
+        "calls": args.calls,
+        "tool": args.tool,
+        "pool_workers": args.workers,
+        "session_inflight": args.inflight,
+        "single_call_s": round(single_s, 4),
+        "wall_s": round(wall_s, 4),
+        "throughput_per_s": round(args.calls / wall_s, 2),
+        "effective_parallelism": round(args.calls * single_s / wall_s, 2),
+    }
+
+
+# ========================================
+# シナリオ: バッチ vs 個別リクエスト
+# ========================================
+
+async def bench_batch(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    小さな add 呼び出しを個別POSTで送る場合と、
+    JSON-RPCバッチで送る場合の所要時間とSSEイベント数を比較する
+    """
+    calls = [
+        ("tools/call", {"name": "add", "arguments": {"a": i, "b": i}})
+        for i in range(args.size)
+    ]
+    async with ServerProcess(args.port) as server:
+        async with httpx.AsyncClient(timeout=120.0) as client:
+            session = BenchSession(client, server.base_url)
+            await session.connect()
+
+            t0 = time.perf_counter()
+            for _ in range(args.rounds):
+                await asyncio.gather(*(session.call(method, params) for method, params in calls))
+            individual_s = time.perf_counter() - t0
+            individual_events = session.message_events
+
+            session.message_events = 0
+            t0 = time.perf_counter()
+            for _ in range(args.rounds):
+                await session.call_batch(calls)
+            batch_s = time.perf_counter() - t0
+            batch_events = session.message_events
+
+            await session.close()
+
+    return {
+        "scenario": "batch",
+        "batch_size": args.size,
+        "rounds": args.rounds,
+        "individual": {
+            "wall_s": round(individual_s, 4),
+            "calls_per_s": round(args.size * args.rounds / individual_s, 2),
+            "http_posts": args.size * args.rounds,
+            "sse_events": individual_events,
+        },
+        "batch": {
+            "wall_s": round(batch_s, 4),
+            "calls_per_s": round(args.size * args.rounds / batch_s, 2),
+            "http_posts": args.rounds,
+            "sse_events": batch_events,
+        },
+    }
+
+
+# ========================================
+# シナリオ: Streamable HTTP vs POST+SSE
+# ========================================
+
+async def bench_streamable(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    同じ add 呼び出しを、従来の POST /messages + SSE と
+    POST /mcp（レスポンスをボディで直接返す）で逐次実行し、1回あたりのレイテンシを比較する
+    """
+    params = {"name": "add", "arguments": {"a": 1, "b": 2}}
+    async with ServerProcess(args.port) as server:
+        async with httpx.AsyncClient(timeout=60.0) as client:
+            session = BenchSession(client, server.base_url)
+            await session.connect()
+            for _ in range(args.warmup):
+                await session.call("tools/call", params)
+            sse_latencies = []
+            for _ in range(args.calls):
+                t0 = time.perf_counter()
+                await session.call("tools/call", params)
+                sse_latencies.append((time.perf_counter() - t0) * 1000)
+            await session.close()
+
+            async def call_direct(request_id: int) -> None:
+                response = await client.post(
+                    f"{server.base_url}/mcp",
+                    json={"jsonrpc": "2.0", "id": request_id, "method": "tools/call", "params": params},
+                    headers={"Accept": "application/json, text/event-stream"},
+                )
+                response.json()
+
+            for i in range(args.warmup):
+                await call_direct(i)
+            direct_latencies = []
+            for i in range(args.calls):
+                t0 = time.perf_counter()
+                await call_direct(i)
+                direct_latencies.append((time.perf_counter() - t0) * 1000)
+
+    return {
+        "scenario": "streamable",
+        "calls": args.calls,
+        "post_plus_sse": summarize(sse_latencies),
+        "streamable_http": summarize(direct_latencies),
+    }
+
+
+# ========================================
+# シナリオ: WebSocket vs POST+SSE
+# ========================================
+
+async def bench_websocket(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    同じ add 呼び出しを POST /messages + SSE と /ws で送り、
+    逐次実行のレイテンシ（1メッセージあたりのオーバーヘッド）と、
+    window 件ずつ並行に送り続けたときのスループットを比較する
+    """
+    params = {"name": "add", "arguments": {"a": 1, "b": 2}}
+    # レート制限と同時処理数で頭打ちにならないようにする
+    server_args = ["--rate-limit", "0", "--session-inflight", str(args.window)]
+    results: Dict[str, Any] = {}
+    async with ServerProcess(args.port, server_args) as server:
+        limits = httpx.Limits(max_connections=args.window + 2, max_keepalive_connections=args.window + 2)
+        async with httpx.AsyncClient(timeout=60.0, limits=limits) as client:
+            transports = (
+                ("post_plus_sse", BenchSession(client, server.base_url)),
+                ("websocket", WebSocketBenchSession(server.base_url)),
+            )
+            for name, session in transports:
+                await session.connect()
+                for _ in range(args.warmup):
+                    await session.call("tools/call", params)
+
+                bytes_before = await stream_bytes_sent(client, server.base_url)
+                latencies = []
+                for _ in range(args.calls):
+                    t0 = time.perf_counter()
+                    await session.call("tools/call", params)
+                    latencies.append((time.perf_counter() - t0) * 1000)
+                bytes_after = await stream_bytes_sent(client, server.base_url)
+
+                per_worker = max(1, args.messages // args.window)
+
+                async def worker() -> None:
+                    for _ in range(per_worker):
+                        await session.call("tools/call", params)
+
+                t0 = time.perf_counter()
+                await asyncio.gather(*(worker() for _ in range(args.window)))
+                elapsed = time.perf_counter() - t0
+                await session.close()
+
+                results[name] = {
+                    "latency": summarize(latencies),
+                    "stream_bytes_per_response": round((bytes_after - bytes_before) / args.calls, 1),
+                    "throughput_rps": round(per_worker * args.window / elapsed, 1),
+                }
+
+    return {
+        "scenario": "websocket",
+        "calls": args.calls,
+        "messages": args.messages,
+        "window": args.window,
+        **results,
+    }
+
+
+# ========================================
+# シナリオ: SSEの書き込みの合体
+# ========================================
+
+async def bench_burst(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    1つのSSEセッションに args.frames 件のレスポンスを一度に入れ（同時に完了した
+    ツール呼び出しの模擬）、クライアントが全部受け取るまでの時間と書き込み回数を、
+    書き込みの合体あり・なしで比較する。1件ずつ入れた場合のレイテンシも計測する。
+
+    キューに直接入れるため、サーバーは同じイベントループで起動する。
+    """
+    import server_http_sse
+
+    def frame(request_id: int) -> bytes:
+        return server_http_sse.encode_response({
+            "jsonrpc": "2.0",
+            "id": request_id,
+            "result": {"content": [{"type": "text", "text": "計算結果: 1 + 2 = 3"}]},
+        })
+
+    results: Dict[str, Any] = {}
+    original = server_http_sse.config.sse_batch_bytes
+    async with InProcessServer(args.port) as server:
+        async with httpx.AsyncClient(timeout=60.0) as client:
+            for name, batch_bytes in (("per_frame", 0), ("coalesced", args.batch_bytes)):
+                server_http_sse.config.sse_batch_bytes = batch_bytes
+                received = 0
+                arrived = asyncio.Event()
+                target = 0
+
+                headers = {"Accept-Encoding": "identity"}
+                async with client.stream("GET", f"{server.base_url}/sse", headers=headers) as response:
+                    chunks = response.aiter_raw()
+                    head = b""
+                    while b"\r\n\r\n" not in head:
+                        head += await chunks.__anext__()
+                    connected = head.split(b"data: ", 1)[1].split(b"\r\n", 1)[0]
+                    session_id = json.loads(connected)["session_id"]
+                    session = server_http_sse.active_connections[session_id]
+                    writes = 0
+
+                    async def read() -> None:
+                        nonlocal received, writes
+                        async for chunk in chunks:
+                            writes += 1
+                            received += chunk.count(b"\r\n\r\n")
+                            if received >= target:
+                                arrived.set()
+
+                    reader = asyncio.create_task(read())
+
+                    # 1件ずつ（キューが空の状態から）入れたときのレイテンシ
+                    single = []
+                    for i in range(args.singles):
+                        target = received + 1
+                        arrived.clear()
+                        t0 = time.perf_counter()
+                        await session.deliver(frame(i))
+                        await arrived.wait()
+                        single.append((time.perf_counter() - t0) * 1000)
+
+                    # 一度に入れたバースト
+                    payloads = [frame(i) for i in range(args.frames)]
+                    target = received + args.frames
+                    arrived.clear()
+                    writes_before = writes
+                    t0 = time.perf_counter()
+                    for payload in payloads:
+                        await session.deliver(payload)
+                    await arrived.wait()
+                    elapsed = time.perf_counter() - t0
+                    reader.cancel()
+
+                results[name] = {
+                    "single_latency": summarize(single),
+                    "burst_ms": round(elapsed * 1000, 3),
+                    "burst_frames_per_second": round(args.frames / elapsed, 1),
+                    "burst_reads": writes - writes_before,
+                }
+    server_http_sse.config.sse_batch_bytes = original
+
+    return {
+        "scenario": "burst",
+        "frames": args.frames,
+        "batch_bytes": args.batch_bytes,
+        **results,
+    }
+
+
+# ========================================
+# シナリオ: 通知のブロードキャスト
+# ========================================
+
+async def bench_broadcast(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    args.sessions 本のセッションへ同じ通知を送る時間と、送信キューに残るメモリを
+    active_connections を回してセッションごとにエンコード・deliver する素朴な方法と
+    broadcast_notification（トランスポートごとに1回だけエンコード）で比較する。
+
+    キューへの投入までを計測するため、ソケットは開かない。各セッションには
+    実行しないストリームをつなぎ、ラウンドの合間に送信済みとしてキューを空にする。
+    """
+    import tracemalloc
+
+    import mcp_codec
+    import server_http_sse
+    from sse_stream import SSEStreamResponse
+    from ws_stream import WebSocketStream
+
+    sessions = []
+    websockets_count = int(args.sessions * args.websocket_share)
+    for i in range(args.sessions):
+        session_id = server_http_sse.router.new_session_id()
+        if i < websockets_count:
+            session = server_http_sse.WebSocketSession(session_id, 1)
+            session.attach(WebSocketStream(None, session.responses, on_message=None))
+        else:
+            session = server_http_sse.Session(session_id, 1)
+            session.attach(SSEStreamResponse(session.responses))
+        server_http_sse.active_connections[session_id] = session
+        sessions.append(session)
+
+    def drain() -> None:
+        for session in sessions:
+            while not session.responses.empty():
+                session.mark_sent(session.responses.get_nowait())
+
+    messages = {
+        "tools_list_changed": ("notifications/tools/list_changed", None),
+        "message_1kb": ("notifications/message", {"level": "info", "data": "x" * 1024}),
+    }
+
+    async def naive(method: str, params: Optional[Dict[str, Any]]) -> None:
+        message: Dict[str, Any] = {"jsonrpc": "2.0", "method": method}
+        if params is not None:
+            message["params"] = params
+        for session in list(server_http_sse.active_connections.values()):
+            await session.deliver(mcp_codec.dumps(message), block=False)
+
+    async def shared(method: str, params: Optional[Dict[str, Any]]) -> None:
+        await server_http_sse.broadcast(mcp_codec.dumps(
+            {"jsonrpc": "2.0", "method": method, **({"params": params} if params is not None else {})}
+        ))
+
+    results: Dict[str, Any] = {}
+    try:
+        for name, (method, params) in messages.items():
+            row: Dict[str, Any] = {}
+            for mode, fan_out in (("naive", naive), ("broadcast", shared)):
+                elapsed = []
+                for _ in range(args.rounds):
+                    t0 = time.perf_counter()
+                    await fan_out(method, params)
+                    elapsed.append((time.perf_counter() - t0) * 1000)
+                    drain()
+                # 1ラウンド分のキューが保持するメモリ
+                tracemalloc.start()
+                before = tracemalloc.get_traced_memory()[0]
+                await fan_out(method, params)
+                retained = tracemalloc.get_traced_memory()[0] - before
+                tracemalloc.stop()
+                drain()
+                row[mode] = {
+                    "round": summarize(elapsed),
+                    "per_session_us": round(statistics.median(elapsed) * 1000 / args.sessions, 3),
+                    "retained_bytes": retained,
+                }
+            results[name] = row
+    finally:
+        for session in sessions:
+            server_http_sse.active_connections.pop(session.session_id, None)
+
+    return {
+        "scenario": "broadcast",
+        "sessions": args.sessions,
+        "websocket_sessions": websockets_count,
+        "rounds": args.rounds,
+        **results,
+    }
+
+
+# ========================================
+# シナリオ: JSONコーデックのマイクロベンチマーク
+# ========================================
+
+def codec_envelopes() -> Dict[str, Any]:
+    """実際のMCPメッセージに近いエンベロープを返す"""
+    import server_http_sse
+
+    text = "計算結果: 123 + 456 = 579\n" * 2000
+    return {
+        "tools_call_request": {
+            "jsonrpc": "2.0", "id": 42, "method": "tools/call",
+            "params": {"name": "add", "arguments": {"a": 123, "b": 456}},
+        },
+        "tools_call_response": {
+            "jsonrpc": "2.0", "id": 42,
+            "result": {"content": [{"type": "text", "text": "こんにちは、太郎さん！🎉"}]},
+        },
+        "tools_list_response": {
+            "jsonrpc": "2.0", "id": 2, "result": server_http_sse.handle_tools_list({}),
+        },
+        "initialize_response": {
+            "jsonrpc": "2.0", "id": 1, "result": server_http_sse.handle_initialize({}),
+        },
+        "large_text_response": {
+            "jsonrpc": "2.0", "id": 43,
+            "result": {"content": [{"type": "text", "text": text}]},
+        },
+    }
+
+
+def time_per_op(func, arg, iterations: int) -> float:
+    """1回あたりの所要時間（マイクロ秒）"""
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        func(arg)
+    return (time.perf_counter() - t0) / iterations * 1e6
+
+
+async def bench_codec(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    各JSONバックエンドのエンコード/デコード時間を比較する
+    stdlib_str は変更前の json.dumps/json.loads（str経由）の経路
+    """
+    import mcp_codec
+
+    codecs = {
+        "stdlib_str": (json.dumps, json.loads),
+        **mcp_codec.CODECS,
+    }
+    results: Dict[str, Any] = {}
+    for envelope_name, envelope in codec_envelopes().items():
+        size = len(mcp_codec.dumps(envelope))
+        iterations = max(10, args.iterations * 1000 // max(size, 1000))
+        row: Dict[str, Any] = {"bytes": size}
+        for codec_name, (dumps, loads) in codecs.items():
+            encoded = dumps(envelope)
+            row[codec_name] = {
+                "dumps_us": round(time_per_op(dumps, envelope, iterations), 3),
+                "loads_us": round(time_per_op(loads, encoded, iterations), 3),
+            }
+        results[envelope_name] = row
+
+    return {
+        "scenario": "codec",
+        "selected_backend": mcp_codec.BACKEND,
+        "available": list(mcp_codec.CODECS),
+        "envelopes": results,
+    }
+
+
+# ========================================
+# シナリオ: ツールディスパッチのマイクロベンチマーク
+# ========================================
+
+def build_if_chain(names: List[str], handler):
+    """
+    変更前の execute_tool と同じ形の if/elif チェーンを生成する
+    （名前を上から順に文字列比較する）
+    """
+    lines = ["def execute_chain(name, arguments):"]
+    for index, name in enumerate(names):
+        keyword = "if" if index == 0 else "elif"
+        lines.append(f"    {keyword} name == {name!r}:")
+        lines.append("        return handler(arguments)")
+    lines.append("    else:")
+    lines.append("        raise ValueError(f'Unknown tool: {name}')")
+    namespace = {"handler": handler}
+    exec("\n".join(lines), namespace)
+    return namespace["execute_chain"]
+
+
+def time_dispatch(execute, name: str, iterations: int) -> float:
+    """1回あたりのディスパッチ時間（マイクロ秒、未知のツールは例外まで）"""
+    arguments = {"a": 1, "b": 2}
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        try:
+            execute(name, arguments)
+        except ValueError:
+            pass
+    return (time.perf_counter() - t0) / iterations * 1e6
+
+
+async def bench_dispatch(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    多数のツールを登録したときのディスパッチ時間を比較する
+    if_chain は変更前の execute_tool、registry は ToolRegistry.execute
+    """
+    from tool_registry import ToolRegistry, ToolSpec
+
+    def handler(arguments: Dict[str, Any]) -> str:
+        return "ok"
+
+    results: Dict[str, Any] = {}
+    for count in args.tools:
+        names = [f"tool_{index:05d}" for index in range(count)]
+        registry = ToolRegistry()
+        for name in names:
+            registry.register(ToolSpec(name=name, description=name, handler=handler))
+        chain = build_if_chain(names, handler)
+        targets = {
+            "first": names[0],
+            "middle": names[count // 2],
+            "last": names[-1],
+            "unknown": "no_such_tool",
+        }
+        row: Dict[str, Any] = {}
+        for position, name in targets.items():
+            chain_us = time_dispatch(chain, name, args.iterations)
+            registry_us = time_dispatch(registry.execute, name, args.iterations)
+            row[position] = {
+                "if_chain_us": round(chain_us, 3),
+                "registry_us": round(registry_us, 3),
+                "speedup": round(chain_us / registry_us, 1) if registry_us else None,
+            }
+        results[str(count)] = row
+
+    return {
+        "scenario": "dispatch",
+        "iterations": args.iterations,
+        "tools": results,
+    }
+
+
+# ========================================
+# シナリオ: 負荷生成
+# ========================================
+
+# --mix で指定できるツールと、呼び出し時の引数
+LOAD_TOOL_ARGUMENTS: Dict[str, Dict[str, Any]] = {
+    "hello": {"name": "bench"},
+    "add": {"a": 123, "b": 456},
+    "multiply": {"a": 12, "b": 34},
+    "divide": {"a": 10, "b": 4},
+    "get_time": {},
+    "server_info": {},
+    "count_primes": {"limit": 10_000},
+    "wait": {"seconds": 0.01},
+}
+
+
+def parse_mix(value: str) -> List[tuple]:
+    """
+    "tools/list=1,add=4" 形式の比率を [(method, params, 重み), ...] に変換
+    tools/list 以外の名前は tools/call するツール名として扱う
+    """
+    mix = []
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name == "tools/list":
+            mix.append(("tools/list", {}, float(weight or 1)))
+        elif name in LOAD_TOOL_ARGUMENTS:
+            params = {"name": name, "arguments": LOAD_TOOL_ARGUMENTS[name]}
+            mix.append(("tools/call", params, float(weight or 1)))
+        else:
+            raise argparse.ArgumentTypeError(f"unknown mix entry: {name}")
+    return mix
+
+
+def read_rss(pid: int) -> Optional[int]:
+    """プロセスの常駐メモリ（バイト、Linuxの /proc から読めなければ None）"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+class InProcessServer:
+    """
+    サーバーを同じプロセス・同じイベントループの uvicorn で起動する
+
+    httpx の ASGITransport はレスポンスを最後まで溜めてから返すため、
+    終わらないSSEストリームには使えない。代わりにループ内で uvicorn を動かす。
+    """
+
+    def __init__(self, port: int):
+        self.port = port
+        self.base_url = f"http://127.0.0.1:{port}"
+        self.pid = os.getpid()
+        self.server = None
+        self.task: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "InProcessServer":
+        import uvicorn
+        import server_http_sse
+
+        config = uvicorn.Config(
+            server_http_sse.app,
+            host="127.0.0.1",
+            port=self.port,
+            log_level="warning",
+            timeout_graceful_shutdown=2,
+        )
+        self.server = uvicorn.Server(config)
+        self.task = asyncio.create_task(self.server.serve())
+        for _ in range(100):
+            if self.server.started:
+                return self
+            await asyncio.sleep(0.05)
+        raise RuntimeError("In-process server did not start")
+
+    async def __aexit__(self, *exc) -> None:
+        self.server.should_exit = True
+        await self.task
+
+
+def load_client_class():
+    """test.py の MCPSSETestClient を土台にした負荷生成用クライアント"""
+    from test import MCPSSETestClient
+
+    class LoadClient(MCPSSETestClient):
+        """
+        MCPSSETestClient と同じ手順（GET /sse → session_id → POST /messages）で接続し、
+        画面出力をせずにレスポンスを id で待ち合わせる
+        """
+
+        def __init__(self, base_url: str, http_client: httpx.AsyncClient):
+            super().__init__(base_url)
+            self.http_client = http_client
+            self.waiters: Dict[Any, asyncio.Future] = {}
+
+        def print_section(self, title: str):
+            pass
+
+        def print_step(self, step: str, detail: str = ""):
+            pass
+
+        async def sse_event_listener(self):
+            async with aconnect_sse(self.http_client, "GET", f"{self.base_url}/sse") as source:
+                async for event in source.aiter_sse():
+                    if event.event == "connected":
+                        self.session_id = json.loads(event.data)["session_id"]
+                        self.sse_connected = True
+                    elif event.event == "message":
+                        data = json.loads(event.data)
+                        for response in data if isinstance(data, list) else [data]:
+                            waiter = self.waiters.pop(response.get("id"), None)
+                            if waiter is not None and not waiter.done():
+                                waiter.set_result(response)
+            self.sse_connected = False
+
+        async def send_request(self, request: dict, timeout: int = 10) -> Optional[dict]:
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters[request["id"]] = waiter
+            try:
+                response = await self.http_client.post(
+                    f"{self.base_url}/messages",
+                    json=request,
+                    headers={"X-Session-Id": self.session_id},
+                )
+                if response.status_code != 200:
+                    return None
+                return await asyncio.wait_for(waiter, timeout)
+            except (asyncio.TimeoutError, httpx.HTTPError):
+                return None
+            finally:
+                self.waiters.pop(request["id"], None)
+
+    return LoadClient
+
+
+async def bench_load(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    N本のSSEセッションから、指定した比率の tools/list / tools/call を
+    目標レートで送り続け、スループット・レイテンシ・サーバーのRSSを計測する
+
+    送信は目標レートの時刻表どおりに行い（応答を待たずに次を送る）、
+    レイテンシは POST の送信からSSEでレスポンスを受け取るまでの時間です。
+    最初の --warmup 秒に送ったリクエストは集計しません。
+    """
+    mix = parse_mix(args.mix)
+    choices = [(method, params) for method, params, _ in mix]
+    weights = [weight for _, _, weight in mix]
+    rng = random.Random(args.seed)
+
+    if args.in_process:
+        server_cm = InProcessServer(args.port)
+    else:
+        server_cm = ServerProcess(args.port, args.server_arg)
+
+    # (送信時刻, ラベル, レイテンシms または失敗なら None)
+    records: List[tuple] = []
+    rss_samples: List[int] = []
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=args.sessions * 2)
+
+    async def one_request(client, method: str, params: Dict[str, Any], label: str) -> None:
+        request = {"jsonrpc": "2.0", "id": client.get_next_id(), "method": method, "params": params}
+        t0 = time.perf_counter()
+        response = await client.send_request(request, timeout=args.timeout)
+        if response is None or "error" in response:
+            records.append((t0, label, None))
+        else:
+            records.append((t0, label, (time.perf_counter() - t0) * 1000))
+
+    # インプロセスではサーバーのログが標準出力に出るため、結果のJSONと混ざらないよう退避する
+    with contextlib.redirect_stdout(sys.stderr):
+        async with server_cm as server:
+            async with httpx.AsyncClient(timeout=30.0, limits=limits) as http_client:
+                LoadClient = load_client_class()
+                clients = [LoadClient(server.base_url, http_client) for _ in range(args.sessions)]
+                listeners = [asyncio.create_task(c.sse_event_listener()) for c in clients]
+                connected = await asyncio.gather(*(c.wait_for_connection() for c in clients))
+                if not all(connected):
+                    raise RuntimeError("Some SSE sessions failed to connect")
+
+                async def sample_rss() -> None:
+                    while True:
+                        rss = read_rss(server.pid)
+                        if rss is not None:
+                            rss_samples.append(rss)
+                        await asyncio.sleep(0.25)
+
+                rss_start = read_rss(server.pid)
+                sampler = asyncio.create_task(sample_rss())
+                pending: set = set()
+                round_robin = itertools.cycle(clients)
+                interval = 1.0 / args.rate
+                total = int(args.rate * (args.warmup + args.duration))
+
+                start = time.perf_counter()
+                measure_start = start + args.warmup
+                for index in range(total):
+                    # 時刻表どおりに送る（遅れている場合は待たずに送って追いつく）
+                    delay = start + index * interval - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    method, params = rng.choices(choices, weights)[0]
+                    label = method if method == "tools/list" else f"tools/call:{params['name']}"
+                    task = asyncio.create_task(one_request(next(round_robin), method, params, label))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+                send_end = time.perf_counter()
+                if pending:
+                    await asyncio.wait(pending)
+                measure_end = time.perf_counter()
+
+                sampler.cancel()
+                rss_end = read_rss(server.pid)
+                for task in listeners:
+                    task.cancel()
+                await asyncio.gather(*listeners, return_exceptions=True)
+
+    measured = [record for record in records if record[0] >= measure_start]
+    latencies: Dict[str, List[float]] = {}
+    failed = 0
+    for _, label, elapsed_ms in measured:
+        if elapsed_ms is None:
+            failed += 1
+        else:
+            latencies.setdefault(label, []).append(elapsed_ms)
+    all_latencies = [value for values in latencies.values() for value in values]
+    elapsed = measure_end - measure_start
+
+    return {
+        "scenario": "load",
+        "mode": "in-process" if args.in_process else "subprocess",
+        "sessions": args.sessions,
+        "mix": args.mix,
+        "target_rate_per_s": args.rate,
+        "duration_s": args.duration,
+        "sent": len(measured),
+        "completed": len(all_latencies),
+        "failed": failed,
+        "achieved_send_rate_per_s": round(len(measured) / (send_end - measure_start), 2),
+        "throughput_per_s": round(len(all_latencies) / elapsed, 2),
+        "latency": summarize(all_latencies),
+        "latency_by_request": {label: summarize(values) for label, values in sorted(latencies.items())},
+        "server_rss_bytes": {
+            "start": rss_start,
+            "peak": max(rss_samples) if rss_samples else None,
+            "end": rss_end,
+        },
+    }
+
+
+# ========================================
+# メイン処理
+# ========================================
+
+SCENARIOS = {
+    "responsiveness": bench_responsiveness,
+    "concurrency": bench_concurrency,
+    "batch": bench_batch,
+    "codec": bench_codec,
+    "streamable": bench_streamable,
+    "websocket": bench_websocket,
+    "burst": bench_burst,
+    "broadcast": bench_broadcast,
+    "dispatch": bench_dispatch,
+    "load": bench_load,
+}
+
+
+def main():
+    """メイン関数"""
+    parser = argparse.ArgumentParser(description="Benchmark MCP SSE Server")
+    subparsers = parser.add_subparsers(dest="scenario", required=True)
+
+    responsiveness = subparsers.add_parser("responsiveness", help="Latency while a slow tool runs")
+    responsiveness.add_argument("--port", type=int, default=8998)
+    responsiveness.add_argument("--backend", choices=["thread", "process"], default="process")
+    responsiveness.add_argument("--limit", type=int, default=300_000)
+    responsiveness.add_argument("--keepalive", type=float, default=0.2)
+    responsiveness.add_argument("--probe-interval", type=float, default=0.05)
+
+    concurrency = subparsers.add_parser("concurrency", help="Concurrent calls on one session")
+    concurrency.add_argument("--port", type=int, default=8998)
+    concurrency.add_argument("--calls", type=int, default=50)
+    concurrency.add_argument("--workers", type=int, default=8)
+    concurrency.add_argument("--inflight", type=int, default=16)
+    concurrency.add_argument("--tool", choices=["wait", "count_primes"], default="wait")
+    concurrency.add_argument("--seconds", type=float, default=0.1)
+    concurrency.add_argument("--limit", type=int, default=50_000)
+
+    batch = subparsers.add_parser("batch", help="JSON-RPC batch vs individual POSTs")
+    batch.add_argument("--port", type=int, default=8998)
+    batch.add_argument("--size", type=int, default=20)
+    batch.add_argument("--rounds", type=int, default=20)
+
+    codec = subparsers.add_parser("codec", help="JSON codec microbenchmark")
+    codec.add_argument("--iterations", type=int, default=20000)
+
+    streamable = subparsers.add_parser("streamable", help="POST /mcp vs POST /messages + SSE")
+    streamable.add_argument("--port", type=int, default=8998)
+    streamable.add_argument("--calls", type=int, default=500)
+    streamable.add_argument("--warmup", type=int, default=20)
+
+    websocket = subparsers.add_parser("websocket", help="WS /ws vs POST /messages + SSE")
+    websocket.add_argument("--port", type=int, default=8998)
+    websocket.add_argument("--calls", type=int, default=500, help="Sequential calls for the latency")
+    websocket.add_argument("--messages", type=int, default=5000, help="Calls for the throughput")
+    websocket.add_argument("--window", type=int, default=32, help="Calls kept in flight for the throughput")
+    websocket.add_argument("--warmup", type=int, default=20)
+
+    burst = subparsers.add_parser("burst", help="SSE write coalescing for a burst of responses")
+    burst.add_argument("--port", type=int, default=8998)
+    burst.add_argument("--frames", type=int, default=2000)
+    burst.add_argument("--singles", type=int, default=200)
+    burst.add_argument("--batch-bytes", type=int, default=64 * 1024)
+
+    broadcast = subparsers.add_parser("broadcast", help="Notification fan-out: per-session encode vs broadcast")
+    broadcast.add_argument("--sessions", type=int, default=10000)
+    broadcast.add_argument("--websocket-share", type=float, default=0.2)
+    broadcast.add_argument("--rounds", type=int, default=20)
+
+    dispatch = subparsers.add_parser("dispatch", help="Tool dispatch: if/elif chain vs registry")
+    dispatch.add_argument("--tools", type=int, nargs="+", default=[10, 100, 1000, 2000])
+    dispatch.add_argument("--iterations", type=int, default=20000)
+
+    load = subparsers.add_parser("load", help="Open-loop load over many SSE sessions")
+    load.add_argument("--port", type=int, default=8998)
+    load.add_argument("--sessions", type=int, default=50)
+    load.add_argument("--rate", type=float, default=200.0, help="Target requests per second (all sessions)")
+    load.add_argument("--duration", type=float, default=10.0)
+    load.add_argument("--warmup", type=float, default=1.0, help="Seconds of load excluded from the results")
+    load.add_argument("--mix", default="tools/list=1,add=4,hello=1", help="Weighted request mix")
+    load.add_argument("--timeout", type=float, default=10.0)
+    load.add_argument("--seed", type=int, default=0)
+    load.add_argument("--in-process", action="store_true", help="Run the server in this event loop")
+    load.add_argument(
+        "--server-arg", action="append", default=[],
+        help="Extra argument for the server subprocess (repeatable, e.g. --server-arg=--cache-entries=0)"
+    )
+
+    args = parser.parse_args()
+    result = asyncio.run(SCENARIOS[args.scenario](args))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+JSONコーデック
+SSEサーバーと stdio プロキシで共有するエンコード/デコード層
+
+orjson → msgspec → 標準json の順で、インストールされているものを使います。
+環境変数 MCP_JSON_CODEC で明示的に選ぶこともできます（例: MCP_JSON_CODEC=json）。
+
+どのバックエンドでも入出力はバイト列（UTF-8）で統一し、
+str との往復変換を避けます。
+"""
+import json
+import os
+from typing import Any, Callable, Dict, Tuple, Union
+
+# デコード失敗時の例外（orjson / msgspec の例外も ValueError のサブクラス）
+DecodeError = ValueError
+
+Dumps = Callable[[Any], bytes]
+Loads = Callable[[Union[bytes, str]], Any]
+
+
+def _json_dumps(obj: Any) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _json_loads(data: Union[bytes, str]) -> Any:
+    return json.loads(data)
+
+
+def _available_codecs() -> Dict[str, Tuple[Dumps, Loads]]:
+    """利用可能なバックエンドを優先順に返す"""
+    codecs: Dict[str, Tuple[Dumps, Loads]] = {}
+
+    try:
+        import orjson
+
+        def _orjson_dumps(obj: Any) -> bytes:
+            try:
+                return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+            except TypeError:
+                # 64bitを超える整数など orjson が扱えない値は標準jsonで
+                return _json_dumps(obj)
+
+        codecs["orjson"] = (_orjson_dumps, orjson.loads)
+    except ImportError:
+        pass
+
+    try:
+        import msgspec
+
+        _encoder = msgspec.json.Encoder()
+        _decoder = msgspec.json.Decoder()
+
+        def _msgspec_dumps(obj: Any) -> bytes:
+            try:
+                return _encoder.encode(obj)
+            except (TypeError, OverflowError):
+                return _json_dumps(obj)
+
+        codecs["msgspec"] = (_msgspec_dumps, _decoder.decode)
+    except ImportError:
+        pass
+
+    codecs["json"] = (_json_dumps, _json_loads)
+    return codecs
+
+
+CODECS = _available_codecs()
+
+
+def _select(name: str = "") -> str:
+    """使用するバックエンド名を決める"""
+    name = name or os.environ.get("MCP_JSON_CODEC", "")
+    if name:
+        if name not in CODECS:
+            raise ValueError(
+                f"JSON codec '{name}' is not available (installed: {', '.join(CODECS)})"
+            )
+        return name
+    return next(iter(CODECS))
+
+
+BACKEND = _select()
+dumps, loads = CODECS[BACKEND]
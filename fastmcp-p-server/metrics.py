@@ -0,0 +1,185 @@
+"""
+メトリクス
+Prometheus のテキスト形式（/metrics）で出力するカウンターとヒストグラム
+
+値の更新はすべてイベントループのスレッドで行う前提のため、ロックは使いません
+（実行プールのスレッドからは更新しないこと）。
+更新はラベル値のタプルをキーにした辞書への加算だけで、
+出力時の整形はスクレイプされたときにまとめて行います。
+
+    registry = MetricsRegistry()
+    requests = registry.counter("mcp_requests_total", "Requests", ("method",))
+    requests.inc("tools/call")
+    registry.render()
+"""
+import math
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+# スクレイプ時に値を集める関数: (ラベル値, 値) を返す
+GaugeCallback = Callable[[], Iterable[Tuple[LabelValues, float]]]
+
+# 秒単位のレイテンシ用デフォルトバケット
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """単調増加するカウンター"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        """ラベル値の組に amount を加算"""
+        self.values[label_values] = self.values.get(label_values, 0.0) + amount
+
+    def collect(self) -> List[str]:
+        return [
+            f"{self.name}{_labels(self.label_names, key)} {_number(value)}"
+            for key, value in self.values.items()
+        ]
+
+
+class Histogram:
+    """固定バケットのヒストグラム"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.bounds = tuple(sorted(buckets))
+        # ラベル値 → [バケットごとの件数..., +Inf の件数, 合計値]
+        self.values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        """値を1つ記録"""
+        row = self.values.get(label_values)
+        if row is None:
+            row = self.values[label_values] = [0] * (len(self.bounds) + 1) + [0.0]
+        # 境界値ちょうどはそのバケットに入る（le は「以下」）
+        row[bisect_left(self.bounds, value)] += 1
+        row[-1] += value
+
+    def collect(self) -> List[str]:
+        lines = []
+        for key, row in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.bounds + (math.inf,), row):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}")
+            labels = _labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_number(row[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """
+    スクレイプ時に現在値を集めるゲージ
+
+    kind="counter" にすると、他のオブジェクトが持っている累積値を
+    カウンターとして出力できます。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        callback: GaugeCallback,
+        labels: Sequence[str] = (),
+        kind: str = "gauge",
+    ):
+        self.name = name
+        self.kind = kind
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.callback = callback
+
+    def collect(self) -> List[str]:
+        return [
+            f"{self.name}{_labels(self.label_names, key)} {_number(value)}"
+            for key, value in self.callback()
+        ]
+
+
+class MetricsRegistry:
+    """メトリクスの登録先"""
+
+    def __init__(self):
+        self.metrics: Dict[str, object] = {}
+
+    def _add(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, documentation, labels))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._add(Histogram(name, documentation, labels, buckets))
+
+    def gauge(
+        self,
+        name: str,
+        documentation: str,
+        callback: GaugeCallback,
+        labels: Sequence[str] = (),
+        kind: str = "gauge",
+    ) -> Gauge:
+        return self._add(Gauge(name, documentation, callback, labels, kind))
+
+    def render(self) -> str:
+        """Prometheus のテキスト形式で出力"""
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
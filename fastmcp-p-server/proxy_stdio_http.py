@@ -4,77 +4,185 @@
 Claude Desktop (stdio) ↔ MCP SSE Server
 
 重要: 1つのSSE接続を維持し続ける実装
+（切断された場合は Last-Event-ID を付けて同じセッションに再接続します）
+
+--transport streamable を指定すると、SSEストリームを使わず
+POST /mcp のレスポンスボディで直接レスポンスを受け取ります。
 """
 import sys
-import json
 import asyncio
 import httpx
-from httpx_sse import aconnect_sse
+from httpx_sse import aconnect_sse, EventSource
 from typing import Optional, Dict, Any
 
+import mcp_codec
+
 
 class SSEStdioProxy:
     """stdio と SSE の間を中継するプロキシ"""
     
-    def __init__(self, server_url: str):
+    TRANSPORTS = ("sse", "streamable")
+    
+    # SSEストリームの再接続（指数バックオフ）
+    RECONNECT_ATTEMPTS = 10
+    RECONNECT_INITIAL_DELAY = 0.5
+    RECONNECT_MAX_DELAY = 10.0
+    
+    def __init__(self, server_url: str, transport: str = "sse"):
         self.server_url = server_url
+        self.transport = transport
         self.session_id: Optional[str] = None
+        # 最後に受け取ったイベントのID（再接続時に Last-Event-ID として送る）
+        self.last_event_id: Optional[str] = None
         self.http_client: Optional[httpx.AsyncClient] = None
         self.running = True
         self.sse_connected = False
         self.stdin_queue = asyncio.Queue()
         self.stdout_queue = asyncio.Queue()
+        # 並行して送信中のリクエスト（GCされないよう参照を保持）
+        self.send_tasks: set = set()
         
     def log(self, message: str):
         """ログを標準エラー出力に出力"""
         print(f"[SSE Proxy] {message}", file=sys.stderr, flush=True)
     
+    @staticmethod
+    def describe(message: Any, default: str) -> str:
+        """ログ用にメッセージの種類を表す文字列を返す（バッチ配列にも対応）"""
+        if isinstance(message, list):
+            return f"batch({len(message)})"
+        return str(message.get("method", message.get("id", default)))
+    
+    @staticmethod
+    def has_tool_call(message: Any) -> bool:
+        """tools/call を含むメッセージか（バッチ配列にも対応）"""
+        members = message if isinstance(message, list) else [message]
+        return any(isinstance(m, dict) and m.get("method") == "tools/call" for m in members)
+    
+    @staticmethod
+    def error_response(message: Any, code: int, text: str) -> Any:
+        """送信できなかったメッセージに対するエラーレスポンスを生成"""
+        if isinstance(message, list):
+            # バッチは id を持つ要素ごとにエラーを返す（通知のみなら応答なし）
+            errors = [
+                {"jsonrpc": "2.0", "id": m.get("id"), "error": {"code": code, "message": text}}
+                for m in message
+                if isinstance(m, dict) and "id" in m
+            ]
+            return errors or None
+        return {
+            "jsonrpc": "2.0",
+            "id": message.get("id"),
+            "error": {
+                "code": code,
+                "message": text
+            }
+        }
+    
     async def sse_event_listener(self):
         """
         SSEイベントをリッスン
-        1つの接続を維持し続ける
+        1つの接続を維持し続け、切れた場合は同じセッションに再接続する
         """
-        try:
-            sse_url = f"{self.server_url}/sse"
+        failures = 0
+        delay = self.RECONNECT_INITIAL_DELAY
+        
+        while self.running:
+            try:
+                if await self.listen_sse_stream():
+                    # 接続できていたならバックオフを最初からやり直す
+                    failures = 0
+                    delay = self.RECONNECT_INITIAL_DELAY
+                    self.log("SSE stream ended")
+            except Exception as e:
+                self.log(f"SSE listener error: {e}")
+            
+            self.sse_connected = False
+            if not self.running:
+                break
+            
+            failures += 1
+            if failures > self.RECONNECT_ATTEMPTS:
+                self.log("Giving up reconnecting to SSE stream")
+                self.running = False
+                break
+            
+            self.log(f"Reconnecting in {delay:.1f}s (attempt {failures}/{self.RECONNECT_ATTEMPTS})")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.RECONNECT_MAX_DELAY)
+    
+    async def listen_sse_stream(self) -> bool:
+        """
+        SSEストリームに1回接続してイベントを受け取る
+        
+        session_id があれば Last-Event-ID を付けて再接続し、
+        切断中に届いたレスポンスをサーバーから再送してもらいます。
+        接続が確立できた場合は True を返します。
+        """
+        sse_url = f"{self.server_url}/sse"
+        params = {}
+        headers = {}
+        if self.session_id:
+            params["session_id"] = self.session_id
+            if self.last_event_id:
+                headers["Last-Event-ID"] = self.last_event_id
+            self.log(f"Resuming SSE stream: {self.session_id} (after event {self.last_event_id or 0})")
+        else:
             self.log(f"Connecting to SSE stream: {sse_url}")
+        
+        async with aconnect_sse(
+            self.http_client,
+            "GET",
+            sse_url,
+            params=params,
+            headers=headers
+        ) as event_source:
+            
+            status = event_source.response.status_code
+            if self.session_id and status in (404, 409):
+                # セッションが失効した（再送できない）ので新しいセッションを開く
+                self.log(f"Cannot resume session {self.session_id} ({status}), opening a new one")
+                self.session_id = None
+                self.last_event_id = None
+                return False
+            event_source.response.raise_for_status()
             
-            async with aconnect_sse(
-                self.http_client,
-                "GET",
-                sse_url
-            ) as event_source:
+            # 圧縮（Content-Encoding）は httpx が Accept-Encoding を送り、受信時に展開する
+            encoding = event_source.response.headers.get("content-encoding", "identity")
+            self.log(f"SSE connection established (encoding: {encoding})")
+            
+            async for event in event_source.aiter_sse():
+                if not self.running:
+                    break
                 
-                self.log("SSE connection established")
+                if event.id:
+                    self.last_event_id = event.id
                 
-                async for event in event_source.aiter_sse():
-                    if not self.running:
-                        break
-                    
-                    if event.event == "connected":
-                        # 接続確立
-                        data = json.loads(event.data)
-                        self.session_id = data["session_id"]
-                        self.sse_connected = True
+                if event.event == "connected":
+                    # 接続確立
+                    data = mcp_codec.loads(event.data)
+                    self.session_id = data["session_id"]
+                    self.sse_connected = True
+                    if data.get("resumed"):
+                        self.log(f"Resumed session_id: {self.session_id}")
+                    else:
                         self.log(f"Received session_id: {self.session_id}")
+                
+                elif event.event == "message":
+                    # メッセージ受信
+                    # サーバーがエンコードしたJSONをそのままstdoutへ流す（再エンコードしない）
+                    # ログのためだけにデコードしないよう、ログにはサイズだけを出す
+                    payload = event.data.encode("utf-8")
+                    self.log(f"Received message ({len(payload)} bytes)")
                     
-                    elif event.event == "message":
-                        # メッセージ受信
-                        data = json.loads(event.data)
-                        self.log(f"Received message: {data.get('method', data.get('id'))}")
-                        
-                        # stdoutキューに追加
-                        await self.stdout_queue.put(data)
-                    
-                    elif event.event == "ping":
-                        # キープアライブ
-                        pass
-                    
-        except Exception as e:
-            self.log(f"SSE listener error: {e}")
-            import traceback
-            traceback.print_exc(file=sys.stderr)
-            self.sse_connected = False
-            self.running = False
+                    # stdoutキューに追加
+                    await self.stdout_queue.put(payload)
+                
+                elif event.event == "ping":
+                    # キープアライブ
+                    pass
+        
+        return True
     
     async def stdin_reader(self):
         """標準入力を読み取る"""
@@ -83,8 +191,8 @@ class SSEStdioProxy:
             
             while self.running:
                 try:
-                    # 標準入力から1行読み取る
-                    line = await loop.run_in_executor(None, sys.stdin.readline)
+                    # 標準入力から1行読み取る（バイト列のままデコードする）
+                    line = await loop.run_in_executor(None, sys.stdin.buffer.readline)
                     
                     if not line:
                         self.log("End of input (stdin closed)")
@@ -96,13 +204,13 @@ class SSEStdioProxy:
                         continue
                     
                     # JSONをパース
-                    message = json.loads(line)
-                    self.log(f"Read from stdin: {message.get('method', 'response')}")
+                    message = mcp_codec.loads(line)
+                    self.log(f"Read from stdin: {self.describe(message, 'response')}")
                     
                     # stdinキューに追加
                     await self.stdin_queue.put(message)
                     
-                except json.JSONDecodeError as e:
+                except mcp_codec.DecodeError as e:
                     self.log(f"JSON decode error: {e}")
                 except Exception as e:
                     self.log(f"Error reading stdin: {e}")
@@ -122,10 +230,14 @@ class SSEStdioProxy:
                         timeout=1.0
                     )
                     
-                    # JSONを標準出力に書き込む
-                    json_str = json.dumps(message)
-                    print(json_str, flush=True)
-                    self.log(f"Wrote to stdout: {message.get('id', 'notification')}")
+                    # JSONを標準出力に書き込む（エンコード済みのバイト列はそのまま）
+                    if isinstance(message, bytes):
+                        payload = message
+                    else:
+                        payload = mcp_codec.dumps(message)
+                    sys.stdout.buffer.write(payload + b"\n")
+                    sys.stdout.buffer.flush()
+                    self.log(f"Wrote to stdout: {len(payload)} bytes")
                     
                 except asyncio.TimeoutError:
                     # タイムアウト（正常）
@@ -141,13 +253,15 @@ class SSEStdioProxy:
         stdinキューからメッセージを取得してサーバーに転送
         """
         try:
-            # SSE接続が確立されるまで待つ
+            # SSE接続が確立されるまで待つ（streamable モードでは不要）
             for _ in range(100):  # 10秒待つ
+                if self.transport == "streamable":
+                    break
                 if self.sse_connected and self.session_id:
                     break
                 await asyncio.sleep(0.1)
             
-            if not self.sse_connected:
+            if self.transport == "sse" and not self.sse_connected:
                 self.log("Failed to establish SSE connection")
                 self.running = False
                 return
@@ -163,7 +277,19 @@ class SSEStdioProxy:
                     )
                     
                     # サーバーに転送
-                    await self.send_to_server(message)
+                    if self.transport == "streamable":
+                        # レスポンスを待つ間も次のメッセージを転送できるよう並行して送信
+                        task = asyncio.create_task(self.send_streamable(message))
+                        self.send_tasks.add(task)
+                        task.add_done_callback(self.send_tasks.discard)
+                    elif self.has_tool_call(message):
+                        # ツール呼び出しのPOSTはサーバーの同時処理数の空きを待つことがあるため、
+                        # 並行して送り、後ろの ping や tools/list を止めない
+                        task = asyncio.create_task(self.send_to_server(message))
+                        self.send_tasks.add(task)
+                        task.add_done_callback(self.send_tasks.discard)
+                    else:
+                        await self.send_to_server(message)
                     
                 except asyncio.TimeoutError:
                     # タイムアウト（正常）
@@ -174,7 +300,7 @@ class SSEStdioProxy:
         except Exception as e:
             self.log(f"message_forwarder error: {e}")
     
-    async def send_to_server(self, message: Dict[str, Any]):
+    async def send_to_server(self, message: Any):
         """サーバーにメッセージを送信"""
         try:
             # session_idをヘッダーに追加
@@ -183,47 +309,93 @@ class SSEStdioProxy:
                 "Content-Type": "application/json"
             }
             
-            self.log(f"Sending to server: {message.get('method', 'response')}")
+            self.log(f"Sending to server: {self.describe(message, 'response')}")
             
             # メッセージを送信
             response = await self.http_client.post(
                 f"{self.server_url}/messages",
-                json=message,
+                content=mcp_codec.dumps(message),
                 headers=headers,
                 timeout=30.0
             )
             
             if response.status_code == 200:
-                result = response.json()
+                result = mcp_codec.loads(response.content)
                 self.log(f"Server accepted: {result.get('status')}")
+            elif response.status_code == 429:
+                # レート制限: JSON-RPCエラー（data.retryAfter 付き）がボディで返る
+                self.log(f"Rate limited (Retry-After: {response.headers.get('retry-after')})")
+                if response.content:
+                    await self.stdout_queue.put(response.content)
             else:
                 self.log(f"Server error: {response.status_code}")
                 self.log(f"Response: {response.text}")
                 
                 # エラーレスポンスを生成
-                error_response = {
-                    "jsonrpc": "2.0",
-                    "id": message.get("id"),
-                    "error": {
-                        "code": -32000,
-                        "message": f"Server error: {response.status_code}"
-                    }
-                }
-                await self.stdout_queue.put(error_response)
+                error_response = self.error_response(
+                    message, -32000, f"Server error: {response.status_code}"
+                )
+                if error_response:
+                    await self.stdout_queue.put(error_response)
             
         except Exception as e:
             self.log(f"Error sending to server: {e}")
             
             # エラーレスポンスを生成
-            error_response = {
-                "jsonrpc": "2.0",
-                "id": message.get("id"),
-                "error": {
-                    "code": -32603,
-                    "message": f"Proxy error: {str(e)}"
-                }
+            error_response = self.error_response(message, -32603, f"Proxy error: {str(e)}")
+            if error_response:
+                await self.stdout_queue.put(error_response)
+    
+    async def send_streamable(self, message: Any):
+        """
+        POST /mcp にメッセージを送信し、レスポンスを直接受け取る
+        
+        サーバーが text/event-stream で応答した場合（長時間の処理）は、
+        そのストリームの message イベントを受け取ります。
+        """
+        try:
+            headers = {
+                "Content-Type": "application/json",
+                "Accept": "application/json, text/event-stream"
             }
-            await self.stdout_queue.put(error_response)
+            
+            self.log(f"Sending to server: {self.describe(message, 'response')}")
+            
+            async with self.http_client.stream(
+                "POST",
+                f"{self.server_url}/mcp",
+                content=mcp_codec.dumps(message),
+                headers=headers
+            ) as response:
+                if response.status_code == 202:
+                    # 通知のみ（応答なし）
+                    return
+                
+                if response.status_code != 200:
+                    body = await response.aread()
+                    self.log(f"Server error: {response.status_code}")
+                    self.log(f"Response: {body.decode('utf-8', 'replace')}")
+                    error_response = self.error_response(
+                        message, -32000, f"Server error: {response.status_code}"
+                    )
+                    if error_response:
+                        await self.stdout_queue.put(error_response)
+                    return
+                
+                content_type = response.headers.get("content-type", "")
+                if content_type.startswith("text/event-stream"):
+                    async for event in EventSource(response).aiter_sse():
+                        if event.event == "message":
+                            await self.stdout_queue.put(event.data.encode("utf-8"))
+                else:
+                    # エンコード済みのJSONをそのままstdoutへ流す
+                    await self.stdout_queue.put(await response.aread())
+        
+        except Exception as e:
+            self.log(f"Error sending to server: {e}")
+            error_response = self.error_response(message, -32603, f"Proxy error: {str(e)}")
+            if error_response:
+                await self.stdout_queue.put(error_response)
     
     async def run(self):
         """プロキシのメインループ"""
@@ -233,14 +405,18 @@ class SSEStdioProxy:
             
             self.log("Starting SSE stdio proxy")
             self.log(f"Server URL: {self.server_url}")
+            self.log(f"Transport: {self.transport}")
             
-            # 4つのタスクを並行実行
+            # 4つのタスクを並行実行（streamable モードではSSEリスナー不要）
             tasks = [
-                asyncio.create_task(self.sse_event_listener(), name="sse_listener"),
                 asyncio.create_task(self.stdin_reader(), name="stdin_reader"),
                 asyncio.create_task(self.stdout_writer(), name="stdout_writer"),
                 asyncio.create_task(self.message_forwarder(), name="message_forwarder")
             ]
+            if self.transport == "sse":
+                tasks.append(
+                    asyncio.create_task(self.sse_event_listener(), name="sse_listener")
+                )
             
             self.log("All tasks started")
             
@@ -254,7 +430,7 @@ class SSEStdioProxy:
             self.running = False
             
             # 残りのタスクをキャンセル
-            for task in pending:
+            for task in [*pending, *self.send_tasks]:
                 task.cancel()
                 try:
                     await task
@@ -289,10 +465,16 @@ async def main():
         default="http://127.0.0.1:8999",
         help="SSE server URL (default: http://127.0.0.1:8999)"
     )
+    parser.add_argument(
+        "--transport",
+        choices=SSEStdioProxy.TRANSPORTS,
+        default="sse",
+        help="sse: GET /sse + POST /messages, streamable: POST /mcp (default: sse)"
+    )
     
     args = parser.parse_args()
     
-    proxy = SSEStdioProxy(args.url)
+    proxy = SSEStdioProxy(args.url, args.transport)
     await proxy.run()
 
 
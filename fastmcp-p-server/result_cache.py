@@ -0,0 +1,107 @@
+"""
+ツール結果キャッシュ
+引数だけで結果が決まるツールの結果を、エンコード済みのまま保持する
+
+- キーは (ツール名, 引数を正規化したJSON)。キーの順序が違うだけの引数は同じキーになる
+- エントリ数・バイト数の上限を超えたら最も古く使われたものから捨てる（LRU）
+- TTL を過ぎたエントリは取り出すときに捨てる
+"""
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+CacheKey = Tuple[str, str]
+
+
+class ResultCache:
+    """LRU + TTL のキャッシュ（値はバイト数を持つ任意のオブジェクト）"""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # key → (期限, サイズ, 値)。末尾ほど最近使われた
+        self.entries: "OrderedDict[CacheKey, Tuple[float, int, Any]]" = OrderedDict()
+        self.bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+        # ツールごとのヒット/ミス数
+        self.counters: Dict[str, Dict[str, int]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    @staticmethod
+    def key_for(name: str, arguments: Any) -> Optional[CacheKey]:
+        """引数を正規化したキー（JSONにできない引数ならキャッシュしない）"""
+        try:
+            canonical = json.dumps(
+                arguments, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+            )
+        except (TypeError, ValueError):
+            return None
+        return (name, canonical)
+
+    def _count(self, name: str, outcome: str) -> None:
+        counter = self.counters.get(name)
+        if counter is None:
+            counter = self.counters[name] = {"hits": 0, "misses": 0}
+        counter[outcome] += 1
+
+    def get(self, key: CacheKey) -> Optional[Any]:
+        """キャッシュされた値を返す（なければ None）"""
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] < time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            entry = None
+        if entry is None:
+            self._count(key[0], "misses")
+            return None
+        self.entries.move_to_end(key)
+        self._count(key[0], "hits")
+        return entry[2]
+
+    def put(self, key: CacheKey, value: Any, size: int) -> None:
+        """値を保存し、上限を超えた分を古いものから捨てる"""
+        size += len(key[0]) + len(key[1])
+        if not self.enabled or size > self.max_bytes:
+            return
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = (time.monotonic() + self.ttl, size, value)
+        self.bytes += size
+        while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+            oldest = next(iter(self.entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: CacheKey) -> None:
+        _, size, _ = self.entries.pop(key)
+        self.bytes -= size
+
+    def clear(self) -> None:
+        """すべてのエントリを捨てる"""
+        self.entries.clear()
+        self.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """/health 用の統計"""
+        hits = sum(c["hits"] for c in self.counters.values())
+        misses = sum(c["misses"] for c in self.counters.values())
+        return {
+            "enabled": self.enabled,
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "tools": self.counters,
+        }
@@ -15,70 +15,902 @@ MCP over SSEの仕組み:
 3. SSEストリーム経由でレスポンスを受信
 """
 import sys
+import os
 from pathlib import Path
 from datetime import datetime
 import asyncio
-import json
-from typing import Dict, Any, Optional
-import uuid
+import contextvars
+import hashlib
+import math
+import inspect
+import multiprocessing
+import time
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, ProcessPoolExecutor
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Dict, Any, Awaitable, Callable, List, Optional, Tuple
 
 # プロジェクトルートをPYTHONPATHに追加
 project_root = Path(__file__).parent.parent
 if str(project_root) not in sys.path:
     sys.path.insert(0, str(project_root))
 
-from fastapi import FastAPI, Request
-from fastapi.responses import StreamingResponse, JSONResponse
+import mcp_codec
+from session_router import DELIVERED, QUEUE_FULL, create_router
+from sse_stream import SSEStreamResponse, KeepaliveScheduler, encode_event, PING_FRAME
+from ws_stream import WebSocketStream
+from tool_registry import ToolRegistry, Progress
+from tool_stream import ChunkPipe, pump
+from result_cache import ResultCache
+from single_flight import SingleFlight
+from metrics import MetricsRegistry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from server_log import ServerLogger, LEVELS as LOG_LEVELS
+from admission import TokenBucket, FairScheduler, Overloaded
+import stream_compression
+from fastapi import FastAPI, Request, WebSocket
+from fastapi.responses import StreamingResponse, JSONResponse, Response
 from sse_starlette.sse import EventSourceResponse
 import uvicorn
 
-# FastAPIアプリケーション
-app = FastAPI(title="MCP SSE Server", version="2.0.0")
+# ========================================
+# サーバー設定
+# ========================================
+
+def _parse_mapping(value: str) -> Dict[str, str]:
+    """"key=value,key=value" 形式の文字列を辞書に変換"""
+    mapping = {}
+    for item in value.split(","):
+        if "=" in item:
+            key, val = item.split("=", 1)
+            mapping[key.strip()] = val.strip()
+    return mapping
+
+
+@dataclass
+class ServerConfig:
+    """
+    サーバー設定
+
+    環境変数から読み込むため、uvicornのワーカープロセスにも
+    同じ設定が引き継がれます。
+    """
+    # ツール実行用スレッドプールのワーカー数
+    tool_thread_workers: int = min(32, (os.cpu_count() or 1) + 4)
+    # ツール実行用プロセスプールのワーカー数（0でプロセスプール無効）
+    tool_process_workers: int = os.cpu_count() or 1
+    # 同時に実行できるツール呼び出しの上限
+    tool_max_concurrency: int = 64
+    # 実行枠の空きを待てるツール呼び出しの数（全体 / 1セッションあたり）。超えたら即座に断る
+    tool_max_queued: int = 1024
+    session_max_queued: int = 32
+    # ツールごとの実行バックエンド（"thread" または "process"）
+    tool_backends: Dict[str, str] = field(default_factory=dict)
+    # ツール呼び出しの期限（秒、リクエストの受信から数える。0で無期限）と、ツールごとの上書き
+    tool_timeout: float = 30.0
+    tool_timeouts: Dict[str, str] = field(default_factory=dict)
+    # キープアライブ（ping）の送信間隔（秒）
+    keepalive_interval: float = 30.0
+    # 1セッションあたり同時に処理できるリクエスト数
+    session_max_inflight: int = 16
+    # 1セッションが送れるリクエスト数/秒と、まとめて送れる数（0で無制限）
+    session_rate_limit: float = 50.0
+    session_rate_burst: float = 100.0
+    # SSEストリームで1回の書き込みにまとめる最大バイト数（0で合体しない）と、
+    # バースト中に続きのフレームを待つ秒数（キューが空だった1件は待たない）
+    sse_batch_bytes: int = 64 * 1024
+    sse_batch_delay: float = 0.0
+    # POST /mcp でこの秒数以内に終わらなければSSEストリームに切り替える
+    streamable_stream_after: float = 1.0
+    # ワーカー間ルーティング用ソケットのディレクトリ（空ならプロセス内のみ）
+    router_socket_dir: str = ""
+    # 1ワーカーが受け付けるSSEセッション数の上限
+    max_sessions: int = 1000
+    # 1セッションの送信キューに溜められるフレーム数とバイト数
+    session_queue_max_frames: int = 1000
+    session_queue_max_bytes: int = 8 * 1024 * 1024
+    # 送信キューがあふれたときの動作（block / drop_oldest / disconnect）
+    session_overflow_policy: str = "block"
+    # リクエストがないまま経過したらセッションを閉じる秒数（0で無効）
+    session_idle_timeout: float = 3600.0
+    # 再接続時に再送するため、1セッションが保持する送信済みイベントの数とバイト数
+    session_replay_frames: int = 128
+    session_replay_bytes: int = 1024 * 1024
+    # ストリームが切れてから再接続を待つ秒数（0で切断と同時にセッションを閉じる）
+    session_resume_timeout: float = 60.0
+    # ツール結果キャッシュ（cache=True で宣言したツールのみ。エントリ数0で無効）
+    tool_cache_max_entries: int = 4096
+    tool_cache_max_bytes: int = 16 * 1024 * 1024
+    tool_cache_ttl: float = 300.0
+    # 応答の圧縮に使う方式（優先順はサーバー側で固定。空文字列で圧縮しない）
+    compression: str = ",".join(stream_compression.ENCODINGS)
+    # POST /mcp のレスポンスを圧縮する最小バイト数
+    compress_min_bytes: int = 1024
+    # ログレベルと、リクエストごとのログを出力する割合（0.0〜1.0）
+    log_level: str = "INFO"
+    log_sample_rate: float = 1.0
+
+    @classmethod
+    def from_env(cls) -> "ServerConfig":
+        """環境変数から設定を読み込む"""
+        config = cls()
+        for name, var in CONFIG_ENV_VARS.items():
+            if var not in os.environ:
+                continue
+            value = os.environ[var]
+            current = getattr(config, name)
+            if isinstance(current, dict):
+                setattr(config, name, _parse_mapping(value))
+            else:
+                setattr(config, name, type(current)(value))
+        if config.session_overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {config.session_overflow_policy}")
+        for encoding in config.compression_encodings():
+            if encoding not in stream_compression.ENCODINGS:
+                raise ValueError(f"Unsupported compression: {encoding}")
+        return config
+
+    def compression_encodings(self) -> List[str]:
+        """有効にした圧縮方式"""
+        return [e.strip() for e in self.compression.split(",") if e.strip() and e.strip() != "none"]
+
+
+# 設定項目と環境変数の対応
+CONFIG_ENV_VARS = {
+    "tool_thread_workers": "MCP_TOOL_THREAD_WORKERS",
+    "tool_process_workers": "MCP_TOOL_PROCESS_WORKERS",
+    "tool_max_concurrency": "MCP_TOOL_MAX_CONCURRENCY",
+    "tool_max_queued": "MCP_TOOL_MAX_QUEUED",
+    "session_max_queued": "MCP_SESSION_MAX_QUEUED",
+    "tool_backends": "MCP_TOOL_BACKENDS",
+    "tool_timeout": "MCP_TOOL_TIMEOUT",
+    "tool_timeouts": "MCP_TOOL_TIMEOUTS",
+    "keepalive_interval": "MCP_KEEPALIVE_INTERVAL",
+    "session_max_inflight": "MCP_SESSION_MAX_INFLIGHT",
+    "session_rate_limit": "MCP_SESSION_RATE_LIMIT",
+    "session_rate_burst": "MCP_SESSION_RATE_BURST",
+    "sse_batch_bytes": "MCP_SSE_BATCH_BYTES",
+    "sse_batch_delay": "MCP_SSE_BATCH_DELAY",
+    "streamable_stream_after": "MCP_STREAMABLE_STREAM_AFTER",
+    "router_socket_dir": "MCP_ROUTER_SOCKET_DIR",
+    "max_sessions": "MCP_MAX_SESSIONS",
+    "session_queue_max_frames": "MCP_SESSION_QUEUE_FRAMES",
+    "session_queue_max_bytes": "MCP_SESSION_QUEUE_BYTES",
+    "session_overflow_policy": "MCP_SESSION_OVERFLOW",
+    "session_idle_timeout": "MCP_SESSION_IDLE_TIMEOUT",
+    "session_replay_frames": "MCP_SESSION_REPLAY_FRAMES",
+    "session_replay_bytes": "MCP_SESSION_REPLAY_BYTES",
+    "session_resume_timeout": "MCP_SESSION_RESUME_TIMEOUT",
+    "tool_cache_max_entries": "MCP_TOOL_CACHE_ENTRIES",
+    "tool_cache_max_bytes": "MCP_TOOL_CACHE_BYTES",
+    "tool_cache_ttl": "MCP_TOOL_CACHE_TTL",
+    "compression": "MCP_COMPRESSION",
+    "compress_min_bytes": "MCP_COMPRESS_MIN_BYTES",
+    "log_level": "MCP_LOG_LEVEL",
+    "log_sample_rate": "MCP_LOG_SAMPLE_RATE",
+}
+
+OVERFLOW_POLICIES = ("block", "drop_oldest", "disconnect")
+
+config = ServerConfig.from_env()
+
+# ログはキュー経由でバックグラウンドスレッドが書き出す（イベントループで print しない）
+log = ServerLogger("mcp.sse", config.log_level, config.log_sample_rate)
+
+
+# ========================================
+# メトリクス
+# ========================================
+
+# 更新はすべてイベントループ上で行う（/metrics で Prometheus 形式に出力）
+metrics = MetricsRegistry()
+REQUESTS = metrics.counter(
+    "mcp_requests_total", "JSON-RPC requests processed", ("method",)
+)
+REQUEST_ERRORS = metrics.counter(
+    "mcp_request_errors_total", "JSON-RPC requests answered with an error", ("method",)
+)
+REQUEST_LATENCY = metrics.histogram(
+    "mcp_request_duration_seconds",
+    "Time from POST receipt until the response is written to the stream",
+    ("method",)
+)
+TOOL_CALLS = metrics.counter("mcp_tool_calls_total", "tools/call requests", ("tool",))
+TOOL_ERRORS = metrics.counter(
+    "mcp_tool_errors_total", "tools/call requests whose result has isError", ("tool",)
+)
+TOOL_DURATION = metrics.histogram(
+    "mcp_tool_duration_seconds", "Tool execution time in the executor pool", ("tool",)
+)
+TOOL_QUEUE_TIME = metrics.histogram(
+    "mcp_tool_queue_seconds", "Time a tool call waited for an executor slot", ("tool",)
+)
+TOOL_TIMEOUTS = metrics.counter(
+    "mcp_tool_timeouts_total", "tools/call requests that ran past their deadline", ("tool",)
+)
+REQUESTS_CANCELLED = metrics.counter(
+    "mcp_requests_cancelled_total", "Requests cancelled before a response was sent", ("method",)
+)
+REQUESTS_REJECTED = metrics.counter(
+    "mcp_requests_rejected_total", "Requests refused because the server was overloaded", ("reason",)
+)
+SSE_FRAMES = metrics.counter("mcp_sse_frames_sent_total", "SSE frames written to streams")
+SSE_BYTES = metrics.counter("mcp_sse_bytes_sent_total", "SSE bytes written to streams")
+SSE_FRAMES_PER_WRITE = metrics.histogram(
+    "mcp_sse_frames_per_write", "SSE frames coalesced into one write to a stream",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+WS_FRAMES = metrics.counter("mcp_ws_frames_sent_total", "WebSocket messages written to connections")
+WS_BYTES = metrics.counter("mcp_ws_bytes_sent_total", "WebSocket payload bytes written to connections")
+BROADCAST_FRAMES = metrics.counter(
+    "mcp_broadcast_frames_total", "Broadcast notifications offered to sessions", ("result",)
+)
+
+# レイテンシの記録に使う (POST受信時刻, メソッドのラベル一覧)
+RequestTiming = Tuple[float, List[str]]
+
+
+def method_label(method: Any) -> str:
+    """メトリクスのラベルに使うメソッド名（未知のメソッドは other にまとめる）"""
+    if isinstance(method, str) and (method in METHOD_HANDLERS or method in NOTIFICATION_METHODS):
+        return method
+    return "other"
+
+
+def tool_label(name: Any) -> str:
+    """メトリクスのラベルに使うツール名（未登録のツールは other にまとめる）"""
+    if isinstance(name, str) and name in tools:
+        return name
+    return "other"
+
+
+def request_timing(message: Any, received_at: float) -> RequestTiming:
+    """応答が返るリクエスト（id を持つもの）のメソッドを集めておく"""
+    members = message if isinstance(message, list) else [message]
+    methods = [
+        method_label(m.get("method"))
+        for m in members
+        if isinstance(m, dict) and "id" in m
+    ]
+    return (received_at, methods)
+
+
+def observe_latency(timing: RequestTiming, now: float) -> None:
+    """POST受信から応答の書き込みまでの時間を記録"""
+    received_at, methods = timing
+    for method in methods:
+        REQUEST_LATENCY.observe(now - received_at, method)
+
+
+# ========================================
+# セッション管理
+# ========================================
+
+# 通知（notifications/progress など）の送り先
+NotificationSink = Callable[[bytes], Awaitable[bool]]
+
+
+class InflightRequests:
+    """
+    処理中のリクエスト（JSON-RPC の id → 処理しているタスク）
+
+    notifications/cancelled で id を指定されたタスクをキャンセルします。
+    キャンセルされたリクエストにはレスポンスを返しません。
+    """
+
+    def __init__(self):
+        self.tasks: Dict[Any, asyncio.Task] = {}
+        # notifications/cancelled でキャンセルした id（他の理由のキャンセルと区別する）
+        self.cancelled: set = set()
+
+    @staticmethod
+    def key(request_id: Any) -> Any:
+        """id を辞書のキーにする（1 と "1" は別の id。追跡できない id なら None）"""
+        if isinstance(request_id, bool) or not isinstance(request_id, (str, int, float)):
+            return None
+        return (isinstance(request_id, str), request_id)
+
+    def track(self, key: Any, task: asyncio.Task) -> None:
+        self.tasks[key] = task
+
+    def untrack(self, key: Any, task: asyncio.Task) -> None:
+        if self.tasks.get(key) is task:
+            del self.tasks[key]
+        self.cancelled.discard(key)
+
+    def cancel(self, key: Any) -> bool:
+        """id のリクエストをキャンセル（処理中でなければ False）"""
+        task = self.tasks.get(key)
+        if task is None or task.done():
+            return False
+        self.cancelled.add(key)
+        task.cancel()
+        return True
+
+
+@dataclass
+class RequestContext:
+    """処理中のリクエストの呼び出し元（SSEセッション、または POST /mcp の接続元）"""
+    # ツール実行の順番待ちに使う持ち主（セッションIDまたは接続元）
+    owner: str
+    # 通知の送り先（POST /mcp では None で、通知は送らない）
+    notify: Optional[NotificationSink] = None
+    # notifications/cancelled で取り消せるリクエスト（POST /mcp では None）
+    requests: Optional[InflightRequests] = None
+
+
+# 処理中のリクエストの呼び出し元（タスクごと。バッチの子タスクにも引き継がれる）
+request_context: contextvars.ContextVar[RequestContext] = contextvars.ContextVar(
+    "request_context", default=RequestContext("")
+)
+
+# 処理中のリクエストを受信した時刻（loop.time()。ツール呼び出しの期限はここから数える）
+request_received_at: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "request_received_at", default=None
+)
+
+class Session:
+    """
+    SSE接続1本分の状態
+
+    1つのセッションは複数のJSON-RPCリクエストを同時に処理できます。
+    レスポンスは完了した順にキューへ入り、クライアントは id で対応付けます。
+
+    送信キューはフレーム数とバイト数で制限され、あふれた場合は
+    session_overflow_policy に従います。
+    - block: 空きが出るまでレスポンスの投入を待つ
+    - drop_oldest: 古いフレームから捨てる
+    - disconnect: セッションを閉じる
+
+    レスポンスのイベントには連番の id を付け、直近のものをリプレイ用の
+    リングバッファに残します。ストリームが切れてもセッションは
+    session_resume_timeout のあいだ残り、Last-Event-ID 付きで再接続した
+    クライアントには続きのイベントを再送します。
+    """
+
+    # /health に出すトランスポート名
+    transport = "sse"
+    # セッションのログの先頭に付けるタグ
+    log_tag = "[SSE]"
+    # キープアライブで送るフレーム（None なら送らない）
+    ping_frame: Optional[bytes] = PING_FRAME
+    # 書き込んだフレーム数とバイト数のメトリクス
+    frames_counter = SSE_FRAMES
+    bytes_counter = SSE_BYTES
+
+    def __init__(self, session_id: str, max_inflight: int):
+        self.session_id = session_id
+        # SSEストリームへ送信するフレーム（エンコード済みバイト列）のキュー
+        self.responses: asyncio.Queue = asyncio.Queue()
+        # 現在接続中のストリーム（切断中は None）
+        self.stream: Optional[SSEStreamResponse] = None
+        self.detached_at: Optional[float] = None
+        # 次に付けるイベントID と、再送用のリングバッファ [(event_id, frame), ...]
+        self.next_event_id = 1
+        self.replay: deque = deque()
+        self.replay_bytes = 0
+        # 同時処理数の上限
+        self.inflight = asyncio.Semaphore(max_inflight)
+        # 受け付けるリクエスト数/秒の上限
+        self.bucket = TokenBucket(
+            config.session_rate_limit,
+            config.session_rate_burst,
+            asyncio.get_running_loop().time()
+        )
+        # 処理中のリクエストタスク（GCされないよう参照を保持）
+        self.tasks: set = set()
+        # JSON-RPC の id ごとの処理中のリクエストと、このセッションのリクエストの呼び出し元
+        self.requests = InflightRequests()
+        self.context = RequestContext(session_id, self.deliver, self.requests)
+        now = asyncio.get_running_loop().time()
+        # 最後にストリームへ書き込んだ時刻（キープアライブの判定に使う）
+        self.last_sent = now
+        # 最後にクライアントから活動があった時刻（アイドル判定に使う）
+        self.last_activity = now
+        self.created_at = now
+        self.closed = False
+        # バイト数の計測
+        self.queued_bytes = 0
+        self.sent_bytes = 0
+        self.sent_frames = 0
+        self.dropped_frames = 0
+        # キューに空きができたことを block ポリシーの待ち手に知らせる
+        self.space = asyncio.Event()
+        self.space.set()
+        # 送信待ちのレスポンスフレーム（id()）→ レイテンシの記録用
+        self.timings: Dict[int, RequestTiming] = {}
+
+    def touch(self) -> None:
+        """クライアントの活動を記録"""
+        self.last_activity = asyncio.get_running_loop().time()
+
+    def mark_sent(self, frame: bytes) -> None:
+        """ストリームへの書き込みを記録"""
+        self.last_sent = asyncio.get_running_loop().time()
+        self.queued_bytes -= len(frame)
+        self.sent_bytes += len(frame)
+        self.sent_frames += 1
+        self.space.set()
+        self.frames_counter.inc()
+        self.bytes_counter.inc(amount=len(frame))
+        if self.timings:
+            timing = self.timings.pop(id(frame), None)
+            if timing is not None:
+                observe_latency(timing, self.last_sent)
+
+    @staticmethod
+    def encode_notification(payload: bytes) -> bytes:
+        """
+        ブロードキャストする通知のフレーム（同じトランスポートのセッションで共有する）
+
+        セッションごとのイベントIDを付けないため、再接続時の再送の対象にはなりません。
+        """
+        return encode_event("message", payload)
+
+    def _has_room(self, size: int) -> bool:
+        if self.responses.empty():
+            # 空のキューには上限を超える1フレームでも入れる
+            return True
+        return (
+            self.responses.qsize() < config.session_queue_max_frames
+            and self.queued_bytes + size <= config.session_queue_max_bytes
+        )
+
+    def push(self, frame: bytes) -> None:
+        """上限を確認せずにフレームを送信キューに入れる"""
+        self.responses.put_nowait(frame)
+        self.queued_bytes += len(frame)
+
+    async def _wait_for_room(self, size: int, block: bool) -> bool:
+        """
+        送信キューに size バイト分の空きを作る（作れなければ False）
+
+        block=False の場合、block ポリシーでも待たずにフレームを捨てます。
+        """
+        while not self.closed and not self._has_room(size):
+            policy = config.session_overflow_policy
+            if policy == "drop_oldest":
+                dropped = self.responses.get_nowait()
+                self.queued_bytes -= len(dropped)
+                self.dropped_frames += 1
+                self.timings.pop(id(dropped), None)
+            elif policy == "disconnect":
+                log.warning(self.log_tag + " Queue overflow, closing", session_id=self.session_id)
+                self.close()
+            elif block:
+                self.space.clear()
+                await self.space.wait()
+            else:
+                self.dropped_frames += 1
+                return False
+        return not self.closed
+
+    async def enqueue(self, frame: bytes, block: bool = True) -> bool:
+        """フレームを送信キューに入れる（入れられなければ False）"""
+        if not await self._wait_for_room(len(frame), block):
+            return False
+        self.push(frame)
+        return True
+
+    def remember(self, event_id: int, frame: bytes) -> None:
+        """送信するイベントを再送用に残す（古いものから上限まで捨てる）"""
+        self.replay.append((event_id, frame))
+        self.replay_bytes += len(frame)
+        while self.replay and (
+            len(self.replay) > config.session_replay_frames
+            or self.replay_bytes > config.session_replay_bytes
+        ):
+            _, dropped = self.replay.popleft()
+            self.replay_bytes -= len(dropped)
+
+    def can_resume(self, last_event_id: int) -> bool:
+        """last_event_id より後のイベントがすべてリングバッファに残っているか"""
+        if last_event_id >= self.next_event_id:
+            return False
+        first = self.replay[0][0] if self.replay else self.next_event_id
+        return first <= last_event_id + 1
+
+    def attach(self, stream: SSEStreamResponse, last_event_id: Optional[int] = None) -> None:
+        """
+        ストリームを接続する
+
+        再接続の場合は送信キューを捨て、last_event_id より後のイベントを
+        リングバッファから入れ直します（未送信だったものも含めて再送される）。
+        """
+        self.stream = stream
+        self.detached_at = None
+        if last_event_id is None:
+            return
+        while not self.responses.empty():
+            # 捨てたフレームのレイテンシは記録しない（id() が再利用されて別のフレームに付かないように）
+            self.timings.pop(id(self.responses.get_nowait()), None)
+        self.queued_bytes = 0
+        for event_id, frame in self.replay:
+            if event_id > last_event_id:
+                self.push(frame)
+        self.space.set()
+
+    def detach(self, stream: SSEStreamResponse) -> None:
+        """ストリームが切れたときの処理（再接続を待つか、セッションを閉じる）"""
+        if self.closed or self.stream is not stream:
+            # すでに新しいストリームに切り替わっている
+            return
+        self.stream = None
+        if not config.session_resume_timeout:
+            self.close()
+            return
+        self.detached_at = asyncio.get_running_loop().time()
+        log.info("[SSE] Stream detached, awaiting resume", session_id=self.session_id)
+
+    def close(self) -> None:
+        """セッションを閉じ、SSEストリームを終了させる"""
+        if self.closed:
+            return
+        self.closed = True
+        if active_connections.get(self.session_id) is self:
+            del active_connections[self.session_id]
+            router.unregister(self.session_id)
+        # ストリームを終わらせ、待っている投入側を起こす
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream = None
+        self.space.set()
+        # 受け取る相手がいなくなったので処理中のリクエストを止める
+        for task in list(self.tasks):
+            task.cancel()
+        log.info(self.log_tag + " Connection closed", session_id=self.session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """/health 用のセッション統計"""
+        now = asyncio.get_running_loop().time()
+        return {
+            "session_id": self.session_id,
+            "transport": self.transport,
+            "queued_frames": self.responses.qsize(),
+            "queued_bytes": self.queued_bytes,
+            "sent_frames": self.sent_frames,
+            "sent_bytes": self.sent_bytes,
+            "dropped_frames": self.dropped_frames,
+            "attached": self.stream is not None,
+            "encoding": self.stream.compressor.encoding if self.stream and self.stream.compressor else None,
+            "last_event_id": self.next_event_id - 1,
+            "replay_frames": len(self.replay),
+            "replay_bytes": self.replay_bytes,
+            "inflight": len(self.tasks),
+            "idle_seconds": round(now - self.last_activity, 1),
+            "age_seconds": round(now - self.created_at, 1),
+        }
+
+    def submit(
+        self,
+        message: Any,
+        timing: Optional[RequestTiming] = None,
+        control: bool = False
+    ) -> None:
+        """
+        メッセージ（単一リクエストまたはバッチ配列）をバックグラウンドで処理する
+
+        同時処理数（inflight）の空きは、呼び出し元を止めずにタスクの中で待つ。
+        空きを待っているタスクも tasks に入るので、呼び出し元は len(tasks) で
+        待ち行列の長さを制限できる。制御系のメッセージ（control=True）は inflight を使わない。
+
+        単一のリクエストは空きを待つあいだも id で追跡し、送った直後の
+        notifications/cancelled でも取り消せるようにする（バッチの要素は処理が始まってから）。
+        """
+        task = asyncio.create_task(self._process(message, timing, control))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        key = InflightRequests.key(message.get("id")) if isinstance(message, dict) else None
+        if key is not None:
+            self.requests.track(key, task)
+            task.add_done_callback(partial(self._untrack, key, method_label(message.get("method"))))
+
+    def _untrack(self, key: Any, method: str, task: asyncio.Task) -> None:
+        if task.cancelled() and key in self.requests.cancelled and self.requests.tasks.get(key) is task:
+            # 処理が始まる前に取り消された（始まっていれば process_mcp_request が数えている）
+            REQUESTS_CANCELLED.inc(method)
+        self.requests.untrack(key, task)
+
+    async def _process(
+        self,
+        message: Any,
+        timing: Optional[RequestTiming],
+        control: bool = False
+    ) -> None:
+        # このタスク（とバッチの子タスク）のツール呼び出しはこのセッションの順番で実行し、
+        # 途中経過の通知はこのセッションのストリームへ送る
+        request_context.set(self.context)
+        if timing is not None:
+            request_received_at.set(timing[0])
+        if not control:
+            await self.inflight.acquire()
+        try:
+            if self.closed:
+                # 空きを待つあいだにセッションが閉じられた（実行プールには渡さない）
+                return
+            response = await process_mcp_message(message)
+            if response:
+                await self.deliver(encode_response(response), timing=timing)
+        finally:
+            if not control:
+                self.inflight.release()
+
+    async def deliver(
+        self,
+        payload: bytes,
+        block: bool = True,
+        timing: Optional[RequestTiming] = None
+    ) -> bool:
+        """
+        エンコード済みレスポンスをSSEストリームへ送る
+
+        timing を渡すと、ストリームに書き込んだ時点でレイテンシを記録します。
+        """
+        # 処理中に切断されたセッションには送らない
+        if active_connections.get(self.session_id) is not self:
+            return False
+        # レスポンスの配信はクライアントの活動とみなす（他ワーカー経由のPOSTも含む）
+        self.touch()
+        # id 行の分だけ多めに見積もって空きを待つ
+        if not await self._wait_for_room(len(payload) + 64, block):
+            return False
+        # 待機のあとで id を振るので、キュー内のイベントは常に id 順に並ぶ
+        event_id = self.next_event_id
+        self.next_event_id += 1
+        frame = encode_event("message", payload, event_id)
+        self.remember(event_id, frame)
+        self.push(frame)
+        if timing is not None:
+            self.timings[id(frame)] = timing
+        return True
+
+
+class RemoteSession(Session):
+    """
+    別のワーカーがSSEストリームを保持しているセッション
+
+    POSTを受けたこのワーカーでリクエストを処理し、
+    レスポンスはルーター経由でストリームを保持するワーカーへ届けます。
+    レイテンシは相手のワーカーに渡した時点までを記録します。
+
+    この窓口は find_session のたびに持ち主のワーカーへセッションの存在を確かめ、
+    閉じられていれば片付けます。リクエストが途絶えた窓口はキープアライブの
+    間隔で捨てます（次のPOSTで作り直す）。
+
+    持ち主のワーカーで送信キューがいっぱいだった場合は、ローカルのセッションの
+    block と同じく、空くまで（間隔を広げながら）送り直します。
+    """
+
+    # 送信キューは使わないので ping は入れない
+    ping_frame = None
+    # 送信キューがいっぱいだったときに送り直すまでの間隔（秒、最初と最大）
+    retry_delay = 0.01
+    max_retry_delay = 0.5
+
+    async def deliver(
+        self,
+        payload: bytes,
+        block: bool = True,
+        timing: Optional[RequestTiming] = None
+    ) -> bool:
+        delay = self.retry_delay
+        while not self.closed:
+            result = await router.deliver(self.session_id, payload)
+            if result == DELIVERED:
+                if timing is not None:
+                    observe_latency(timing, asyncio.get_running_loop().time())
+                return True
+            if result != QUEUE_FULL:
+                # 相手側でセッションが閉じられた
+                self.close()
+                return False
+            if not block:
+                return False
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_retry_delay)
+        return False
+
+    def close(self) -> None:
+        """窓口を片付ける（セッション本体は持ち主のワーカーが閉じる）"""
+        if self.closed:
+            return
+        self.closed = True
+        if remote_sessions.get(self.session_id) is self:
+            del remote_sessions[self.session_id]
+        # レスポンスを届ける先がないので処理中のリクエストを止める
+        for task in list(self.tasks):
+            task.cancel()
+
+
+class WebSocketSession(Session):
+    """
+    /ws の WebSocket 接続1本分のセッション
+
+    リクエストとレスポンスを同じ接続で運ぶため、レスポンスはSSEのイベント
+    （event / id 行）に包まず、エンコード済みのJSONをそのまま1フレームとして送ります。
+    Last-Event-ID による再接続はないので、切断と同時にセッションを閉じます。
+    キープアライブは WebSocket の ping（uvicorn が送る）に任せ、ここでは送りません。
+    """
+
+    transport = "websocket"
+    log_tag = "[WS]"
+    ping_frame = None
+    frames_counter = WS_FRAMES
+    bytes_counter = WS_BYTES
+
+    @staticmethod
+    def encode_notification(payload: bytes) -> bytes:
+        return payload
+
+    async def deliver(
+        self,
+        payload: bytes,
+        block: bool = True,
+        timing: Optional[RequestTiming] = None
+    ) -> bool:
+        if active_connections.get(self.session_id) is not self:
+            return False
+        self.touch()
+        if not await self._wait_for_room(len(payload), block):
+            return False
+        self.push(payload)
+        if timing is not None:
+            self.timings[id(payload)] = timing
+        return True
+
+    def detach(self, stream: WebSocketStream) -> None:
+        if self.closed or self.stream is not stream:
+            return
+        self.stream = None
+        self.close()
+
+
+async def find_session(session_id: str) -> Optional[Session]:
+    """session_id に対応するセッションを探す（他ワーカーのセッションも含む）"""
+    session = active_connections.get(session_id)
+    if session is not None:
+        return session
+    if router.is_local(session_id) or not await router.exists(session_id):
+        # 持ち主のワーカーで閉じられたセッションの窓口は片付ける
+        session = remote_sessions.get(session_id)
+        if session is not None:
+            session.close()
+        return None
+    session = remote_sessions.get(session_id)
+    if session is None:
+        session = RemoteSession(session_id, config.session_max_inflight)
+        remote_sessions[session_id] = session
+        keepalive.add(session)
+    return session
+
 
 # 接続管理
-active_connections: Dict[str, asyncio.Queue] = {}
-pending_responses: Dict[str, asyncio.Queue] = {}
+active_connections: Dict[str, Session] = {}
+# 他ワーカーが保持するセッションの窓口
+remote_sessions: Dict[str, RemoteSession] = {}
+# ワーカー間でレスポンスを届けるルーター
+router = create_router(config.router_socket_dir)
+# 全セッション共通のキープアライブ（起動時に生成される）
+keepalive: Optional[KeepaliveScheduler] = None
+
+
+def on_session_idle(session: Session) -> None:
+    """
+    キープアライブ間隔のあいだ何も送っていないセッションの処理
+
+    リクエストのないまま session_idle_timeout を過ぎたセッションや、
+    session_resume_timeout を過ぎても再接続されないセッションは閉じ、
+    それ以外には事前エンコード済みの ping を送ります。
+    他ワーカーのセッションの窓口は、キープアライブ間隔のあいだリクエストがなければ捨てます。
+    """
+    now = asyncio.get_running_loop().time()
+    if isinstance(session, RemoteSession):
+        if not session.tasks and now - session.last_activity >= config.keepalive_interval:
+            session.close()
+        return
+    if session.detached_at is not None:
+        # 再接続待ち（ping は送らない）
+        if now - session.detached_at >= config.session_resume_timeout:
+            log.warning("[SSE] Resume timeout", session_id=session.session_id)
+            session.close()
+        return
+    idle = now - session.last_activity
+    if config.session_idle_timeout and not session.tasks and idle >= config.session_idle_timeout:
+        log.warning(session.log_tag + " Idle timeout", session_id=session.session_id)
+        session.close()
+        return
+    # 未送信のフレームがあるなら ping は不要
+    if session.ping_frame is not None and session.responses.empty():
+        session.push(session.ping_frame)
 
 
 # ========================================
 # ツール実装
 # ========================================
 
-def execute_tool(name: str, arguments: Dict[str, Any]) -> str:
-    """ツールを実行"""
-    
-    if name == "hello":
-        user_name = arguments.get("name", "名無し")
-        if len(user_name) > 50:
-            raise ValueError("名前は50文字以内にしてください")
-        return f"こんにちは、{user_name}さん！🎉\nSSE経由のMCPサーバーから挨拶します。"
-    
-    elif name == "add":
-        a = arguments.get("a", 0)
-        b = arguments.get("b", 0)
-        result = a + b
-        return f"計算結果: {a} + {b} = {result}"
-    
-    elif name == "multiply":
-        a = arguments.get("a", 0)
-        b = arguments.get("b", 0)
-        result = a * b
-        return f"計算結果: {a} × {b} = {result}"
-    
-    elif name == "divide":
-        a = arguments.get("a", 0)
-        b = arguments.get("b", 0)
-        if b == 0:
-            raise ValueError("0で割ることはできません")
-        result = a / b
-        return f"計算結果: {a} ÷ {b} = {result}"
-    
-    elif name == "get_time":
-        now = datetime.now()
-        return f"現在の日時: {now.strftime('%Y年%m月%d日 %H:%M:%S')}"
-    
-    elif name == "server_info":
-        return """サーバー情報:
+# ツールはスキーマと実装をまとめてここで宣言する（登録順が tools/list の並び順）
+tools = ToolRegistry()
+
+
+@tools.tool(
+    "hello",
+    "シンプルな挨拶を返します",
+    properties={
+        "name": {"type": "string", "description": "挨拶する相手の名前"}
+    },
+    required=["name"],
+    cache=True
+)
+def tool_hello(arguments: Dict[str, Any]) -> str:
+    user_name = arguments.get("name", "名無し")
+    if len(user_name) > 50:
+        raise ValueError("名前は50文字以内にしてください")
+    return f"こんにちは、{user_name}さん！🎉\nSSE経由のMCPサーバーから挨拶します。"
+
+
+@tools.tool(
+    "add",
+    "2つの数値を足し算します",
+    properties={
+        "a": {"type": "number", "description": "1つ目の数値"},
+        "b": {"type": "number", "description": "2つ目の数値"}
+    },
+    required=["a", "b"],
+    cache=True
+)
+def tool_add(arguments: Dict[str, Any]) -> str:
+    a = arguments.get("a", 0)
+    b = arguments.get("b", 0)
+    result = a + b
+    return f"計算結果: {a} + {b} = {result}"
+
+
+@tools.tool(
+    "multiply",
+    "2つの数値を掛け算します",
+    properties={
+        "a": {"type": "number"},
+        "b": {"type": "number"}
+    },
+    required=["a", "b"],
+    cache=True
+)
+def tool_multiply(arguments: Dict[str, Any]) -> str:
+    a = arguments.get("a", 0)
+    b = arguments.get("b", 0)
+    result = a * b
+    return f"計算結果: {a} × {b} = {result}"
+
+
+@tools.tool(
+    "divide",
+    "2つの数値を割り算します",
+    properties={
+        "a": {"type": "number"},
+        "b": {"type": "number"}
+    },
+    required=["a", "b"],
+    cache=True
+)
+def tool_divide(arguments: Dict[str, Any]) -> str:
+    a = arguments.get("a", 0)
+    b = arguments.get("b", 0)
+    if b == 0:
+        raise ValueError("0で割ることはできません")
+    result = a / b
+    return f"計算結果: {a} ÷ {b} = {result}"
+
+
+@tools.tool("get_time", "現在の日時を返します")
+def tool_get_time(arguments: Dict[str, Any]) -> str:
+    now = datetime.now()
+    return f"現在の日時: {now.strftime('%Y年%m月%d日 %H:%M:%S')}"
+
+
+@tools.tool("server_info", "サーバー情報を返します")
+def tool_server_info(arguments: Dict[str, Any]) -> str:
+    return """サーバー情報:
 名前: hello-world-mcp
 バージョン: 2.0.0
 トランスポート: SSE (Server-Sent Events)
@@ -86,10 +918,321 @@ def execute_tool(name: str, arguments: Dict[str, Any]) -> str:
 エンドポイント:
   - GET /sse (SSEストリーム)
   - POST /messages (メッセージ送信)
+  - POST /mcp (Streamable HTTP)
+  - WS /ws (WebSocket)
   - GET /health (ヘルスチェック)"""
-    
-    else:
-        raise ValueError(f"Unknown tool: {name}")
+
+
+# CPUを長時間占有するツールはGILの影響を受けないプロセスプールで実行し、
+# 同じ引数で同時に呼ばれた場合は1回だけ実行する
+@tools.tool(
+    "count_primes",
+    "指定した数以下の素数の個数を数えます（CPU負荷の高い処理）",
+    properties={
+        "limit": {"type": "integer", "description": "上限値"}
+    },
+    required=["limit"],
+    backend="process",
+    coalesce=True,
+    timeout=120.0
+)
+def tool_count_primes(arguments: Dict[str, Any]) -> str:
+    limit = int(arguments.get("limit", 0))
+    if limit < 0 or limit > 10_000_000:
+        raise ValueError("limitは0以上10,000,000以下にしてください")
+    count = 0
+    for n in range(2, limit + 1):
+        if n > 2 and n % 2 == 0:
+            continue
+        d = 3
+        while d * d <= n:
+            if n % d == 0:
+                break
+            d += 2
+        else:
+            count += 1
+    return f"計算結果: {limit} 以下の素数は {count} 個です"
+
+
+@tools.tool(
+    "wait",
+    "指定した秒数だけ待機します（外部API呼び出しなどI/O待ちの模擬）",
+    properties={
+        "seconds": {"type": "number", "description": "待機する秒数"}
+    },
+    required=["seconds"],
+    timeout=75.0
+)
+def tool_wait(arguments: Dict[str, Any]) -> str:
+    seconds = float(arguments.get("seconds", 0))
+    if seconds < 0 or seconds > 60:
+        raise ValueError("secondsは0以上60以下にしてください")
+    time.sleep(seconds)
+    return f"{seconds}秒待機しました"
+
+
+@tools.tool(
+    "generate_lines",
+    "指定した行数のテキストを少しずつ生成します（大きな出力・長時間の処理の模擬）",
+    properties={
+        "lines": {"type": "integer", "description": "生成する行数（1〜1000000）"},
+        "chunk_lines": {"type": "integer", "description": "1チャンクの行数（デフォルト1000）"},
+        "interval": {"type": "number", "description": "チャンクごとの待ち時間（秒、デフォルト0）"}
+    },
+    required=["lines"],
+    timeout=75.0
+)
+def tool_generate_lines(arguments: Dict[str, Any]):
+    lines = int(arguments.get("lines", 0))
+    chunk_lines = max(1, int(arguments.get("chunk_lines", 1000)))
+    interval = float(arguments.get("interval", 0))
+    if lines < 1 or lines > 1_000_000:
+        raise ValueError("linesは1以上1000000以下にしてください")
+    if interval < 0 or interval * (lines / chunk_lines) > 60:
+        raise ValueError("intervalは合計60秒以内にしてください")
+    for start in range(0, lines, chunk_lines):
+        if interval:
+            time.sleep(interval)
+        end = min(start + chunk_lines, lines)
+        yield "".join(f"{i + 1}行目: サンプルテキスト\n" for i in range(start, end))
+        yield Progress(end, total=lines)
+
+
+def execute_tool(name: str, arguments: Dict[str, Any]) -> str:
+    """
+    ツールを実行
+
+    プロセスプールへ渡すため、モジュールのトップレベル関数として公開しています
+    （子プロセスではモジュールの読み込み時にツールが登録し直される）。
+    """
+    return tools.execute(name, arguments)
+
+
+# ========================================
+# ツール実行バックエンド
+# ========================================
+
+# ツールごとのデフォルト実行バックエンド（ツールの宣言から取り出す）
+DEFAULT_TOOL_BACKENDS: Dict[str, str] = tools.backends()
+
+# ツールごとのデフォルトの期限（ツールの宣言から取り出す）
+DEFAULT_TOOL_TIMEOUTS: Dict[str, float] = tools.timeouts()
+
+# ストリーミングするツールとイベントループの間に溜めるチャンク数
+STREAM_BUFFER_CHUNKS = 4
+
+
+class ToolTimeout(Exception):
+    """ツール呼び出しが期限までに終わらなかった"""
+
+    def __init__(self, name: str, timeout: Optional[float]):
+        limit = f"（{timeout:g}秒）" if timeout is not None else ""
+        super().__init__(f"ツール '{name}' が期限{limit}までに終わりませんでした")
+        self.name = name
+        self.timeout = timeout
+
+
+class ToolExecutor:
+    """
+    ツール本体をイベントループの外で実行するバックエンド
+
+    - thread: ThreadPoolExecutor（I/O待ちや軽量なツール向け）
+    - process: ProcessPoolExecutor（CPUバウンドなツール向け）
+
+    同時実行数は FairScheduler で制限し、上限を超えた呼び出しは
+    イベントループをブロックせずに空きを待ちます。空いた枠は持ち主
+    （セッション）ごとのラウンドロビンで割り当てるため、1つのセッションが
+    大量に呼び出しても他のセッションは待たされません。
+    待ち行列があふれた呼び出しは Overloaded で即座に断ります。
+
+    期限（deadline）を渡すと、枠の空き待ちと実行の合計がそれを過ぎた時点で
+    ToolTimeout を送出します。期限切れの呼び出しは実行を始めません。
+    """
+
+    BACKENDS = ("thread", "process")
+
+    def __init__(self, config: ServerConfig):
+        self.backends = {**DEFAULT_TOOL_BACKENDS, **config.tool_backends}
+        for name, backend in self.backends.items():
+            if backend not in self.BACKENDS:
+                raise ValueError(f"Unknown backend for tool '{name}': {backend}")
+        # ツールごとの期限（秒）。宣言を起動オプションで上書きし、0 は無期限
+        self.default_timeout = config.tool_timeout
+        self.timeouts = {
+            **DEFAULT_TOOL_TIMEOUTS,
+            **{name: float(value) for name, value in config.tool_timeouts.items()}
+        }
+        
+        self.thread_pool = ThreadPoolExecutor(
+            max_workers=config.tool_thread_workers,
+            thread_name_prefix="mcp-tool"
+        )
+        self.process_pool: Optional[ProcessPoolExecutor] = None
+        if config.tool_process_workers > 0:
+            # spawnはイベントループのスレッド状態を子プロセスに持ち込まない
+            self.process_pool = ProcessPoolExecutor(
+                max_workers=config.tool_process_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        self.scheduler = FairScheduler(
+            config.tool_max_concurrency,
+            config.tool_max_queued,
+            config.session_max_queued
+        )
+
+    def backend_for(self, name: str) -> str:
+        """ツールの実行バックエンド名を返す"""
+        backend = self.backends.get(name, "thread")
+        if backend == "process" and self.process_pool is None:
+            return "thread"
+        return backend
+
+    def _pool_for(self, name: str) -> Executor:
+        if self.backend_for(name) == "process":
+            return self.process_pool
+        return self.thread_pool
+
+    def timeout_for(self, name: Any) -> Optional[float]:
+        """ツールの期限（秒、無期限なら None）"""
+        timeout = self.timeouts.get(name, self.default_timeout) if isinstance(name, str) else self.default_timeout
+        return timeout if timeout > 0 else None
+
+    async def _until(self, awaitable: Awaitable[Any], name: str, deadline: Optional[float]) -> Any:
+        """
+        deadline（loop.time()）までに終わらなければ awaitable を取り消して ToolTimeout
+
+        Python 3.11 以降は asyncio.timeout_at を使います。wait_for は awaitable が
+        同じタイミングで終わると外からのキャンセル（notifications/cancelled）を
+        握りつぶして結果を返すため、取り消したはずの呼び出しが実行されてしまいます。
+        """
+        if deadline is None:
+            return await awaitable
+        if hasattr(asyncio, "timeout_at"):
+            scope = asyncio.timeout_at(deadline)
+            try:
+                async with scope:
+                    return await awaitable
+            except TimeoutError:
+                if not scope.expired():
+                    # ツール自身が送出した TimeoutError
+                    raise
+                TOOL_TIMEOUTS.inc(tool_label(name))
+                raise ToolTimeout(name, self.timeout_for(name)) from None
+        loop = asyncio.get_running_loop()
+        try:
+            return await asyncio.wait_for(awaitable, deadline - loop.time())
+        except asyncio.TimeoutError:
+            if loop.time() < deadline:
+                # ツール自身が送出した TimeoutError
+                raise
+            TOOL_TIMEOUTS.inc(tool_label(name))
+            raise ToolTimeout(name, self.timeout_for(name)) from None
+
+    async def run(
+        self,
+        name: str,
+        arguments: Dict[str, Any],
+        owner: str = "",
+        deadline: Optional[float] = None
+    ) -> str:
+        """ツールを実行プールで実行し、結果を待つ"""
+        loop = asyncio.get_running_loop()
+        queued_at = loop.time()
+        await self._until(self.scheduler.acquire(owner), name, deadline)
+        started = loop.time()
+        future = None
+        try:
+            TOOL_QUEUE_TIME.observe(started - queued_at, tool_label(name))
+            future = self._pool_for(name).submit(execute_tool, name, arguments)
+            return await self._until(asyncio.wrap_future(future), name, deadline)
+        finally:
+            self._release_when_done(future, name, started)
+
+    def _release_when_done(self, future: Optional[Future], name: str, started: float) -> None:
+        """
+        実行枠を返す
+
+        キャンセルされても実行プールで動き続けている呼び出しは止められないので、
+        実際に終わるまで枠を返さない（まだ始まっていなければ wrap_future が取り消している）。
+        実行プールに渡す前に失敗した（future が None の）場合はすぐに返す。
+        """
+        loop = asyncio.get_running_loop()
+
+        def release(_: Any = None) -> None:
+            elapsed = loop.time() - started
+            self.scheduler.release(elapsed)
+            TOOL_DURATION.observe(elapsed, tool_label(name))
+
+        if future is None or future.done():
+            release()
+            return
+
+        def release_threadsafe(_: Future) -> None:
+            try:
+                loop.call_soon_threadsafe(release)
+            except RuntimeError:
+                # 停止中でイベントループが閉じている
+                pass
+
+        future.add_done_callback(release_threadsafe)
+
+    async def stream(
+        self,
+        name: str,
+        arguments: Dict[str, Any],
+        owner: str,
+        on_chunk: Callable[[Any], Awaitable[None]],
+        deadline: Optional[float] = None
+    ) -> None:
+        """
+        ジェネレーターのツールをスレッドプールで実行し、yield されたものを順に on_chunk に渡す
+
+        on_chunk が終わるまで次のチャンクは受け取らないため、ツールが先に進めるのは
+        STREAM_BUFFER_CHUNKS 個までです（メモリに溜まるのは数チャンク分）。
+        """
+        loop = asyncio.get_running_loop()
+        queued_at = loop.time()
+        await self._until(self.scheduler.acquire(owner), name, deadline)
+        started = loop.time()
+        pipe = ChunkPipe(loop, STREAM_BUFFER_CHUNKS)
+        future = None
+
+        async def consume() -> None:
+            while True:
+                item = await pipe.get()
+                if item is ChunkPipe.END:
+                    break
+                await on_chunk(item)
+            await asyncio.wrap_future(future)
+
+        try:
+            TOOL_QUEUE_TIME.observe(started - queued_at, tool_label(name))
+            future = self.thread_pool.submit(pump, partial(tools.iterate, name, arguments), pipe)
+            await self._until(consume(), name, deadline)
+        finally:
+            # 途中でやめた場合、ツールは次の yield で止まる
+            pipe.close()
+            self._release_when_done(future, name, started)
+
+    def shutdown(self) -> None:
+        """実行プールを停止"""
+        self.thread_pool.shutdown(wait=False, cancel_futures=True)
+        if self.process_pool is not None:
+            self.process_pool.shutdown(wait=False, cancel_futures=True)
+
+
+# サーバー起動時に生成される
+tool_executor: Optional[ToolExecutor] = None
+
+# 同じ引数で実行中のツール呼び出しへの相乗り
+single_flight = SingleFlight()
+
+# cache=True で宣言したツールの結果（エンコード済みの result）
+tool_cache = ResultCache(
+    config.tool_cache_max_entries,
+    config.tool_cache_max_bytes,
+    config.tool_cache_ttl
+)
 
 
 # ========================================
@@ -101,7 +1244,7 @@ def handle_initialize(params: Dict[str, Any]) -> Dict[str, Any]:
     return {
         "protocolVersion": "2024-11-05",
         "capabilities": {
-            "tools": {},
+            "tools": {"listChanged": True},
             "prompts": {},
             "resources": {}
         },
@@ -113,86 +1256,86 @@ def handle_initialize(params: Dict[str, Any]) -> Dict[str, Any]:
 
 
 def handle_tools_list(params: Dict[str, Any]) -> Dict[str, Any]:
-    """ツール一覧"""
-    return {
-        "tools": [
-            {
-                "name": "hello",
-                "description": "シンプルな挨拶を返します",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "name": {"type": "string", "description": "挨拶する相手の名前"}
-                    },
-                    "required": ["name"]
-                }
-            },
-            {
-                "name": "add",
-                "description": "2つの数値を足し算します",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "a": {"type": "number", "description": "1つ目の数値"},
-                        "b": {"type": "number", "description": "2つ目の数値"}
-                    },
-                    "required": ["a", "b"]
-                }
-            },
-            {
-                "name": "multiply",
-                "description": "2つの数値を掛け算します",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "a": {"type": "number"},
-                        "b": {"type": "number"}
-                    },
-                    "required": ["a", "b"]
-                }
-            },
-            {
-                "name": "divide",
-                "description": "2つの数値を割り算します",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "a": {"type": "number"},
-                        "b": {"type": "number"}
-                    },
-                    "required": ["a", "b"]
-                }
-            },
-            {
-                "name": "get_time",
-                "description": "現在の日時を返します",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {},
-                    "required": []
-                }
-            },
-            {
-                "name": "server_info",
-                "description": "サーバー情報を返します",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {},
-                    "required": []
-                }
-            }
-        ]
-    }
+    """ツール一覧（登録済みツールの宣言から生成）"""
+    return {"tools": tools.list_tools()}
 
 
-def handle_tools_call(params: Dict[str, Any]) -> Dict[str, Any]:
-    """ツール実行"""
+async def handle_tools_call(params: Dict[str, Any]) -> Any:
+    """
+    ツール実行（実行プール経由）
+
+    cache=True で宣言されたツールは、同じ引数の結果をエンコード済みのまま
+    キャッシュから返します（エラーはキャッシュしない）。
+    cache=True または coalesce=True のツールは、同じ引数の呼び出しが
+    実行中ならその実行に相乗りします。
+    
+    ジェネレーターのツールを progressToken 付きで呼び出された場合は、
+    チャンクごとに notifications/progress を送ります（run_tool_stream）。
+    """
     tool_name = params.get("name")
     arguments = params.get("arguments", {})
+    if not isinstance(tool_name, str) or tool_name not in tools:
+        # 実行枠を使わずにツールのエラーとして返す
+        return {
+            "content": [
+                {
+                    "type": "text",
+                    "text": f"エラー: Unknown tool: {tool_name}"
+                }
+            ],
+            "isError": True
+        }
     
+    meta = params.get("_meta")
+    progress_token = meta.get("progressToken") if isinstance(meta, dict) else None
+    sink = request_context.get().notify
+    if (
+        progress_token is not None
+        and sink is not None
+        and tools.streaming(tool_name)
+        and tool_executor.backend_for(tool_name) == "thread"
+    ):
+        return await run_tool_stream(tool_name, arguments, progress_token, sink)
+    
+    key = None
+    if tools.cacheable(tool_name) or tools.coalescable(tool_name):
+        key = ResultCache.key_for(tool_name, arguments)
+    if key is None:
+        return await run_tool_call(tool_name, arguments)
+    
+    cache_key = key if tool_cache.enabled and tools.cacheable(tool_name) else None
+    if cache_key is not None:
+        cached = tool_cache.get(cache_key)
+        if cached is not None:
+            return cached
+    
+    # 呼び出し元ごとの id はレスポンスの組み立て時に付くので、result はそのまま共有できる
+    return await single_flight.do(key, partial(run_tool_call, tool_name, arguments, cache_key))
+
+
+def tool_deadline(tool_name: Any) -> Optional[float]:
+    """
+    ツール呼び出しの期限（loop.time()、無期限なら None）
+
+    リクエストを受信した時刻から数えるため、セッションの同時処理数や
+    実行枠の空きを待っていた時間も期限に含まれます。
+    """
+    timeout = tool_executor.timeout_for(tool_name)
+    if timeout is None:
+        return None
+    received_at = request_received_at.get()
+    if received_at is None:
+        received_at = asyncio.get_running_loop().time()
+    return received_at + timeout
+
+
+async def run_tool_call(tool_name: Any, arguments: Dict[str, Any], cache_key: Any = None) -> Any:
+    """ツールを実行して result を組み立てる（cache_key があればキャッシュに入れる）"""
     try:
-        result = execute_tool(tool_name, arguments)
-        return {
+        result = await tool_executor.run(
+            tool_name, arguments, request_context.get().owner, tool_deadline(tool_name)
+        )
+        response = {
             "content": [
                 {
                     "type": "text",
@@ -200,6 +1343,15 @@ def handle_tools_call(params: Dict[str, Any]) -> Dict[str, Any]:
                 }
             ]
         }
+        if cache_key is not None:
+            # 一度だけエンコードし、今回のレスポンスにもそのまま使う
+            encoded = EncodedResult(mcp_codec.dumps(response))
+            tool_cache.put(cache_key, encoded, len(encoded.payload))
+            return encoded
+        return response
+    except Overloaded:
+        # ツールのエラーではなく JSON-RPC のエラーとして返す
+        raise
     except Exception as e:
         return {
             "content": [
@@ -212,27 +1364,290 @@ def handle_tools_call(params: Dict[str, Any]) -> Dict[str, Any]:
         }
 
 
-def process_mcp_request(request: Dict[str, Any]) -> Dict[str, Any]:
-    """MCPリクエストを処理"""
+async def run_tool_stream(
+    tool_name: str,
+    arguments: Dict[str, Any],
+    progress_token: Any,
+    sink: NotificationSink
+) -> Any:
+    """
+    ジェネレーターのツールを実行し、途中経過を notifications/progress で送る
+
+    progress は1つの尺度で単調に増えます。ツールが Progress を yield する場合は
+    その値（ツールの単位）だけを送り、テキストのチャンクでは送りません。
+    テキストだけを yield するツールでは、チャンクごとにそこまでの文字数を送ります。
+    どちらのツールかは Progress が来るまで分からないため、チャンクの通知は
+    次のチャンク（または終了）まで保留します。
+    チャンクのテキストは通知には入れず、最終的な result でだけ返します。
+    result はJSON文字列としてエスケープしたチャンクを1つのバッファに追記して組み立て、
+    そのまま（結合や再エンコードなしで）レスポンスに埋め込みます。
+    """
+    payload = bytearray(b'{"content":[{"type":"text","text":"')
+    token = mcp_codec.dumps(progress_token)
+    sent_chars = 0
+    # 文字数の通知を保留しているチャンクまでの文字数（None なら保留なし）
+    pending: Optional[int] = None
+    # ツールが Progress を yield した（以降はツールの単位だけを使う）
+    tool_scale = False
+    last_progress: Optional[float] = None
+
+    async def notify(params: Dict[str, Any]) -> None:
+        nonlocal last_progress
+        if last_progress is not None and params["progress"] <= last_progress:
+            # 進まない・戻る値は送らない
+            return
+        last_progress = params["progress"]
+        await sink(
+            b'{"jsonrpc":"2.0","method":"notifications/progress","params":{"progressToken":'
+            + token + b"," + mcp_codec.dumps(params)[1:] + b"}"
+        )
+
+    async def flush() -> None:
+        nonlocal pending
+        if pending is not None and not tool_scale:
+            await notify({"progress": pending})
+        pending = None
+
+    async def on_chunk(chunk: Any) -> None:
+        nonlocal sent_chars, pending, tool_scale
+        if isinstance(chunk, Progress):
+            tool_scale = True
+            pending = None
+            params = {"progress": chunk.progress}
+            if chunk.total is not None:
+                params["total"] = chunk.total
+            if chunk.message is not None:
+                params["message"] = chunk.message
+            await notify(params)
+            return
+        chunk = str(chunk)
+        if not chunk:
+            return
+        await flush()
+        # 前後の引用符を除いたエスケープ済みの文字列をそのまま result に使う
+        payload.extend(mcp_codec.dumps(chunk)[1:-1])
+        sent_chars += len(chunk)
+        if not tool_scale:
+            pending = sent_chars
+
+    try:
+        await tool_executor.stream(
+            tool_name, arguments, request_context.get().owner, on_chunk, tool_deadline(tool_name)
+        )
+    except Overloaded:
+        raise
+    except Exception as e:
+        return {
+            "content": [
+                {
+                    "type": "text",
+                    "text": f"エラー: {str(e)}"
+                }
+            ],
+            "isError": True
+        }
+    await flush()
+    payload.extend(b'"}]}')
+    return EncodedResult(payload)
+
+
+# ========================================
+# エンコード済みレスポンス
+# ========================================
+
+class EncodedResult:
+    """
+    エンコード済みの result
+
+    レスポンスのエンコード時に、id だけを差し替えてそのまま埋め込まれます。
+    """
+
+    __slots__ = ("payload",)
+
+    def __init__(self, payload: bytes):
+        self.payload = payload
+
+
+class CatalogCache:
+    """
+    initialize と tools/list のレスポンスを事前にエンコードして保持
+
+    ツール一覧のハッシュをバージョンとして持ち、
+    ツール構成が変わったときだけ再構築します。
+    """
+
+    def __init__(self):
+        self.version: Optional[str] = None
+        self.initialize = EncodedResult(b"")
+        self.tools_list = EncodedResult(b"")
+
+    def refresh(self) -> bool:
+        """ツール構成が変わっていれば再構築する（再構築したら True）"""
+        tools_payload = mcp_codec.dumps(handle_tools_list({}))
+        version = hashlib.sha256(tools_payload).hexdigest()[:16]
+        if version == self.version:
+            return False
+        self.tools_list = EncodedResult(tools_payload)
+        self.initialize = EncodedResult(mcp_codec.dumps(handle_initialize({})))
+        self.version = version
+        return True
+
+
+def encode_response(response: Any) -> bytes:
+    """
+    JSON-RPCレスポンス（またはバッチ配列）をエンコード
+
+    result が EncodedResult の場合は再エンコードせず、id だけを埋め込みます。
+    """
+    if isinstance(response, list):
+        return b"[" + b",".join(encode_response(r) for r in response) + b"]"
+    result = response.get("result")
+    if isinstance(result, EncodedResult):
+        return (
+            b'{"jsonrpc":"2.0","id":' + mcp_codec.dumps(response.get("id"))
+            + b',"result":' + result.payload + b"}"
+        )
+    return mcp_codec.dumps(response)
+
+
+# メソッド名 → ハンドラ（params を受け取り result を返す。コルーチン関数も可）
+METHOD_HANDLERS: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+    "initialize": lambda params: catalog.initialize,
+    "tools/list": lambda params: catalog.tools_list,
+    "tools/call": handle_tools_call,
+    "prompts/list": lambda params: {"prompts": []},
+    "resources/list": lambda params: {"resources": []},
+    "ping": lambda params: {},
+}
+
+def handle_cancelled(params: Dict[str, Any]) -> None:
+    """
+    notifications/cancelled: 同じセッションで処理中のリクエストをキャンセル
+
+    実行プールで動いているツールは途中で止められないため、結果を捨てます
+    （実行枠は実際に終わるまで返さない）。すでに終わっているリクエストなら何もしません。
+    """
+    requests = request_context.get().requests
+    if requests is None or not isinstance(params, dict):
+        return
+    key = InflightRequests.key(params.get("requestId"))
+    if key is not None and requests.cancel(key):
+        log.debug("[Messages] Cancelled request", request_id=params.get("requestId"))
+
+
+# 応答不要の通知（通知ごとの処理があるものは NOTIFICATION_HANDLERS に登録）
+NOTIFICATION_HANDLERS: Dict[str, Callable[[Dict[str, Any]], None]] = {
+    "notifications/cancelled": handle_cancelled,
+}
+NOTIFICATION_METHODS = frozenset({
+    "notifications/initialized",
+}) | frozenset(NOTIFICATION_HANDLERS)
+
+# 制御系のメソッド（すぐに応答でき、ツール呼び出しの後ろに並ばせない）
+CONTROL_METHODS = frozenset({
+    "initialize",
+    "ping",
+    "tools/list",
+    "prompts/list",
+    "resources/list",
+}) | NOTIFICATION_METHODS
+
+
+def is_exempt_from_rate_limit(message: Any) -> bool:
+    """
+    レート制限に数えないメッセージか（既知の通知だけからなるもの）
+
+    notifications/cancelled はレート制限を超えたクライアントが
+    自分の処理を止めるためにも使うので、断らずに受け付けます。
+    """
+    members = message if isinstance(message, list) else [message]
+    return bool(members) and all(
+        isinstance(m, dict)
+        and "id" not in m
+        and isinstance(m.get("method"), str)
+        and m["method"] in NOTIFICATION_METHODS
+        for m in members
+    )
+
+
+def is_control_message(message: Any) -> bool:
+    """制御系のメソッドだけからなるメッセージか（バッチは全要素が制御系のとき）"""
+    members = message if isinstance(message, list) else [message]
+    return bool(members) and all(
+        isinstance(m, dict)
+        and isinstance(m.get("method"), str)
+        and (m["method"] in CONTROL_METHODS or m["method"].startswith("notifications/"))
+        for m in members
+    )
+
+
+async def process_mcp_request(request: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    MCPリクエストを処理し、メトリクスを記録する
+
+    SSEセッションのリクエストは id ごとに追跡し、notifications/cancelled で
+    キャンセルされた場合はレスポンスを返しません（None）。
+    """
+    method = method_label(request.get("method"))
+    requests = request_context.get().requests
+    key = InflightRequests.key(request.get("id")) if requests is not None else None
+    task = asyncio.current_task()
+    if key is not None:
+        requests.track(key, task)
+    try:
+        response = await dispatch_mcp_request(request)
+        # キャンセルと処理の完了が重なると、CancelledError にならずに結果が返ることがある
+        cancelled = key is not None and key in requests.cancelled
+    except asyncio.CancelledError:
+        REQUESTS_CANCELLED.inc(method)
+        if key is None or key not in requests.cancelled:
+            # セッションが閉じられた・クライアントが切断したなど、呼び出し元ごとのキャンセル
+            raise
+        # このリクエストだけが取り消された（バッチの他の要素やセッションは続ける）
+        if hasattr(task, "uncancel"):
+            task.uncancel()
+        return None
+    finally:
+        if key is not None:
+            requests.untrack(key, task)
+    if cancelled:
+        # 取り消されたリクエストには、間に合った結果があってもレスポンスを返さない
+        REQUESTS_CANCELLED.inc(method)
+        if hasattr(task, "cancelling") and task.cancelling():
+            task.uncancel()
+        return None
+    REQUESTS.inc(method)
+    if response is None:
+        return response
+    if "error" in response:
+        REQUEST_ERRORS.inc(method)
+    elif method == "tools/call":
+        params = request.get("params")
+        tool = tool_label(params.get("name") if isinstance(params, dict) else None)
+        TOOL_CALLS.inc(tool)
+        result = response["result"]
+        if isinstance(result, dict) and result.get("isError"):
+            TOOL_ERRORS.inc(tool)
+    return response
+
+
+async def dispatch_mcp_request(request: Dict[str, Any]) -> Dict[str, Any]:
+    """MCPリクエストをメソッドのハンドラに振り分ける"""
     method = request.get("method")
     params = request.get("params", {})
     request_id = request.get("id")
+    if not isinstance(method, str):
+        # 配列など辞書のキーに使えない値は未知のメソッドとして扱う
+        method = ""
     
     try:
-        if method == "initialize":
-            result = handle_initialize(params)
-        elif method == "tools/list":
-            result = handle_tools_list(params)
-        elif method == "tools/call":
-            result = handle_tools_call(params)
-        elif method == "prompts/list":
-            result = {"prompts": []}
-        elif method == "resources/list":
-            result = {"resources": []}
-        elif method == "notifications/initialized":
-            # 通知は応答不要
+        if method in NOTIFICATION_METHODS:
+            notification_handler = NOTIFICATION_HANDLERS.get(method)
+            if notification_handler is not None:
+                notification_handler(params)
             return None
-        else:
+        handler = METHOD_HANDLERS.get(method)
+        if handler is None:
             return {
                 "jsonrpc": "2.0",
                 "id": request_id,
@@ -241,6 +1656,9 @@ def process_mcp_request(request: Dict[str, Any]) -> Dict[str, Any]:
                     "message": "Method not found"
                 }
             }
+        result = handler(params)
+        if inspect.isawaitable(result):
+            result = await result
         
         return {
             "jsonrpc": "2.0",
@@ -248,6 +1666,9 @@ def process_mcp_request(request: Dict[str, Any]) -> Dict[str, Any]:
             "result": result
         }
     
+    except Overloaded as e:
+        return overloaded_response(request_id, e)
+    
     except Exception as e:
         return {
             "jsonrpc": "2.0",
@@ -259,6 +1680,234 @@ def process_mcp_request(request: Dict[str, Any]) -> Dict[str, Any]:
         }
 
 
+def parse_error_response() -> Dict[str, Any]:
+    """JSON-RPCの Parse error（id は特定できないので null）"""
+    return {
+        "jsonrpc": "2.0",
+        "id": None,
+        "error": {"code": -32700, "message": "Parse error"}
+    }
+
+
+def invalid_request_response(request_id: Any = None) -> Dict[str, Any]:
+    """JSON-RPCの Invalid Request エラー"""
+    return {
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "error": {
+            "code": -32600,
+            "message": "Invalid Request"
+        }
+    }
+
+
+def overloaded_response(request_id: Any, error: Overloaded) -> Dict[str, Any]:
+    """混雑で断ったリクエストへのエラー（data.retryAfter 秒後の再試行を促す）"""
+    REQUESTS_REJECTED.inc(error.reason)
+    return {
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "error": {
+            "code": -32000,
+            "message": "Server overloaded",
+            "data": {
+                "reason": error.reason,
+                "retryAfter": error.retry_after
+            }
+        }
+    }
+
+
+def rejected_responses(message: Any, error: Overloaded) -> Optional[bytes]:
+    """
+    処理せずに断ったメッセージへの応答（id を持つ各リクエストへのエラー）
+
+    通知だけのメッセージには応答しないので None を返します。
+    """
+    members = message if isinstance(message, list) else [message]
+    responses = [
+        overloaded_response(m.get("id"), error)
+        for m in members
+        if isinstance(m, dict) and "id" in m
+    ]
+    if not responses:
+        return None
+    return encode_response(responses if isinstance(message, list) else responses[0])
+
+
+def rate_limited_response(message: Any, retry_after: float) -> Response:
+    """レート制限を超えたPOSTへの 429 レスポンス"""
+    return overloaded_http_response(message, Overloaded("rate_limited", round(retry_after, 3)))
+
+
+def overloaded_http_response(message: Any, error: Overloaded) -> Response:
+    """
+    混雑で断ったPOSTへの 429 レスポンス
+
+    リクエストは処理せず、id を持つ各リクエストへのエラーを
+    SSEストリームではなくこのレスポンスのボディで返します。
+    """
+    content = rejected_responses(message, error)
+    headers = {"Retry-After": str(max(1, math.ceil(error.retry_after)))}
+    if content is None:
+        return Response(status_code=429, headers=headers)
+    return Response(content=content, status_code=429, headers=headers, media_type="application/json")
+
+
+async def process_mcp_batch(requests: list) -> Any:
+    """
+    JSON-RPC 2.0 のバッチリクエストを処理
+
+    各要素は並行して処理され、結果は1つの配列にまとめて返します。
+    通知のみのバッチでは応答しません。
+    空の配列には（配列ではなく）Invalid Request のエラーを1つだけ返します。
+    """
+    if not requests:
+        return invalid_request_response()
+    
+    async def process_member(member: Any) -> Optional[Dict[str, Any]]:
+        if not isinstance(member, dict):
+            return invalid_request_response()
+        return await process_mcp_request(member)
+    
+    responses = await asyncio.gather(*(process_member(member) for member in requests))
+    results = [response for response in responses if response]
+    return results or None
+
+
+async def process_mcp_message(message: Any) -> Any:
+    """POST されたメッセージ（単一リクエストまたはバッチ配列）を処理"""
+    if isinstance(message, list):
+        return await process_mcp_batch(message)
+    if not isinstance(message, dict):
+        return invalid_request_response()
+    return await process_mcp_request(message)
+
+
+# 起動時に一度だけ構築する
+catalog = CatalogCache()
+catalog.refresh()
+
+
+# ========================================
+# サーバーからの通知（ブロードキャスト）
+# ========================================
+
+# この数のセッションに入れるごとにイベントループへ制御を返す
+# （セッションが多いときに他のリクエストの処理を長く止めない）
+BROADCAST_YIELD_EVERY = 1024
+
+
+async def broadcast(
+    payload: bytes,
+    where: Optional[Callable[[Session], bool]] = None
+) -> Dict[str, int]:
+    """
+    エンコード済みの通知をこのワーカーの全セッション（where を渡せば条件に合うもの）へ送る
+
+    フレームはトランスポートごとに1回だけ作り、同じバイト列を各セッションの
+    送信キューに入れます。キューがいっぱいのセッションでは待たずに overflow ポリシーに
+    従う（block なら捨てる）ため、遅いクライアントが他のセッションへの配信を止めません。
+    ストリームが切れて再接続待ちのセッションには送りません。
+    """
+    frames: Dict[type, bytes] = {}
+    delivered = dropped = 0
+    # 途中で閉じたセッションは active_connections から消えるのでコピーを回す
+    for index, session in enumerate(list(active_connections.values()), 1):
+        if index % BROADCAST_YIELD_EVERY == 0:
+            await asyncio.sleep(0)
+        if session.stream is None or (where is not None and not where(session)):
+            continue
+        kind = type(session)
+        frame = frames.get(kind)
+        if frame is None:
+            frame = frames[kind] = kind.encode_notification(payload)
+        if await session.enqueue(frame, block=False):
+            delivered += 1
+        else:
+            dropped += 1
+    BROADCAST_FRAMES.inc("delivered", amount=delivered)
+    BROADCAST_FRAMES.inc("dropped", amount=dropped)
+    return {"delivered": delivered, "dropped": dropped}
+
+
+async def broadcast_notification(
+    method: str,
+    params: Optional[Dict[str, Any]] = None,
+    where: Optional[Callable[[Session], bool]] = None
+) -> Dict[str, int]:
+    """JSON-RPC の通知を組み立ててブロードキャストする（送った・捨てたセッション数を返す）"""
+    message: Dict[str, Any] = {"jsonrpc": "2.0", "method": method}
+    if params is not None:
+        message["params"] = params
+    result = await broadcast(mcp_codec.dumps(message), where)
+    log.info("[Broadcast] Notification sent", method=method, **result)
+    return result
+
+
+# notifications/tools/list_changed の送信を予約済みか（同じ周回の変更は1回にまとめる）
+tools_changed_pending = False
+tools_changed_task: Optional[asyncio.Task] = None
+
+
+async def notify_tools_changed() -> None:
+    """接続中のセッションへ notifications/tools/list_changed を送る"""
+    global tools_changed_pending
+    tools_changed_pending = False
+    await broadcast_notification("notifications/tools/list_changed")
+
+
+def on_tools_changed() -> None:
+    """
+    ツールの登録・削除で呼ばれる（tools のリスナー）
+
+    エンコード済みの initialize / tools/list をすぐに作り直し、変わっていれば
+    次の周回で notifications/tools/list_changed を送ります。イベントループの外
+    （起動前のモジュール読み込み中など）は接続中のセッションがないので作り直すだけです。
+    """
+    global tools_changed_pending, tools_changed_task
+    if not catalog.refresh():
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    if tools_changed_pending:
+        return
+    tools_changed_pending = True
+    tools_changed_task = loop.create_task(notify_tools_changed())
+
+
+tools.add_listener(on_tools_changed)
+
+
+# ========================================
+# アプリケーション
+# ========================================
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """起動時に実行バックエンドを生成し、終了時に停止する"""
+    global tool_executor, keepalive
+    log.start()
+    tool_executor = ToolExecutor(config)
+    keepalive = KeepaliveScheduler(config.keepalive_interval, on_session_idle)
+    keepalive.start()
+    await router.start()
+    try:
+        yield
+    finally:
+        await router.stop()
+        await keepalive.stop()
+        tool_executor.shutdown()
+        tool_executor = None
+        log.stop()
+
+
+# FastAPIアプリケーション
+app = FastAPI(title="MCP SSE Server", version="2.0.0", lifespan=lifespan)
+
+
 # ========================================
 # SSEエンドポイント
 # ========================================
@@ -273,7 +1922,10 @@ async def root():
         "endpoints": {
             "sse_stream": "GET /sse",
             "send_message": "POST /messages",
-            "health": "GET /health"
+            "streamable_http": "POST /mcp",
+            "websocket": "WS /ws",
+            "health": "GET /health",
+            "metrics": "GET /metrics"
         },
         "description": "Server-Sent Eventsを使用したMCPサーバー"
     }
@@ -287,10 +1939,108 @@ async def health():
         "service": "hello-world-mcp",
         "version": "2.0.0",
         "transport": "SSE",
-        "active_connections": len(active_connections)
+        "worker_id": router.worker_id,
+        "active_connections": len(active_connections),
+        "catalog_version": catalog.version,
+        "json_codec": mcp_codec.BACKEND,
+        "inflight_requests": sum(len(s.tasks) for s in active_connections.values()),
+        "executor": {
+            "thread_workers": config.tool_thread_workers,
+            "process_workers": config.tool_process_workers,
+            "max_concurrency": config.tool_max_concurrency,
+            "timeouts": tool_executor.timeouts if tool_executor else None,
+            "scheduler": tool_executor.scheduler.stats() if tool_executor else None,
+        },
+        "rate_limit": {
+            "requests_per_second": config.session_rate_limit,
+            "burst": config.session_rate_burst,
+        },
+        "sessions": session_summary(),
+        "tool_cache": tool_cache.stats(),
+        "single_flight": single_flight.stats()
+    }
+
+
+def session_summary(limit: int = 100) -> Dict[str, Any]:
+    """
+    セッションのメモリ使用状況
+
+    セッション数が多い場合に備え、個別の統計は送信待ちバイト数の多い順に limit 件まで返します。
+    """
+    sessions = list(active_connections.values())
+    top = sorted(sessions, key=lambda s: s.queued_bytes, reverse=True)[:limit]
+    return {
+        "max_sessions": config.max_sessions,
+        "queue_max_frames": config.session_queue_max_frames,
+        "queue_max_bytes": config.session_queue_max_bytes,
+        "overflow_policy": config.session_overflow_policy,
+        "idle_timeout": config.session_idle_timeout,
+        "replay_frames": config.session_replay_frames,
+        "replay_bytes": config.session_replay_bytes,
+        "resume_timeout": config.session_resume_timeout,
+        "detached": sum(1 for s in sessions if s.stream is None),
+        "total_replay_bytes": sum(s.replay_bytes for s in sessions),
+        "total_queued_bytes": sum(s.queued_bytes for s in sessions),
+        "total_sent_bytes": sum(s.sent_bytes for s in sessions),
+        "total_dropped_frames": sum(s.dropped_frames for s in sessions),
+        "details": [s.stats() for s in top],
     }
 
 
+# スクレイプ時に現在の状態から集めるメトリクス
+metrics.gauge(
+    "mcp_sessions_active", "SSE sessions held by this worker",
+    lambda: [((), len(active_connections))]
+)
+metrics.gauge(
+    "mcp_streams_active", "Sessions with a connected SSE stream",
+    lambda: [((), sum(1 for s in active_connections.values() if s.stream is not None))]
+)
+metrics.gauge(
+    "mcp_inflight_requests", "Messages being processed",
+    lambda: [((), sum(len(s.tasks) for s in active_connections.values()))]
+)
+metrics.gauge(
+    "mcp_session_queue_frames", "Frames waiting in each session's send queue",
+    lambda: [((sid,), s.responses.qsize()) for sid, s in active_connections.items()],
+    ("session",)
+)
+metrics.gauge(
+    "mcp_session_queue_bytes", "Bytes waiting in each session's send queue",
+    lambda: [((sid,), s.queued_bytes) for sid, s in active_connections.items()],
+    ("session",)
+)
+metrics.gauge(
+    "mcp_tool_slots_active", "Tool calls holding an executor slot",
+    lambda: [((), tool_executor.scheduler.active)] if tool_executor else []
+)
+metrics.gauge(
+    "mcp_tool_queue_depth", "Tool calls waiting for an executor slot",
+    lambda: [((), tool_executor.scheduler.queued)] if tool_executor else []
+)
+metrics.gauge(
+    "mcp_tool_cache_hits_total", "Tool result cache hits",
+    lambda: [((name,), c["hits"]) for name, c in tool_cache.counters.items()],
+    ("tool",), kind="counter"
+)
+metrics.gauge(
+    "mcp_tool_cache_misses_total", "Tool result cache misses",
+    lambda: [((name,), c["misses"]) for name, c in tool_cache.counters.items()],
+    ("tool",), kind="counter"
+)
+metrics.gauge(
+    "mcp_tool_calls_coalesced_total", "Tool calls that shared an in-flight execution",
+    lambda: [((name,), n) for name, n in single_flight.coalesced_by_name.items()],
+    ("tool",), kind="counter"
+)
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus のテキスト形式のメトリクス"""
+    return Response(content=metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+
 @app.get("/sse")
 async def sse_endpoint(request: Request):
     """
@@ -298,68 +2048,135 @@ async def sse_endpoint(request: Request):
     
     クライアントはこのエンドポイントに接続して、
     サーバーからのイベントをリアルタイムで受信します。
+    ?session_id=... を付けると切断されたセッションに再接続します。
     """
-    # セッションIDを生成
-    session_id = str(uuid.uuid4())
+    if "session_id" in request.query_params:
+        return await resume_sse_stream(request, request.query_params["session_id"])
+
+    # セッション数の上限を超える接続は受け付けない
+    if len(active_connections) >= config.max_sessions:
+        return JSONResponse(
+            content={
+                "error": "Too many sessions",
+                "hint": "Retry later"
+            },
+            status_code=503,
+            headers={"Retry-After": "5"}
+        )
     
-    # このセッション用のキューを作成
-    queue = asyncio.Queue()
-    active_connections[session_id] = queue
-    pending_responses[session_id] = asyncio.Queue()
+    # セッションIDを生成（このワーカーのIDを含む）
+    session_id = router.new_session_id()
     
-    print(f"[SSE] New connection: {session_id}", flush=True)
+    # このセッションを登録
+    session = Session(session_id, config.session_max_inflight)
+    active_connections[session_id] = session
+    # 他ワーカーからの配信は待たせない（ワーカー間の接続を詰まらせないため）
+    router.register(session_id, partial(session.deliver, block=False))
     
-    async def event_generator():
-        """SSEイベントを生成"""
+    keepalive.add(session)
+    
+    log.info("[SSE] New connection", session_id=session_id)
+    
+    # 接続確立イベント
+    connected = encode_event("connected", mcp_codec.dumps({
+        "session_id": session_id,
+        "message": "SSE connection established"
+    }))
+    
+    return open_sse_stream(request, session, connected)
+
+
+def response_encoding(request: Request) -> Optional[str]:
+    """Accept-Encoding とサーバーの設定から圧縮方式を選ぶ（圧縮しなければ None）"""
+    return stream_compression.negotiate(
+        request.headers.get("accept-encoding", ""), config.compression_encodings()
+    )
+
+
+def record_sse_write(frames: int) -> None:
+    """SSEストリームへの1回の書き込みを記録（frames はまとめたフレーム数）"""
+    SSE_FRAMES_PER_WRITE.observe(frames)
+
+
+def open_sse_stream(
+    request: Request,
+    session: Session,
+    connected: bytes,
+    last_event_id: Optional[int] = None
+) -> SSEStreamResponse:
+    """
+    セッションの送信キューを流すストリームを作って接続する
+
+    キューのフレームはそのまま送信されます（ping は KeepaliveScheduler が入れる）。
+    溜まっているフレームは sse_batch_bytes までまとめて1回で書き込みます。
+    クライアントが対応していればストリーム全体を圧縮し、フレームごとにフラッシュします。
+    切断は receive チャネルの http.disconnect で検知され、detach が呼ばれます。
+    """
+    stream = SSEStreamResponse(
+        session.responses,
+        initial=connected,
+        on_sent=session.mark_sent,
+        encoding=response_encoding(request),
+        batch_bytes=config.sse_batch_bytes,
+        batch_delay=config.sse_batch_delay,
+        on_write=record_sse_write,
+    )
+    stream.on_close = partial(session.detach, stream)
+    session.attach(stream, last_event_id)
+    return stream
+
+
+async def resume_sse_stream(request: Request, session_id: str):
+    """
+    切断されたセッションへの再接続
+
+    Last-Event-ID より後のイベントをすべて再送できる場合だけ再開します。
+    再開できない場合は 404 / 409 を返すので、クライアントは新しいセッションを開きます。
+    """
+    # セッションはストリームを保持していたワーカーにしかないため、
+    # 別のワーカーに届いた再接続は再開できない
+    session = active_connections.get(session_id)
+    if session is None or session.closed:
+        return JSONResponse(
+            content={"error": "Unknown session", "hint": "Open a new stream without session_id"},
+            status_code=404
+        )
+    
+    header = request.headers.get("last-event-id")
+    try:
+        last_event_id = int(header) if header else 0
+    except ValueError:
+        return JSONResponse(content={"error": "Invalid Last-Event-ID"}, status_code=400)
+    
+    if not session.can_resume(last_event_id):
+        return JSONResponse(
+            content={
+                "error": "Events after Last-Event-ID are no longer available",
+                "hint": "Open a new stream without session_id"
+            },
+            status_code=409
+        )
+    
+    # まだ古いストリームが残っていれば、終わるのを待ってから引き継ぐ
+    previous = session.stream
+    if previous is not None:
+        # 先に外しておき、古いストリームの切断処理でセッションが閉じられないようにする
+        session.stream = None
+        previous.stop()
         try:
-            # 接続確立イベントを送信
-            yield {
-                "event": "connected",
-                "data": json.dumps({
-                    "session_id": session_id,
-                    "message": "SSE connection established"
-                })
-            }
-            
-            # キューからイベントを取得して送信
-            while True:
-                # クライアントの切断をチェック
-                if await request.is_disconnected():
-                    print(f"[SSE] Client disconnected: {session_id}", flush=True)
-                    break
-                
-                try:
-                    # タイムアウト付きでメッセージを待つ
-                    message = await asyncio.wait_for(
-                        pending_responses[session_id].get(),
-                        timeout=30.0
-                    )
-                    
-                    # メッセージをSSEイベントとして送信
-                    yield {
-                        "event": "message",
-                        "data": json.dumps(message)
-                    }
-                    
-                except asyncio.TimeoutError:
-                    # キープアライブ（接続維持）
-                    yield {
-                        "event": "ping",
-                        "data": json.dumps({"timestamp": datetime.now().isoformat()})
-                    }
-                
-        except Exception as e:
-            print(f"[SSE] Error in event generator: {e}", flush=True)
-        
-        finally:
-            # クリーンアップ
-            if session_id in active_connections:
-                del active_connections[session_id]
-            if session_id in pending_responses:
-                del pending_responses[session_id]
-            print(f"[SSE] Connection closed: {session_id}", flush=True)
+            await asyncio.wait_for(previous.finished.wait(), timeout=5.0)
+        except asyncio.TimeoutError:
+            pass
     
-    return EventSourceResponse(event_generator())
+    log.info("[SSE] Resumed", session_id=session_id, last_event_id=last_event_id)
+    
+    connected = encode_event("connected", mcp_codec.dumps({
+        "session_id": session_id,
+        "message": "SSE connection resumed",
+        "resumed": True,
+        "last_event_id": last_event_id
+    }))
+    return open_sse_stream(request, session, connected, last_event_id)
 
 
 @app.post("/messages")
@@ -369,14 +2186,43 @@ async def messages_endpoint(request: Request):
     
     クライアントはこのエンドポイントにMCPリクエストを送信します。
     レスポンスはSSEストリーム経由で返されます。
+    
+    リクエストはバックグラウンドで処理され、受信確認はすぐに返ります。
+    同じセッションの複数リクエストは並行して処理され、
+    レスポンスは完了した順に送信されます。
+    同時処理数の空きを待てる数（session_max_queued）やレート制限を超えた
+    リクエストは処理せず、429 とJSON-RPCのエラーをこのレスポンスで返します。
+    
+    JSON-RPC 2.0 のバッチ（配列）も受け付けます。バッチの各要素は並行して
+    処理され、レスポンス配列が1つの message イベントとして送信されます。
     """
+    received_at = asyncio.get_running_loop().time()
+    session_id = None
     try:
-        body = await request.json()
+        try:
+            body = mcp_codec.loads(await request.body())
+        except mcp_codec.DecodeError:
+            # クライアントの誤りなので 400 と JSON-RPC の Parse error で返す（POST /mcp と同じ）
+            log.warning("[Messages] Parse error", session_id=request.headers.get("X-Session-Id"))
+            return Response(
+                content=mcp_codec.dumps(parse_error_response()),
+                status_code=400,
+                media_type="application/json"
+            )
         
         # セッションIDを取得（ヘッダーまたはボディから）
-        session_id = request.headers.get("X-Session-Id") or body.get("_session_id")
+        session_id = request.headers.get("X-Session-Id")
+        if not session_id:
+            if isinstance(body, dict):
+                session_id = body.get("_session_id")
+            elif isinstance(body, list):
+                session_id = next(
+                    (m["_session_id"] for m in body if isinstance(m, dict) and "_session_id" in m),
+                    None
+                )
         
-        if not session_id or session_id not in pending_responses:
+        session = await find_session(session_id) if session_id else None
+        if session is None or session.closed:
             return JSONResponse(
                 content={
                     "error": "Invalid or missing session_id",
@@ -385,14 +2231,33 @@ async def messages_endpoint(request: Request):
                 status_code=400
             )
         
-        print(f"[Messages] Received request from {session_id}: {body.get('method')}", flush=True)
+        if isinstance(body, list):
+            log.sampled("[Messages] Received batch", session_id=session_id, size=len(body))
+        elif isinstance(body, dict):
+            log.sampled("[Messages] Received request", session_id=session_id, method=body.get("method"))
         
-        # MCPリクエストを処理
-        response = process_mcp_request(body)
+        session.touch()
         
-        # レスポンスをSSEキューに追加
-        if response:
-            await pending_responses[session_id].put(response)
+        # レート制限を超えたら処理せずに断る（バッチは要素数ぶん数える。キャンセルなどの通知は数えない）
+        if not is_exempt_from_rate_limit(body):
+            retry_after = session.bucket.take(
+                received_at, len(body) if isinstance(body, list) else 1
+            )
+            if retry_after > 0:
+                return rate_limited_response(body, retry_after)
+        
+        if is_control_message(body):
+            # 制御系のメソッドは同時処理数に数えず、実行中のツール呼び出しを待たずに処理する
+            session.submit(body, request_timing(body, received_at), control=True)
+        elif len(session.tasks) >= config.session_max_inflight + config.session_max_queued:
+            # 同時処理数の空きを待てる数（session_max_queued）を超えたら待たせずに断る
+            return overloaded_http_response(
+                body, Overloaded("session_queue_full", tool_executor.scheduler.retry_after())
+            )
+        else:
+            # MCPリクエストをバックグラウンドで処理（完了後にSSEキューへ追加）。
+            # 同時処理数の空きはタスクの中で待つので、受信確認はすぐに返る（バッチは1件として数える）
+            session.submit(body, request_timing(body, received_at))
         
         # 受信確認を返す
         return JSONResponse(
@@ -403,13 +2268,191 @@ async def messages_endpoint(request: Request):
         )
     
     except Exception as e:
-        print(f"[Messages] Error: {e}", flush=True)
+        log.error("[Messages] Error", e, session_id=session_id)
         return JSONResponse(
             content={"error": str(e)},
             status_code=500
         )
 
 
+# ========================================
+# Streamable HTTPエンドポイント
+# ========================================
+
+async def wait_unless_disconnected(
+    request: Request,
+    task: asyncio.Future,
+    timeout: Optional[float] = None
+) -> bool:
+    """
+    task の完了を（timeout 秒まで）待つ
+
+    先にクライアントが切断した場合は task をキャンセルして False を返します。
+    リクエストボディは読み終えている前提です（次の receive は切断まで返らない）。
+    """
+    async def wait_for_disconnect() -> None:
+        while (await request.receive())["type"] != "http.disconnect":
+            pass
+    
+    listener = asyncio.ensure_future(wait_for_disconnect())
+    try:
+        await asyncio.wait({task, listener}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        listener.cancel()
+    if listener.done() and not listener.cancelled() and not task.done():
+        task.cancel()
+        return False
+    return True
+
+
+@app.post("/mcp")
+async def streamable_http_endpoint(request: Request):
+    """
+    Streamable HTTP エンドポイント
+    
+    SSEストリームやセッションを使わず、JSON-RPCレスポンスを
+    このPOSTのレスポンスボディで直接返します。
+    
+    処理が streamable_stream_after 秒以内に終わらず、クライアントが
+    Accept: text/event-stream を受け付ける場合は、短いSSEストリームに
+    切り替えて完了時にレスポンスを送信します。
+    """
+    loop = asyncio.get_running_loop()
+    received_at = loop.time()
+    try:
+        body = mcp_codec.loads(await request.body())
+    except mcp_codec.DecodeError:
+        return Response(
+            content=mcp_codec.dumps(parse_error_response()),
+            status_code=400,
+            media_type="application/json"
+        )
+    
+    # セッションがないので、ツール実行の順番待ちは接続元ごとに数える
+    request_context.set(RequestContext(f"mcp:{request.client.host}" if request.client else "mcp"))
+    request_received_at.set(received_at)
+    task = asyncio.ensure_future(process_mcp_message(body))
+    accepts_sse = "text/event-stream" in request.headers.get("accept", "")
+    timeout = config.streamable_stream_after if accepts_sse else None
+    if not await wait_unless_disconnected(request, task, timeout):
+        # 応答を待たずに切断されたので、処理を止めて何も返さない
+        return Response(status_code=499)
+    
+    if task.done() or not accepts_sse:
+        response = await task
+        if not response:
+            # 通知のみの場合はボディなしで受理
+            return Response(status_code=202)
+        content = encode_response(response)
+        headers = None
+        if len(content) >= config.compress_min_bytes:
+            encoding = response_encoding(request)
+            if encoding is not None:
+                content = stream_compression.compress_body(content, encoding)
+                headers = {"Content-Encoding": encoding, "Vary": "Accept-Encoding"}
+        observe_latency(request_timing(body, received_at), loop.time())
+        return Response(content=content, media_type="application/json", headers=headers)
+    
+    async def event_generator():
+        """
+        完了したレスポンスを1件だけ送信して閉じる
+        （切断されるとこのジェネレーターごとキャンセルされ、await している task も止まる）
+        """
+        response = await task
+        if response:
+            yield {
+                "event": "message",
+                "data": encode_response(response).decode("utf-8")
+            }
+            # yield から戻った時点でイベントは書き込み済み
+            observe_latency(request_timing(body, received_at), loop.time())
+    
+    return EventSourceResponse(event_generator())
+
+
+# ========================================
+# WebSocketエンドポイント
+# ========================================
+
+@app.websocket("/ws")
+async def websocket_endpoint(websocket: WebSocket):
+    """
+    WebSocketエンドポイント
+
+    1本の接続で JSON-RPC のリクエスト・レスポンス・通知を双方向に運びます。
+    POST /messages + SSE と同じセッションの仕組み（同時処理数、レート制限、
+    キャンセル、途中経過の通知）で処理し、レスポンスは完了した順に送信します。
+    セッションIDは X-Session-Id ヘッダーで返します。
+    """
+    # セッション数の上限を超える接続は受け付けない（HTTP 403 で断られる）
+    if len(active_connections) >= config.max_sessions:
+        await websocket.close(code=1013)
+        return
+    
+    session_id = router.new_session_id()
+    subprotocol = "mcp" if "mcp" in websocket.scope.get("subprotocols", ()) else None
+    await websocket.accept(subprotocol=subprotocol, headers=[(b"x-session-id", session_id.encode("ascii"))])
+    
+    session = WebSocketSession(session_id, config.session_max_inflight)
+    active_connections[session_id] = session
+    # 他ワーカーが受けた POST /messages のレスポンスもこの接続に届ける
+    router.register(session_id, partial(session.deliver, block=False))
+    # ping は送らないが、アイドルタイムアウトの判定に使う
+    keepalive.add(session)
+    
+    log.info("[WS] New connection", session_id=session_id)
+    
+    stream = WebSocketStream(
+        websocket,
+        session.responses,
+        partial(receive_ws_message, session),
+        on_sent=session.mark_sent,
+    )
+    stream.on_close = partial(session.detach, stream)
+    session.attach(stream)
+    await stream.run()
+
+
+async def receive_ws_message(session: Session, data: Any, received_at: float) -> None:
+    """
+    WebSocketで受信した1メッセージを処理する（POST /messages と同じ流れ）
+
+    次のメッセージ（notifications/cancelled など）の受信を止めないよう、
+    同時処理数の空きは処理タスクの中で待ちます。空きを待てる数は
+    session_max_queued までで、超えた分は Overloaded のエラーで断ります。
+    """
+    try:
+        body = mcp_codec.loads(data)
+    except mcp_codec.DecodeError:
+        await session.deliver(mcp_codec.dumps(parse_error_response()), block=False)
+        return
+    
+    if isinstance(body, list):
+        log.sampled("[WS] Received batch", session_id=session.session_id, size=len(body))
+    elif isinstance(body, dict):
+        log.sampled("[WS] Received request", session_id=session.session_id, method=body.get("method"))
+    
+    session.touch()
+    
+    error = None
+    retry_after = 0.0
+    if not is_exempt_from_rate_limit(body):
+        retry_after = session.bucket.take(received_at, len(body) if isinstance(body, list) else 1)
+    if retry_after > 0:
+        error = Overloaded("rate_limited", round(retry_after, 3))
+    elif is_control_message(body):
+        session.submit(body, request_timing(body, received_at), control=True)
+    elif len(session.tasks) >= config.session_max_inflight + config.session_max_queued:
+        error = Overloaded("session_queue_full", tool_executor.scheduler.retry_after())
+    else:
+        session.submit(body, request_timing(body, received_at))
+    
+    if error is not None:
+        content = rejected_responses(body, error)
+        if content is not None:
+            await session.deliver(content, block=False)
+
+
 # ========================================
 # メイン処理
 # ========================================
@@ -420,15 +2463,145 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="MCP SSE Server")
     parser.add_argument("--host", default="127.0.0.1", help="Host to bind")
     parser.add_argument("--port", type=int, default=8999, help="Port to bind")
+    parser.add_argument("--thread-workers", type=int, help="Tool thread pool size")
+    parser.add_argument("--process-workers", type=int, help="Tool process pool size (0 to disable)")
+    parser.add_argument("--max-concurrency", type=int, help="Max concurrent tool executions")
+    parser.add_argument("--max-queued", type=int, help="Max tool calls waiting for an executor slot")
+    parser.add_argument("--session-queued", type=int, help="Max waiting tool calls per session")
+    parser.add_argument(
+        "--tool-backend",
+        action="append",
+        default=[],
+        metavar="TOOL=BACKEND",
+        help="Per-tool execution backend (thread or process)"
+    )
+    parser.add_argument(
+        "--tool-timeout",
+        type=float,
+        help="Default tool call deadline in seconds, counted from request receipt (0 to disable)"
+    )
+    parser.add_argument(
+        "--tool-timeouts",
+        action="append",
+        default=[],
+        metavar="TOOL=SECONDS",
+        help="Per-tool call deadline in seconds"
+    )
+    parser.add_argument("--keepalive", type=float, help="Keepalive ping interval in seconds")
+    parser.add_argument(
+        "--sse-batch-bytes",
+        type=int,
+        help="Max bytes of queued SSE frames written in one send (0 to disable coalescing)"
+    )
+    parser.add_argument(
+        "--sse-batch-delay",
+        type=float,
+        help="Seconds to wait for more frames during a burst before writing"
+    )
+    parser.add_argument("--session-inflight", type=int, help="Max in-flight requests per session")
+    parser.add_argument("--rate-limit", type=float, help="Requests per second per session (0 to disable)")
+    parser.add_argument("--rate-burst", type=float, help="Request burst allowed per session")
+    parser.add_argument(
+        "--stream-after",
+        type=float,
+        help="Seconds before POST /mcp switches to an SSE response"
+    )
+    
+    parser.add_argument("--max-sessions", type=int, help="Max SSE sessions per worker")
+    parser.add_argument("--queue-frames", type=int, help="Max queued frames per session")
+    parser.add_argument("--queue-bytes", type=int, help="Max queued bytes per session")
+    parser.add_argument("--overflow", choices=OVERFLOW_POLICIES, help="Session queue overflow policy")
+    parser.add_argument("--idle-timeout", type=float, help="Close sessions idle for this many seconds (0 to disable)")
+    parser.add_argument("--replay-frames", type=int, help="Events kept per session for Last-Event-ID replay")
+    parser.add_argument("--replay-bytes", type=int, help="Bytes kept per session for Last-Event-ID replay")
+    parser.add_argument(
+        "--resume-timeout",
+        type=float,
+        help="Seconds to keep a disconnected session for resumption (0 to close immediately)"
+    )
+    parser.add_argument("--cache-entries", type=int, help="Tool result cache entries (0 to disable)")
+    parser.add_argument("--cache-bytes", type=int, help="Tool result cache size in bytes")
+    parser.add_argument("--cache-ttl", type=float, help="Tool result cache TTL in seconds")
+    parser.add_argument(
+        "--compression",
+        help="Comma-separated encodings offered to clients (e.g. gzip,deflate; 'none' to disable)"
+    )
+    parser.add_argument(
+        "--compress-min-bytes",
+        type=int,
+        help="Smallest POST /mcp response body that is compressed"
+    )
+    parser.add_argument("--log-level", choices=LOG_LEVELS, help="Server log level")
+    parser.add_argument(
+        "--log-sample-rate",
+        type=float,
+        help="Fraction of per-request log lines to write (0.0-1.0)"
+    )
+    parser.add_argument("--workers", type=int, default=1, help="Number of uvicorn worker processes")
+    parser.add_argument(
+        "--router-socket-dir",
+        help="Directory for inter-worker session routing sockets (default: temporary directory)"
+    )
     
     args = parser.parse_args()
     
+    # 起動オプションは環境変数経由で反映する（uvicornのワーカープロセスにも引き継がれる）
+    overrides = {
+        "MCP_TOOL_THREAD_WORKERS": args.thread_workers,
+        "MCP_TOOL_PROCESS_WORKERS": args.process_workers,
+        "MCP_TOOL_MAX_CONCURRENCY": args.max_concurrency,
+        "MCP_TOOL_MAX_QUEUED": args.max_queued,
+        "MCP_SESSION_MAX_QUEUED": args.session_queued,
+        "MCP_TOOL_BACKENDS": ",".join(args.tool_backend) or None,
+        "MCP_TOOL_TIMEOUT": args.tool_timeout,
+        "MCP_TOOL_TIMEOUTS": ",".join(args.tool_timeouts) or None,
+        "MCP_KEEPALIVE_INTERVAL": args.keepalive,
+        "MCP_SESSION_MAX_INFLIGHT": args.session_inflight,
+        "MCP_SESSION_RATE_LIMIT": args.rate_limit,
+        "MCP_SESSION_RATE_BURST": args.rate_burst,
+        "MCP_STREAMABLE_STREAM_AFTER": args.stream_after,
+        "MCP_SSE_BATCH_BYTES": args.sse_batch_bytes,
+        "MCP_SSE_BATCH_DELAY": args.sse_batch_delay,
+        "MCP_ROUTER_SOCKET_DIR": args.router_socket_dir,
+        "MCP_MAX_SESSIONS": args.max_sessions,
+        "MCP_SESSION_QUEUE_FRAMES": args.queue_frames,
+        "MCP_SESSION_QUEUE_BYTES": args.queue_bytes,
+        "MCP_SESSION_OVERFLOW": args.overflow,
+        "MCP_SESSION_IDLE_TIMEOUT": args.idle_timeout,
+        "MCP_SESSION_REPLAY_FRAMES": args.replay_frames,
+        "MCP_SESSION_REPLAY_BYTES": args.replay_bytes,
+        "MCP_SESSION_RESUME_TIMEOUT": args.resume_timeout,
+        "MCP_TOOL_CACHE_ENTRIES": args.cache_entries,
+        "MCP_TOOL_CACHE_BYTES": args.cache_bytes,
+        "MCP_TOOL_CACHE_TTL": args.cache_ttl,
+        "MCP_COMPRESSION": args.compression,
+        "MCP_COMPRESS_MIN_BYTES": args.compress_min_bytes,
+        "MCP_LOG_LEVEL": args.log_level,
+        "MCP_LOG_SAMPLE_RATE": args.log_sample_rate,
+    }
+    if args.workers > 1 and not (args.router_socket_dir or config.router_socket_dir):
+        import tempfile
+        overrides["MCP_ROUTER_SOCKET_DIR"] = tempfile.mkdtemp(prefix="mcp-sse-router-")
+    for key, value in overrides.items():
+        if value is not None:
+            os.environ[key] = str(value)
+    config = ServerConfig.from_env()
+    router = create_router(config.router_socket_dir)
+    tool_cache = ResultCache(
+        config.tool_cache_max_entries,
+        config.tool_cache_max_bytes,
+        config.tool_cache_ttl
+    )
+    log.configure(config.log_level, config.log_sample_rate)
+    
     print(f"""
 ╔════════════════════════════════════════════════════════════╗
 ║  MCP SSE Server Started                                    ║
 ╠════════════════════════════════════════════════════════════╣
 ║  SSE Stream:  http://{args.host}:{args.port}/sse              ║
 ║  Messages:    http://{args.host}:{args.port}/messages        ║
+║  Streamable:  http://{args.host}:{args.port}/mcp             ║
+║  WebSocket:   ws://{args.host}:{args.port}/ws                ║
 ║  Health:      http://{args.host}:{args.port}/health          ║
 ╠════════════════════════════════════════════════════════════╣
 ║  SSE (Server-Sent Events) について                        ║
@@ -448,12 +2621,29 @@ if __name__ == "__main__":
 終了するには Ctrl+C を押してください
 """)
     
+    # SSEストリームは自分からは終わらないため、停止時は一定時間で打ち切る
+    # （クライアントは Last-Event-ID 付きで再接続してくる）
+    SHUTDOWN_TIMEOUT = 5
+    
     try:
-        uvicorn.run(
-            app,
-            host=args.host,
-            port=args.port,
-            log_level="info"
-        )
+        if args.workers > 1:
+            # 各ワーカーはモジュールを読み込み直し、環境変数から設定を復元する
+            uvicorn.run(
+                "server_http_sse:app",
+                host=args.host,
+                port=args.port,
+                workers=args.workers,
+                app_dir=str(Path(__file__).parent),
+                log_level="info",
+                timeout_graceful_shutdown=SHUTDOWN_TIMEOUT
+            )
+        else:
+            uvicorn.run(
+                app,
+                host=args.host,
+                port=args.port,
+                log_level="info",
+                timeout_graceful_shutdown=SHUTDOWN_TIMEOUT
+            )
     except KeyboardInterrupt:
         print("\n\nサーバーを停止しました")
\ No newline at end of file
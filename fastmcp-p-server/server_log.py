@@ -0,0 +1,120 @@
+"""
+サーバーログ
+イベントループをブロックしない、キュー経由の構造化ロガー
+
+ログ呼び出しはレコードをキューに入れるだけで、文字列の整形と
+標準出力への書き込み・flush はバックグラウンドスレッド（QueueListener）が行います。
+
+    log = ServerLogger("mcp.sse")
+    log.info("[SSE] New connection", session_id=session_id)
+    log.sampled("[Messages] Received request", session_id=session_id, method=method)
+
+- レベルが無効なログは、引数を整形する前に捨てられる
+- sampled() はリクエストごとの行用で、sample_rate の割合だけ出力する
+"""
+import logging
+import logging.handlers
+import queue
+import sys
+from typing import Any, Optional
+
+LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+
+
+class _FieldsFormatter(logging.Formatter):
+    """message の後ろに key=value の追加情報を付ける"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " | " + " | ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    レコードを整形せずにそのままキューへ入れる
+
+    標準の QueueHandler は呼び出し元のスレッドでメッセージを整形するため、
+    整形もリスナー側のスレッドで行うようにする（同一プロセス内なので安全）。
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class ServerLogger:
+    """キュー経由でログを書き出すロガー"""
+
+    def __init__(self, name: str, level: str = "INFO", sample_rate: float = 1.0):
+        self.logger = logging.getLogger(name)
+        self.logger.propagate = False
+        self.queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        self.listener: Optional[logging.handlers.QueueListener] = None
+        self._sample_credit = 0.0
+        if not self.logger.handlers:
+            self.logger.addHandler(_DeferredQueueHandler(self.queue))
+        self.configure(level, sample_rate)
+
+    def configure(self, level: str, sample_rate: float) -> None:
+        """レベルとサンプリング率を設定"""
+        level = level.upper()
+        if level not in LEVELS:
+            raise ValueError(f"Unknown log level: {level}")
+        self.logger.setLevel(level)
+        self.sample_rate = min(max(sample_rate, 0.0), 1.0)
+
+    def start(self) -> None:
+        """書き出し用のスレッドを起動（起動前のログはキューに溜まっている）"""
+        if self.listener is not None:
+            return
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(_FieldsFormatter("%(asctime)s %(levelname)s %(message)s"))
+        self.listener = logging.handlers.QueueListener(self.queue, handler)
+        self.listener.start()
+
+    def stop(self) -> None:
+        """キューに残ったログを書き出してスレッドを止める"""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def _log(self, level: int, message: str, fields: dict, exc_info: Any = None) -> None:
+        if not self.logger.isEnabledFor(level):
+            return
+        if isinstance(exc_info, BaseException):
+            exc_info = (type(exc_info), exc_info, exc_info.__traceback__)
+        # 呼び出し元のファイル名・行番号は使わないので、スタックをたどる findCaller を省く
+        record = self.logger.makeRecord(
+            self.logger.name, level, "", 0, message, (), exc_info, extra={"fields": fields}
+        )
+        self.logger.handle(record)
+
+    def debug(self, message: str, **fields: Any) -> None:
+        self._log(logging.DEBUG, message, fields)
+
+    def info(self, message: str, **fields: Any) -> None:
+        self._log(logging.INFO, message, fields)
+
+    def warning(self, message: str, **fields: Any) -> None:
+        self._log(logging.WARNING, message, fields)
+
+    def error(self, message: str, error: Optional[BaseException] = None, **fields: Any) -> None:
+        if error is not None:
+            fields["error"] = error
+        self._log(logging.ERROR, message, fields, exc_info=error)
+
+    def sampled(self, message: str, **fields: Any) -> None:
+        """
+        リクエストごとの INFO ログ（sample_rate の割合だけ出力）
+
+        乱数は使わず、1件ごとに sample_rate ずつ貯めて 1 を超えたら出力します。
+        """
+        if self.sample_rate <= 0.0 or not self.logger.isEnabledFor(logging.INFO):
+            return
+        self._sample_credit += self.sample_rate
+        if self._sample_credit < 1.0:
+            return
+        self._sample_credit -= 1.0
+        self._log(logging.INFO, message, fields)
@@ -0,0 +1,228 @@
+"""
+セッションルーティング
+SSEストリームを保持しているワーカーへレスポンスを届ける層
+
+uvicorn を --workers N で起動すると、GET /sse と POST /messages が
+別々のワーカープロセスに届くことがあります。
+session_id にストリームを保持するワーカーのIDを埋め込み、
+POSTを受けたワーカーが処理結果をそのワーカーへ転送します。
+
+- LocalSessionRouter: プロセス内だけで完結するルーター（単一ワーカー・テスト用）
+- UnixSocketSessionRouter: ワーカーごとに Unix ドメインソケットを開き、
+  他ワーカーが保持するセッションへレスポンスを転送するルーター
+"""
+import asyncio
+import os
+import struct
+import uuid
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+# セッションにエンコード済みレスポンスを渡すコールバック（受け付けたら True）
+DeliverCallback = Callable[[bytes], Awaitable[bool]]
+
+# deliver の結果
+# - DELIVERED: セッションの送信キューに入った
+# - QUEUE_FULL: セッションはあるが、送信キューがいっぱいで受け付けられなかった
+# - UNKNOWN_SESSION: セッションがない（閉じられた、持ち主のワーカーに届かない）
+DELIVERED = "delivered"
+QUEUE_FULL = "queue_full"
+UNKNOWN_SESSION = "unknown_session"
+
+# フレーム: 長さ(4バイト) + 操作(1バイト) + session_id長(2バイト) + session_id + ペイロード
+_HEADER = struct.Struct("!IBH")
+_OP_EXISTS = 1
+_OP_DELIVER = 2
+
+# 応答（1バイト）
+_REPLY_OK = b"\x01"
+_REPLY_UNKNOWN = b"\x00"
+_REPLY_FULL = b"\x02"
+_REPLIES = {DELIVERED: _REPLY_OK, QUEUE_FULL: _REPLY_FULL, UNKNOWN_SESSION: _REPLY_UNKNOWN}
+_RESULTS = {reply: result for result, reply in _REPLIES.items()}
+
+
+class LocalSessionRouter:
+    """プロセス内だけで完結するルーター"""
+
+    def __init__(self, worker_id: str = "local"):
+        self.worker_id = worker_id
+        self.sessions: Dict[str, DeliverCallback] = {}
+
+    def new_session_id(self) -> str:
+        """このワーカーに属する session_id を発行"""
+        return f"{self.worker_id}.{uuid.uuid4()}"
+
+    @staticmethod
+    def owner_of(session_id: str) -> str:
+        """session_id からストリームを保持するワーカーIDを取り出す"""
+        return session_id.split(".", 1)[0]
+
+    def is_local(self, session_id: str) -> bool:
+        """このワーカーが保持するセッションか"""
+        return self.owner_of(session_id) == self.worker_id
+
+    def register(self, session_id: str, deliver: DeliverCallback) -> None:
+        """セッションを登録"""
+        self.sessions[session_id] = deliver
+
+    def unregister(self, session_id: str) -> None:
+        """セッションの登録を解除"""
+        self.sessions.pop(session_id, None)
+
+    async def exists(self, session_id: str) -> bool:
+        """セッションが（いずれかのワーカーに）存在するか"""
+        return session_id in self.sessions
+
+    async def deliver(self, session_id: str, payload: bytes) -> str:
+        """
+        セッションにレスポンスを届ける（DELIVERED / QUEUE_FULL / UNKNOWN_SESSION）
+
+        コールバックが受け付けなかった場合、セッションがまだ登録されていれば
+        送信キューがいっぱいだった（QUEUE_FULL）とみなします。
+        """
+        deliver = self.sessions.get(session_id)
+        if deliver is None:
+            return UNKNOWN_SESSION
+        if await deliver(payload):
+            return DELIVERED
+        return QUEUE_FULL if self.sessions.get(session_id) is deliver else UNKNOWN_SESSION
+
+    async def start(self) -> None:
+        """ルーターを起動"""
+
+    async def stop(self) -> None:
+        """ルーターを停止"""
+
+
+class _PeerConnection:
+    """他ワーカーへの永続接続（1リクエストずつ直列に送る）"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.lock = asyncio.Lock()
+
+    async def request(self, op: int, session_id: str, payload: bytes = b"") -> bytes:
+        """要求を送り、応答の1バイトを返す（相手に届かなければ _REPLY_UNKNOWN）"""
+        async with self.lock:
+            for attempt in range(2):
+                try:
+                    if self.writer is None:
+                        self.reader, self.writer = await asyncio.open_unix_connection(
+                            str(self.path)
+                        )
+                    self.writer.write(_encode_frame(op, session_id, payload))
+                    await self.writer.drain()
+                    return await self.reader.readexactly(1)
+                except (OSError, asyncio.IncompleteReadError):
+                    # 相手ワーカーが再起動した場合に備えて1回だけ再接続する
+                    self.close()
+                    if attempt == 1:
+                        return _REPLY_UNKNOWN
+            return _REPLY_UNKNOWN
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = None
+        self.writer = None
+
+
+def _encode_frame(op: int, session_id: str, payload: bytes) -> bytes:
+    sid = session_id.encode("utf-8")
+    return _HEADER.pack(1 + 2 + len(sid) + len(payload), op, len(sid)) + sid + payload
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> Tuple[int, str, bytes]:
+    header = await reader.readexactly(_HEADER.size)
+    length, op, sid_length = _HEADER.unpack(header)
+    body = await reader.readexactly(length - 3)
+    return op, body[:sid_length].decode("utf-8"), body[sid_length:]
+
+
+class UnixSocketSessionRouter(LocalSessionRouter):
+    """
+    Unix ドメインソケットでワーカー間を中継するルーター
+
+    各ワーカーは socket_dir/worker-<worker_id>.sock で待ち受けます。
+    自ワーカーのセッションはプロセス内で直接配信し、
+    他ワーカーのセッションはそのワーカーのソケットへ転送します。
+    """
+
+    def __init__(self, socket_dir: str, worker_id: Optional[str] = None):
+        super().__init__(worker_id or str(os.getpid()))
+        self.socket_dir = Path(socket_dir)
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.peers: Dict[str, _PeerConnection] = {}
+
+    def socket_path(self, worker_id: str) -> Path:
+        """ワーカーの待ち受けソケットのパス"""
+        return self.socket_dir / f"worker-{worker_id}.sock"
+
+    async def start(self) -> None:
+        self.socket_dir.mkdir(parents=True, exist_ok=True)
+        path = self.socket_path(self.worker_id)
+        if path.exists():
+            path.unlink()
+        self.server = await asyncio.start_unix_server(self._handle_peer, path=str(path))
+
+    async def stop(self) -> None:
+        for peer in self.peers.values():
+            peer.close()
+        self.peers.clear()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        path = self.socket_path(self.worker_id)
+        if path.exists():
+            path.unlink()
+
+    async def _handle_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """他ワーカーからの要求を処理"""
+        try:
+            while True:
+                op, session_id, payload = await _read_frame(reader)
+                if op == _OP_EXISTS:
+                    exists = await LocalSessionRouter.exists(self, session_id)
+                    reply = _REPLY_OK if exists else _REPLY_UNKNOWN
+                else:
+                    reply = _REPLIES[await LocalSessionRouter.deliver(self, session_id, payload)]
+                writer.write(reply)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, OSError):
+            pass
+        finally:
+            writer.close()
+
+    def _peer(self, session_id: str) -> _PeerConnection:
+        owner = self.owner_of(session_id)
+        peer = self.peers.get(owner)
+        if peer is None:
+            peer = self.peers[owner] = _PeerConnection(self.socket_path(owner))
+        return peer
+
+    async def exists(self, session_id: str) -> bool:
+        if self.is_local(session_id):
+            return await super().exists(session_id)
+        # クライアントが送ってきた値なので、ソケットのパスに使う前に検証する
+        if not self.owner_of(session_id).isalnum():
+            return False
+        return await self._peer(session_id).request(_OP_EXISTS, session_id) == _REPLY_OK
+
+    async def deliver(self, session_id: str, payload: bytes) -> str:
+        if self.is_local(session_id):
+            return await super().deliver(session_id, payload)
+        if not self.owner_of(session_id).isalnum():
+            return UNKNOWN_SESSION
+        reply = await self._peer(session_id).request(_OP_DELIVER, session_id, payload)
+        return _RESULTS.get(reply, UNKNOWN_SESSION)
+
+
+def create_router(socket_dir: str = "") -> LocalSessionRouter:
+    """socket_dir が指定されていればワーカー間ルーター、なければプロセス内ルーター"""
+    if socket_dir:
+        return UnixSocketSessionRouter(socket_dir)
+    return LocalSessionRouter()
@@ -0,0 +1,70 @@
+"""
+シングルフライト
+同じキーの処理が実行中なら、新しく実行せずにその結果を待つ
+
+    flight = SingleFlight()
+    result = await flight.do(key, lambda: run_tool(name, arguments))
+
+同時に届いた同一のツール呼び出しは1回だけ実行され、全員が同じ結果
+（または例外）を受け取ります。待っている呼び出し元の一部がキャンセルされても
+実行は続き、全員がいなくなった場合だけ実行をキャンセルします。
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class _Flight:
+    """実行中の処理1つ分"""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """キーごとに実行中の処理を共有する"""
+
+    def __init__(self):
+        self.flights: Dict[Hashable, _Flight] = {}
+        # 実際に実行した回数と、相乗りして実行を省いた回数
+        self.executions = 0
+        self.coalesced = 0
+        # 名前（キーの先頭要素）ごとの相乗り回数
+        self.coalesced_by_name: Dict[str, int] = {}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """key の処理が実行中ならその結果を待ち、なければ func を実行する"""
+        flight = self.flights.get(key)
+        if flight is None:
+            task = asyncio.ensure_future(func())
+            flight = self.flights[key] = _Flight(task)
+            task.add_done_callback(lambda _: self._finish(key, flight))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+            name = str(key[0]) if isinstance(key, tuple) else str(key)
+            self.coalesced_by_name[name] = self.coalesced_by_name.get(name, 0) + 1
+
+        flight.waiters += 1
+        try:
+            # 呼び出し元がキャンセルされても共有の実行は止めない
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    def _finish(self, key: Hashable, flight: _Flight) -> None:
+        if self.flights.get(key) is flight:
+            del self.flights[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """/health 用の統計"""
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": len(self.flights),
+            "tools": self.coalesced_by_name,
+        }
@@ -0,0 +1,236 @@
+"""
+SSEストリーム
+セッションのキューからエンコード済みのSSEフレームを送り出すASGIレスポンスと、
+全セッション共通のキープアライブスケジューラ
+
+- SSEStreamResponse: キューのフレームをそのまま（encoding を指定した場合は
+  書き込みごとに圧縮・フラッシュして）書き込み、切断は ASGI の
+  receive チャネル（http.disconnect）で検知する。stop() でサーバー側から終了する。
+  キューに溜まっているフレームはまとめて1回で書き込む
+- KeepaliveScheduler: 1つのタイマーホイールで、一定時間何も送っていない
+  セッションにだけ ping を送る
+"""
+import asyncio
+import math
+from typing import Any, Callable, List, Optional
+
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from stream_compression import StreamCompressor
+
+
+def encode_event(event: str, data: bytes, event_id: Optional[int] = None) -> bytes:
+    """
+    SSEフレームをエンコード
+
+    data はコンパクトなJSON（改行を含まない）であることを前提に、1行の data として書き込みます。
+    event_id を渡すと id 行を付けます（再接続時に Last-Event-ID として返ってくる）。
+    """
+    head = b"event: " + event.encode("ascii")
+    if event_id is not None:
+        head = b"id: " + str(event_id).encode("ascii") + b"\r\n" + head
+    return head + b"\r\ndata: " + data + b"\r\n\r\n"
+
+
+# 事前にエンコードした ping フレーム（セッションをまたいで共有）
+PING_FRAME = encode_event("ping", b"{}")
+
+
+class SSEStreamResponse(Response):
+    """
+    キューに入ったSSEフレームを送信し続けるレスポンス
+
+    クライアントの切断はポーリングせず、receive チャネルに届く
+    http.disconnect で検知して送信を止めます。
+    サーバー側から終了するときは stop() を呼びます（キューは閉じないので、
+    同じキューを次のストリームに引き継げます）。
+
+    encoding（"gzip" など）を指定すると Content-Encoding を付けて圧縮します。
+    書き込みごとに圧縮器を同期フラッシュするため、遅れて届くことはありません。
+    on_sent には圧縮前のフレームが1つずつ渡されます。
+
+    書き込みの合体: キューから取り出したときに次のフレームも溜まっていれば、
+    batch_bytes に達するまでまとめて取り出し、1回の send（と1回のフラッシュ）で書き込みます。
+    溜まっていたのは続けて届いている最中（バースト）なので、batch_delay 秒まで
+    続きを待ってから書き込みます。キューが空だった1件だけのフレームは待たずにすぐ送ります。
+    batch_bytes が0なら合体しません。on_write には1回の書き込みのフレーム数が渡されます。
+    """
+
+    media_type = "text/event-stream"
+
+    def __init__(
+        self,
+        frames: asyncio.Queue,
+        initial: bytes = b"",
+        on_sent: Optional[Callable[[bytes], None]] = None,
+        on_close: Optional[Callable[[], None]] = None,
+        encoding: Optional[str] = None,
+        batch_bytes: int = 0,
+        batch_delay: float = 0.0,
+        on_write: Optional[Callable[[int], None]] = None,
+    ):
+        self.frames = frames
+        self.initial = initial
+        self.on_sent = on_sent
+        self.on_close = on_close
+        self.batch_bytes = batch_bytes
+        self.batch_delay = batch_delay
+        self.on_write = on_write
+        self.stopped = asyncio.Event()
+        self.started = False
+        # __call__ を抜けたら立つ（同じキューを次のストリームに引き継ぐときに待つ）
+        self.finished = asyncio.Event()
+        self.status_code = 200
+        self.background = None
+        headers = {
+            "Cache-Control": "no-store",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+        }
+        self.compressor: Optional[StreamCompressor] = None
+        if encoding is not None:
+            self.compressor = StreamCompressor(encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Vary"] = "Accept-Encoding"
+        self.init_headers(headers)
+
+    def _encode(self, data: bytes) -> bytes:
+        if self.compressor is None:
+            return data
+        return self.compressor.compress(data)
+
+    async def _next_batch(self) -> List[bytes]:
+        """次に書き込むフレーム（溜まっていれば batch_bytes までまとめる）"""
+        frames = self.frames
+        batch = [await frames.get()]
+        if self.batch_bytes <= 0 or frames.empty():
+            return batch
+        if self.batch_delay > 0:
+            # バーストの最中なので、続きのフレームが揃うのを少しだけ待つ
+            await asyncio.sleep(self.batch_delay)
+        size = len(batch[0])
+        while size < self.batch_bytes and not frames.empty():
+            frame = frames.get_nowait()
+            batch.append(frame)
+            size += len(frame)
+        return batch
+
+    async def _send_frames(self, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        self.started = True
+        if self.initial:
+            await send({"type": "http.response.body", "body": self._encode(self.initial), "more_body": True})
+        while True:
+            batch = await self._next_batch()
+            body = batch[0] if len(batch) == 1 else b"".join(batch)
+            await send({"type": "http.response.body", "body": self._encode(body), "more_body": True})
+            if self.on_write is not None:
+                self.on_write(len(batch))
+            if self.on_sent is not None:
+                for frame in batch:
+                    self.on_sent(frame)
+
+    def stop(self) -> None:
+        """サーバー側からストリームを終了する"""
+        self.stopped.set()
+
+    @staticmethod
+    async def _wait_for_disconnect(receive: Receive) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        sender = asyncio.ensure_future(self._send_frames(send))
+        listener = asyncio.ensure_future(self._wait_for_disconnect(receive))
+        stopper = asyncio.ensure_future(self.stopped.wait())
+        tasks = (sender, listener, stopper)
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            disconnected = listener.done()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if self.started and self.stopped.is_set() and not disconnected:
+                # サーバー側から閉じる場合はレスポンスを正しく終端する
+                tail = self.compressor.finish() if self.compressor is not None else b""
+                try:
+                    await send({"type": "http.response.body", "body": tail, "more_body": False})
+                except OSError:
+                    pass
+            self.finished.set()
+            if self.on_close is not None:
+                self.on_close()
+
+
+class KeepaliveScheduler:
+    """
+    全セッション共通のキープアライブスケジューラ（タイマーホイール）
+
+    セッションごとにタイマーを持つ代わりに、interval を数個のスロットに分けた
+    ホイールを1つのタスクで回します。スロットが来たセッションのうち、
+    最後の送信から interval 以上経過しているものにだけ on_idle（ping の送信など）を呼び、
+    それ以外は最後の送信時刻を基準に次のスロットへ入れ直します。
+
+    対象オブジェクトは last_sent（loop.time() 基準）と closed 属性を持つ必要があります。
+    """
+
+    def __init__(self, interval: float, on_idle: Callable[[Any], None], slots: int = 8):
+        self.interval = interval
+        self.tick = interval / slots
+        self.on_idle = on_idle
+        self.wheel: List[list] = [[] for _ in range(slots + 1)]
+        self.position = 0
+        self.task: Optional[asyncio.Task] = None
+
+    def add(self, target: Any) -> None:
+        """対象を登録（最後の送信から interval 後に確認する）"""
+        self._schedule(target, target.last_sent + self.interval)
+
+    def _schedule(self, target: Any, due: float) -> None:
+        now = asyncio.get_running_loop().time()
+        ticks = max(1, math.ceil((due - now) / self.tick))
+        ticks = min(ticks, len(self.wheel) - 1)
+        self.wheel[(self.position + ticks) % len(self.wheel)].append(target)
+
+    def _advance(self) -> None:
+        """ホイールを1スロット進め、期限の来た対象を処理する"""
+        self.position = (self.position + 1) % len(self.wheel)
+        due, self.wheel[self.position] = self.wheel[self.position], []
+        now = asyncio.get_running_loop().time()
+        # スロットの境界でわずかに早く起きても送れるよう、半tick分の余裕を持たせる
+        threshold = self.interval - self.tick / 2
+        for target in due:
+            if target.closed:
+                continue
+            if now - target.last_sent >= threshold:
+                self.on_idle(target)
+                if not target.closed:
+                    self._schedule(target, now + self.interval)
+            else:
+                self._schedule(target, target.last_sent + self.interval)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time() + self.tick
+        while True:
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            next_tick += self.tick
+            self._advance()
+
+    def start(self) -> None:
+        """スケジューラを起動"""
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """スケジューラを停止"""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
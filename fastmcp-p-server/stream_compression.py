@@ -0,0 +1,108 @@
+"""
+ストリーム圧縮
+SSEストリームと JSON レスポンスの Content-Encoding（zstd / gzip / deflate）
+
+zstd は zstandard がインストールされている場合だけ使います（pip install zstandard）。
+クライアントの Accept-Encoding とサーバーで有効にした方式から、
+サーバー側の優先順（zstd → gzip → deflate）で選びます。
+
+    encoding = negotiate(request.headers.get("accept-encoding", ""), ("gzip", "deflate"))
+    compressor = StreamCompressor(encoding)
+    chunk = compressor.compress(frame)   # frame までを復元できるところまで出力する
+    tail = compressor.finish()           # ストリームの終端
+
+SSEのフレームは compress() のたびに同期フラッシュするので、
+圧縮器の中にイベントが溜まって届くのが遅れることはありません。
+"""
+import gzip
+import zlib
+from typing import Dict, Iterable, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# サーバー側の優先順
+ENCODINGS = ("zstd", "gzip", "deflate") if zstandard is not None else ("gzip", "deflate")
+
+# ストリームでは書き込みごとにフラッシュするため、速さを優先したレベルにする
+# （gzip/deflate は 1。JSONのフレームでは 6 と比べて圧縮率はほぼ同じで、大きなフレームの圧縮は約2倍速い）
+GZIP_LEVEL = 1
+ZSTD_LEVEL = 3
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """Accept-Encoding を {方式: q値} に変換（"*" もそのまま残す）"""
+    accepted = {}
+    for item in header.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[name] = q
+    return accepted
+
+
+def negotiate(header: str, enabled: Iterable[str] = ENCODINGS) -> Optional[str]:
+    """使う方式を選ぶ（圧縮しない場合は None）"""
+    if not header:
+        return None
+    accepted = parse_accept_encoding(header)
+    enabled = set(enabled)
+    for encoding in ENCODINGS:
+        if encoding in enabled and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def compress_body(data: bytes, encoding: str) -> bytes:
+    """レスポンスボディ全体を圧縮"""
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    if encoding == "gzip":
+        return gzip.compress(data, GZIP_LEVEL, mtime=0)
+    if encoding == "deflate":
+        return zlib.compress(data, GZIP_LEVEL)
+    raise ValueError(f"Unknown encoding: {encoding}")
+
+
+class StreamCompressor:
+    """1本のストリームを圧縮する（フレームごとに同期フラッシュする）"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+            self._flush_mode = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        elif encoding in ("gzip", "deflate"):
+            # wbits: 31 は gzip 形式、15 は zlib 形式（HTTP の deflate）
+            wbits = 31 if encoding == "gzip" else 15
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, wbits)
+            self._flush_mode = zlib.Z_SYNC_FLUSH
+        else:
+            raise ValueError(f"Unknown encoding: {encoding}")
+        # 圧縮前と圧縮後のバイト数
+        self.raw_bytes = 0
+        self.wire_bytes = 0
+
+    def compress(self, data: bytes) -> bytes:
+        """data を圧縮し、受け手が data の末尾まで復元できるところまで出力する"""
+        chunk = self._compressor.compress(data) + self._compressor.flush(self._flush_mode)
+        self.raw_bytes += len(data)
+        self.wire_bytes += len(chunk)
+        return chunk
+
+    def finish(self) -> bytes:
+        """ストリームの終端（これ以降は compress() できない）"""
+        chunk = self._compressor.flush()
+        self.wire_bytes += len(chunk)
+        return chunk
@@ -0,0 +1,114 @@
+"""
+テスト用のサーバーとクライアント
+
+サーバーはテストと同じイベントループの uvicorn で起動します
+（httpx の ASGITransport はレスポンスを最後まで溜めてから返すため、
+終わらないSSEストリームには使えない）。設定は make_server の引数で上書きでき、
+テストが終わると元に戻ります。
+"""
+import asyncio
+from typing import Any, Optional
+
+import pytest_asyncio
+import uvicorn
+
+import server_http_sse
+from tests.mcp_client import SSEClient, WSClient
+
+# テストでの既定の設定
+# - 切断と同時にセッションを閉じる（テストの間でセッションを残さない）
+# - プロセスプールを起動しない（process のツールはスレッドで実行される）
+TEST_CONFIG = {
+    "session_resume_timeout": 0.0,
+    "tool_process_workers": 0,
+}
+
+
+class InProcessServer:
+    """空いているポートでサーバーを起動する"""
+
+    def __init__(self):
+        self.server: Optional[uvicorn.Server] = None
+        self.task: Optional[asyncio.Task] = None
+        self.base_url = ""
+
+    async def start(self) -> None:
+        config = uvicorn.Config(
+            server_http_sse.app,
+            host="127.0.0.1",
+            port=0,
+            log_level="warning",
+            timeout_graceful_shutdown=1,
+        )
+        self.server = uvicorn.Server(config)
+        self.task = asyncio.create_task(self.server.serve())
+        while not self.server.started:
+            if self.task.done():
+                self.task.result()
+            await asyncio.sleep(0.01)
+        port = self.server.servers[0].sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+
+    async def stop(self) -> None:
+        self.server.should_exit = True
+        await self.task
+        # 切断を待たずに残ったセッションを閉じる
+        for session in list(server_http_sse.active_connections.values()):
+            session.close()
+        server_http_sse.remote_sessions.clear()
+
+
+@pytest_asyncio.fixture
+async def make_server(monkeypatch):
+    """設定を上書きしてサーバーを起動する関数（ベースURLを返す）"""
+    servers = []
+
+    async def start(**overrides: Any) -> str:
+        for name, value in {**TEST_CONFIG, **overrides}.items():
+            monkeypatch.setattr(server_http_sse.config, name, value)
+        server = InProcessServer()
+        await server.start()
+        servers.append(server)
+        return server.base_url
+
+    yield start
+    for server in servers:
+        await server.stop()
+
+
+@pytest_asyncio.fixture
+async def server(make_server):
+    """既定の設定で起動したサーバーのベースURL"""
+    return await make_server()
+
+
+@pytest_asyncio.fixture
+async def open_sse():
+    """SSEセッションを開く関数（テストの終わりに閉じる）"""
+    clients = []
+
+    async def open(base_url: str) -> SSEClient:
+        client = SSEClient(base_url)
+        clients.append(client)
+        await client.connect()
+        return client
+
+    yield open
+    for client in clients:
+        await client.close()
+
+
+@pytest_asyncio.fixture
+async def open_ws():
+    """/ws の接続を開く関数（テストの終わりに閉じる）"""
+    clients = []
+
+    async def open(base_url: str) -> WSClient:
+        client = WSClient(base_url)
+        await client.connect()
+        clients.append(client)
+        return client
+
+    yield open
+    for client in clients:
+        await client.close()
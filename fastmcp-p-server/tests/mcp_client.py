@@ -0,0 +1,98 @@
+"""
+テスト用のMCPクライアント（SSE + POST /messages と /ws）
+"""
+import asyncio
+import json
+from typing import Any, Dict, List, Optional
+
+import httpx
+import websockets
+from httpx_sse import aconnect_sse
+
+
+class SSEClient:
+    """GET /sse のストリームを読みながら POST /messages でリクエストを送るクライアント"""
+
+    def __init__(self, base_url: str):
+        self.http = httpx.AsyncClient(base_url=base_url, timeout=10.0)
+        self.session_id: Optional[str] = None
+        self.messages: asyncio.Queue = asyncio.Queue()
+        self.connected = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    async def _listen(self) -> None:
+        async with aconnect_sse(self.http, "GET", "/sse") as source:
+            async for event in source.aiter_sse():
+                if event.event == "connected":
+                    self.session_id = json.loads(event.data)["session_id"]
+                    self.connected.set()
+                elif event.event == "message":
+                    self.messages.put_nowait(json.loads(event.data))
+
+    async def connect(self) -> None:
+        self.task = asyncio.create_task(self._listen())
+        await asyncio.wait_for(self.connected.wait(), 5.0)
+
+    async def post(self, message: Any) -> httpx.Response:
+        """POST /messages（受信確認のレスポンスを返す）"""
+        return await self.http.post(
+            "/messages", json=message, headers={"X-Session-Id": self.session_id}
+        )
+
+    async def receive(self, timeout: float = 5.0) -> Any:
+        """SSEストリームで次のメッセージを受け取る"""
+        return await asyncio.wait_for(self.messages.get(), timeout)
+
+    async def collect(self, duration: float) -> List[Any]:
+        """duration 秒のあいだに届いたメッセージ"""
+        return await collect(self.receive, duration)
+
+    async def close(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+        await self.http.aclose()
+
+
+class WSClient:
+    """/ws の接続1本"""
+
+    def __init__(self, base_url: str):
+        self.url = base_url.replace("http://", "ws://") + "/ws"
+        self.connection = None
+
+    async def connect(self) -> None:
+        self.connection = await websockets.connect(self.url, subprotocols=["mcp"])
+
+    async def send(self, message: Any) -> None:
+        await self.connection.send(json.dumps(message))
+
+    async def receive(self, timeout: float = 5.0) -> Any:
+        return json.loads(await asyncio.wait_for(self.connection.recv(), timeout))
+
+    async def collect(self, duration: float) -> List[Any]:
+        """duration 秒のあいだに届いたメッセージ"""
+        return await collect(self.receive, duration)
+
+    async def close(self) -> None:
+        await self.connection.close()
+
+
+async def collect(receive, duration: float) -> List[Any]:
+    loop = asyncio.get_running_loop()
+    until = loop.time() + duration
+    messages = []
+    while (remaining := until - loop.time()) > 0:
+        try:
+            messages.append(await receive(timeout=remaining))
+        except asyncio.TimeoutError:
+            break
+    return messages
+
+
+def tool_call(request_id: Any, name: str, arguments: Dict[str, Any], **meta: Any) -> Dict[str, Any]:
+    """tools/call のリクエスト（meta は _meta に入る。progressToken など）"""
+    params: Dict[str, Any] = {"name": name, "arguments": arguments}
+    if meta:
+        params["_meta"] = meta
+    return {"jsonrpc": "2.0", "id": request_id, "method": "tools/call", "params": params}
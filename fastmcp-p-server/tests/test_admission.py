@@ -0,0 +1,116 @@
+"""
+レート制限と同時処理数の上限のテスト（POST /messages と /ws）
+"""
+import asyncio
+import time
+
+import pytest
+
+import server_http_sse
+from tests.mcp_client import tool_call
+
+
+def started_calls(tool: str) -> int:
+    """実行枠を取得した（実行プールに渡された）呼び出しの数"""
+    row = server_http_sse.TOOL_QUEUE_TIME.values.get((tool,))
+    return sum(row[:-1]) if row else 0
+
+
+@pytest.mark.asyncio
+async def test_post_session_queue_full(make_server, open_sse):
+    """同時処理数の空きを待てる数を超えたPOSTは待たせずに 429 で断る"""
+    base_url = await make_server(session_max_inflight=1, session_max_queued=1)
+    client = await open_sse(base_url)
+
+    started = time.monotonic()
+    first = await client.post(tool_call(1, "wait", {"seconds": 0.5}))
+    second = await client.post(tool_call(2, "wait", {"seconds": 0.1}))
+    third = await client.post(tool_call(3, "wait", {"seconds": 0.1}))
+    # 受信確認も拒否も空きを待たない
+    assert time.monotonic() - started < 0.4
+    assert first.status_code == 200
+    assert second.status_code == 200
+    assert third.status_code == 429
+    assert "Retry-After" in third.headers
+    error = third.json()["error"]
+    assert third.json()["id"] == 3
+    assert error["data"]["reason"] == "session_queue_full"
+
+    ids = sorted([(await client.receive())["id"], (await client.receive())["id"]])
+    assert ids == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_ws_session_queue_full(make_server, open_ws):
+    base_url = await make_server(session_max_inflight=1, session_max_queued=1)
+    client = await open_ws(base_url)
+    for request_id in (1, 2, 3):
+        await client.send(tool_call(request_id, "wait", {"seconds": 0.3}))
+
+    rejected = await client.receive()
+    assert rejected["id"] == 3
+    assert rejected["error"]["data"]["reason"] == "session_queue_full"
+    ids = sorted([(await client.receive())["id"], (await client.receive())["id"]])
+    assert ids == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_cancel_is_not_rate_limited(make_server, open_sse):
+    """レート制限を超えたクライアントでも notifications/cancelled で自分の処理を止められる"""
+    base_url = await make_server(session_rate_limit=1.0, session_rate_burst=1.0)
+    client = await open_sse(base_url)
+
+    assert (await client.post(tool_call(1, "wait", {"seconds": 0.5}))).status_code == 200
+    assert (await client.post({"jsonrpc": "2.0", "id": 2, "method": "ping"})).status_code == 429
+    response = await client.post({
+        "jsonrpc": "2.0",
+        "method": "notifications/cancelled",
+        "params": {"requestId": 1},
+    })
+    assert response.status_code == 200
+    assert await client.collect(1.0) == []
+
+
+@pytest.mark.asyncio
+async def test_closed_session_does_not_run_queued_calls(make_server, open_sse):
+    """空きを待っているあいだにセッションが閉じられた呼び出しは実行しない"""
+    base_url = await make_server(session_max_inflight=1)
+    client = await open_sse(base_url)
+    before = started_calls("wait")
+    await client.post(tool_call(1, "wait", {"seconds": 0.3}))
+    await client.post(tool_call(2, "wait", {"seconds": 0.1}))
+    await asyncio.sleep(0.1)
+
+    session = server_http_sse.active_connections[client.session_id]
+    session.close()
+    await asyncio.sleep(0.5)
+    assert started_calls("wait") - before == 1
+
+
+@pytest.mark.asyncio
+async def test_invalid_tool_name_does_not_leak_slots(make_server, open_sse):
+    """文字列でない・未登録のツール名は実行枠を使わずにエラーを返し、後の呼び出しを止めない"""
+    base_url = await make_server(tool_max_concurrency=2)
+    client = await open_sse(base_url)
+    for request_id, name in enumerate((["x"], {"a": 1}, "missing"), start=1):
+        await client.post(tool_call(request_id, name, {}))
+        message = await client.receive()
+        assert message["result"]["isError"] is True
+        assert "Unknown tool" in message["result"]["content"][0]["text"]
+
+    await client.post(tool_call(10, "add", {"a": 1, "b": 2}))
+    message = await client.receive(timeout=2.0)
+    assert message["id"] == 10 and "isError" not in message["result"]
+    assert server_http_sse.tool_executor.scheduler.active == 0
+
+
+@pytest.mark.asyncio
+async def test_executor_releases_slot_on_submit_error(make_server):
+    """実行プールに渡す前に失敗しても実行枠は返る"""
+    await make_server(tool_max_concurrency=2)
+    executor = server_http_sse.tool_executor
+    for _ in range(3):
+        with pytest.raises(TypeError):
+            # 枠が漏れていれば3回目は枠を待ち続ける
+            await asyncio.wait_for(executor.run(["x"], {}), 2.0)
+    assert executor.scheduler.active == 0
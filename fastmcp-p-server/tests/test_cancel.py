@@ -0,0 +1,34 @@
+"""
+notifications/cancelled のテスト
+"""
+import pytest
+
+from tests.mcp_client import tool_call
+
+
+def cancel(request_id) -> dict:
+    return {"jsonrpc": "2.0", "method": "notifications/cancelled", "params": {"requestId": request_id}}
+
+
+@pytest.mark.asyncio
+async def test_cancel_running_call(server, open_ws):
+    client = await open_ws(server)
+    await client.send(tool_call(1, "wait", {"seconds": 0.5}))
+    await client.send({"jsonrpc": "2.0", "id": 2, "method": "ping"})
+    assert (await client.receive())["id"] == 2
+    await client.send(cancel(1))
+    assert await client.collect(1.0) == []
+
+
+@pytest.mark.asyncio
+async def test_cancel_right_after_submit(make_server, open_ws):
+    """送った直後に取り消したリクエストには、処理が間に合ってもレスポンスを返さない"""
+    base_url = await make_server(session_max_queued=1000, session_rate_burst=1000.0)
+    client = await open_ws(base_url)
+    for request_id in range(1, 201):
+        await client.send(tool_call(request_id, "add", {"a": request_id, "b": 1}))
+        await client.send(cancel(request_id))
+    await client.send({"jsonrpc": "2.0", "id": "last", "method": "ping"})
+
+    messages = await client.collect(1.0)
+    assert [m["id"] for m in messages] == ["last"]
@@ -0,0 +1,123 @@
+"""
+POST /messages + SSE のテスト
+"""
+import time
+
+import pytest
+
+import server_http_sse
+from tests.mcp_client import tool_call
+from tool_registry import ToolSpec
+
+
+@pytest.mark.asyncio
+async def test_tools_list(server, open_sse):
+    client = await open_sse(server)
+    response = await client.post({"jsonrpc": "2.0", "id": 1, "method": "tools/list"})
+    assert response.status_code == 200
+    assert response.json()["status"] == "queued"
+
+    message = await client.receive()
+    assert message["id"] == 1
+    names = [tool["name"] for tool in message["result"]["tools"]]
+    assert "add" in names and "wait" in names
+
+
+@pytest.mark.asyncio
+async def test_responses_out_of_order(server, open_sse):
+    """遅い呼び出しの後ろに並んだ速い呼び出しが先に返る"""
+    client = await open_sse(server)
+    started = time.monotonic()
+    await client.post(tool_call(1, "wait", {"seconds": 0.5}))
+    await client.post(tool_call(2, "add", {"a": 1, "b": 2}))
+    # 受信確認は処理の完了を待たない
+    assert time.monotonic() - started < 0.4
+
+    first = await client.receive()
+    second = await client.receive()
+    assert [first["id"], second["id"]] == [2, 1]
+    assert "3" in first["result"]["content"][0]["text"]
+
+
+@pytest.mark.asyncio
+async def test_unknown_session(server, open_sse):
+    client = await open_sse(server)
+    client.session_id = "local.unknown"
+    response = await client.post({"jsonrpc": "2.0", "id": 1, "method": "ping"})
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_batch(server, open_sse):
+    client = await open_sse(server)
+    await client.post([
+        {"jsonrpc": "2.0", "id": 1, "method": "ping"},
+        {"jsonrpc": "2.0", "method": "notifications/initialized"},
+        tool_call(2, "add", {"a": 2, "b": 3}),
+    ])
+    message = await client.receive()
+    assert isinstance(message, list)
+    assert sorted(m["id"] for m in message) == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_empty_batch(server, open_sse):
+    """空のバッチには配列ではなく Invalid Request のエラーを1つ返す（JSON-RPC 2.0 §6）"""
+    client = await open_sse(server)
+    await client.post([])
+    message = await client.receive()
+    assert message == {
+        "jsonrpc": "2.0",
+        "id": None,
+        "error": {"code": -32600, "message": "Invalid Request"},
+    }
+
+
+@pytest.mark.asyncio
+async def test_malformed_json(server, open_sse):
+    """壊れたJSONはサーバーエラーではなく 400 の Parse error"""
+    client = await open_sse(server)
+    response = await client.http.post(
+        "/messages",
+        content=b'{"jsonrpc": "2.0", "id": 1,',
+        headers={"X-Session-Id": client.session_id, "Content-Type": "application/json"}
+    )
+    assert response.status_code == 400
+    assert response.json()["error"]["code"] == -32700
+
+
+@pytest.mark.asyncio
+async def test_streaming_progress(server, open_sse):
+    """途中経過の progress はツールの単位で単調に増え、チャンクのテキストは result にだけ入る"""
+    client = await open_sse(server)
+    await client.post(tool_call(1, "generate_lines", {"lines": 50, "chunk_lines": 10}, progressToken="p"))
+
+    progress = []
+    while True:
+        message = await client.receive()
+        if message.get("method") != "notifications/progress":
+            break
+        assert message["params"]["progressToken"] == "p"
+        assert "message" not in message["params"]
+        progress.append((message["params"]["progress"], message["params"].get("total")))
+
+    assert progress == [(10, 50), (20, 50), (30, 50), (40, 50), (50, 50)]
+    text = message["result"]["content"][0]["text"]
+    assert text.count("\n") == 50 and text.startswith("1行目")
+
+
+@pytest.mark.asyncio
+async def test_streaming_progress_in_chars(server, open_sse, monkeypatch):
+    """Progress を yield しないツールでは、progress はそこまでの文字数"""
+    def spell(arguments):
+        yield "ab"
+        yield ""
+        yield "cde"
+
+    monkeypatch.setitem(server_http_sse.tools.tools, "spell", ToolSpec("spell", "", spell))
+    client = await open_sse(server)
+    await client.post(tool_call(1, "spell", {}, progressToken=7))
+
+    messages = [await client.receive() for _ in range(3)]
+    assert [m["params"]["progress"] for m in messages[:2]] == [2, 5]
+    assert messages[2]["result"]["content"][0]["text"] == "abcde"
@@ -0,0 +1,108 @@
+"""
+ワーカー間のセッションルーティングのテスト
+
+テストのプロセスにもう1つルーター（別のワーカーの代わり）を起動し、
+そのワーカーが持つセッションへ POST /messages を送る。
+"""
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import server_http_sse
+from session_router import UnixSocketSessionRouter
+
+
+@pytest.fixture
+def peer_router(tmp_path, monkeypatch):
+    """テスト対象のサーバーをワーカー a、もう1つのルーターをワーカー b とする"""
+    monkeypatch.setattr(server_http_sse, "router", UnixSocketSessionRouter(str(tmp_path), "a"))
+    return UnixSocketSessionRouter(str(tmp_path), "b")
+
+
+@pytest.mark.asyncio
+async def test_closed_remote_session(make_server, peer_router):
+    """持ち主のワーカーで閉じられたセッションへのPOSTは 400 になり、窓口も残らない"""
+    base_url = await make_server()
+    await peer_router.start()
+    delivered = asyncio.Queue()
+
+    async def deliver(payload: bytes) -> bool:
+        delivered.put_nowait(json.loads(payload))
+        return True
+
+    session_id = "b.session"
+    peer_router.register(session_id, deliver)
+    try:
+        async with httpx.AsyncClient(base_url=base_url) as client:
+            headers = {"X-Session-Id": session_id}
+            response = await client.post("/messages", json={"jsonrpc": "2.0", "id": 1, "method": "ping"}, headers=headers)
+            assert response.status_code == 200
+            assert (await asyncio.wait_for(delivered.get(), 5.0))["id"] == 1
+            assert session_id in server_http_sse.remote_sessions
+
+            peer_router.unregister(session_id)
+            response = await client.post("/messages", json={"jsonrpc": "2.0", "id": 2, "method": "ping"}, headers=headers)
+            assert response.status_code == 400
+            assert session_id not in server_http_sse.remote_sessions
+    finally:
+        await peer_router.stop()
+
+
+@pytest.mark.asyncio
+async def test_idle_remote_session_expires(make_server, peer_router):
+    """リクエストが途絶えた窓口はキープアライブの間隔で捨てられる"""
+    base_url = await make_server(keepalive_interval=0.2)
+    await peer_router.start()
+
+    async def deliver(payload: bytes) -> bool:
+        return True
+
+    peer_router.register("b.session", deliver)
+    try:
+        async with httpx.AsyncClient(base_url=base_url) as client:
+            response = await client.post(
+                "/messages",
+                json={"jsonrpc": "2.0", "id": 1, "method": "ping"},
+                headers={"X-Session-Id": "b.session"}
+            )
+            assert response.status_code == 200
+            assert "b.session" in server_http_sse.remote_sessions
+            await asyncio.sleep(0.6)
+            assert "b.session" not in server_http_sse.remote_sessions
+    finally:
+        await peer_router.stop()
+
+
+@pytest.mark.asyncio
+async def test_full_owner_queue_is_retried(make_server, peer_router):
+    """持ち主のワーカーで送信キューがいっぱいでも窓口は閉じず、空いてから届ける"""
+    base_url = await make_server()
+    await peer_router.start()
+    delivered = asyncio.Queue()
+    refused = 0
+
+    async def deliver(payload: bytes) -> bool:
+        nonlocal refused
+        if refused < 3:
+            # block=False で登録されたセッションの送信キューがいっぱい
+            refused += 1
+            return False
+        delivered.put_nowait(json.loads(payload))
+        return True
+
+    peer_router.register("b.session", deliver)
+    try:
+        async with httpx.AsyncClient(base_url=base_url) as client:
+            response = await client.post(
+                "/messages",
+                json={"jsonrpc": "2.0", "id": 1, "method": "ping"},
+                headers={"X-Session-Id": "b.session"}
+            )
+            assert response.status_code == 200
+            assert (await asyncio.wait_for(delivered.get(), 5.0))["id"] == 1
+            assert refused == 3
+            assert "b.session" in server_http_sse.remote_sessions
+    finally:
+        await peer_router.stop()
@@ -0,0 +1,21 @@
+"""
+Session の送信キューのテスト
+"""
+import pytest
+
+import server_http_sse
+
+
+@pytest.mark.asyncio
+async def test_resume_drops_timings_of_discarded_frames(monkeypatch):
+    """再接続で送信キューを捨てたら、そのフレームのレイテンシの記録も捨てる"""
+    session = server_http_sse.Session("local.resume", 1)
+    monkeypatch.setitem(server_http_sse.active_connections, session.session_id, session)
+    for request_id in range(3):
+        assert await session.deliver(b'{"id":%d}' % request_id, timing=(0.0, ["ping"]))
+    assert len(session.timings) == 3
+
+    # イベントIDは1から。2 と 3 は再送のためにキューへ入れ直される
+    session.attach(None, last_event_id=1)
+    assert session.timings == {}
+    assert session.responses.qsize() == 2
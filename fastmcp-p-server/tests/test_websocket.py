@@ -0,0 +1,54 @@
+"""
+/ws のテスト
+"""
+import asyncio
+import logging
+
+import pytest
+
+import server_http_sse
+from tool_registry import ToolSpec
+
+
+@pytest.mark.asyncio
+async def test_ping(server, open_ws):
+    client = await open_ws(server)
+    await client.send({"jsonrpc": "2.0", "id": 1, "method": "ping"})
+    assert await client.receive() == {"jsonrpc": "2.0", "id": 1, "result": {}}
+
+
+@pytest.mark.asyncio
+async def test_close_is_logged_as_ws(server, open_ws, caplog):
+    """WebSocket のセッションのログには [SSE] ではなく [WS] が付く"""
+    caplog.set_level(logging.INFO)
+    client = await open_ws(server)
+    await client.close()
+    for _ in range(50):
+        if any("Connection closed" in r.getMessage() for r in caplog.records):
+            break
+        await asyncio.sleep(0.02)
+
+    closed = [r.getMessage() for r in caplog.records if "Connection closed" in r.getMessage()]
+    assert closed and all("[WS]" in message and "[SSE]" not in message for message in closed)
+
+
+@pytest.mark.asyncio
+async def test_tools_list_changed(server, open_ws):
+    """ツールを登録・削除すると tools/list が変わり、notifications/tools/list_changed が1回ずつ届く"""
+    client = await open_ws(server)
+    await client.send({"jsonrpc": "2.0", "id": 1, "method": "ping"})
+    await client.receive()
+
+    tools = server_http_sse.tools
+    tools.register(ToolSpec("echo", "", lambda arguments: "echo"))
+    try:
+        tools.unregister("echo")
+        tools.register(ToolSpec("echo", "", lambda arguments: "echo"))
+        assert await client.receive() == {"jsonrpc": "2.0", "method": "notifications/tools/list_changed"}
+        await client.send({"jsonrpc": "2.0", "id": 2, "method": "tools/list"})
+        names = [tool["name"] for tool in (await client.receive())["result"]["tools"]]
+        assert "echo" in names
+    finally:
+        tools.unregister("echo")
+    assert await client.receive() == {"jsonrpc": "2.0", "method": "notifications/tools/list_changed"}
+    assert await client.collect(0.2) == []
@@ -0,0 +1,196 @@
+"""
+ツールレジストリ
+ツールのスキーマと実装を1か所で宣言し、名前から O(1) で呼び出す
+
+    tools = ToolRegistry()
+
+    @tools.tool(
+        "add",
+        "2つの数値を足し算します",
+        properties={"a": {"type": "number"}, "b": {"type": "number"}},
+        required=["a", "b"],
+    )
+    def tool_add(arguments):
+        return f"計算結果: {arguments['a'] + arguments['b']}"
+
+    tools.execute("add", {"a": 1, "b": 2})
+    tools.list_tools()  # tools/list の "tools" にそのまま使える
+
+登録順は tools/list の並び順になります。
+add_listener で登録した関数は、ツールの登録・削除のたびに呼ばれます
+（サーバーはこれでツール一覧を作り直し、notifications/tools/list_changed を送る）。
+
+ツール本体をジェネレーター関数にすると、結果のテキストを少しずつ yield できます
+（Progress を yield すると進捗だけを伝えられる）。クライアントが progressToken を
+付けて呼び出した場合、サーバーは途中経過を notifications/progress で送ります
+（Progress を yield するツールはその値、しないツールはそこまでの文字数）。
+
+    @tools.tool("report", "レポートを生成します")
+    def tool_report(arguments):
+        for i, section in enumerate(SECTIONS):
+            yield Progress(i, total=len(SECTIONS), message=f"{section} を生成中")
+            yield render(section)
+"""
+import inspect
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+
+# ツール本体: arguments を受け取り、テキストの結果を返す（ジェネレーターならチャンクを yield する）
+ToolHandler = Callable[[Dict[str, Any]], Any]
+
+
+@dataclass
+class Progress:
+    """ジェネレーターのツールが yield する進捗（結果のテキストには含まれない）"""
+    progress: float
+    total: Optional[float] = None
+    message: Optional[str] = None
+
+
+# ジェネレーターのツールが yield するもの
+ToolChunk = Union[str, Progress]
+
+
+@dataclass
+class ToolSpec:
+    """ツール1つ分の宣言"""
+    name: str
+    description: str
+    handler: ToolHandler
+    properties: Dict[str, Any] = field(default_factory=dict)
+    required: List[str] = field(default_factory=list)
+    # 実行バックエンド（"thread" / "process"、None ならサーバーのデフォルト）
+    backend: Optional[str] = None
+    # 引数だけで結果が決まる（結果をキャッシュしてよい）ツールか
+    cache: bool = False
+    # 同じ引数で実行中の呼び出しに相乗りしてよいツールか（cache=True なら常に可）
+    coalesce: bool = False
+    # 実行の期限（秒、リクエストの受信から数える。None ならサーバーのデフォルト）
+    timeout: Optional[float] = None
+
+    @property
+    def stream(self) -> bool:
+        """結果を少しずつ yield するツールか"""
+        return inspect.isgeneratorfunction(self.handler)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """tools/list 用の定義"""
+        return {
+            "name": self.name,
+            "description": self.description,
+            "inputSchema": {
+                "type": "object",
+                "properties": self.properties,
+                "required": self.required
+            }
+        }
+
+
+class ToolRegistry:
+    """名前 → ToolSpec の辞書で管理するツールの登録先"""
+
+    def __init__(self):
+        self.tools: Dict[str, ToolSpec] = {}
+        # ツール構成が変わったときに呼ぶ関数
+        self.listeners: List[Callable[[], None]] = []
+
+    def add_listener(self, listener: Callable[[], None]) -> None:
+        """ツールの登録・削除のたびに呼ぶ関数を登録"""
+        self.listeners.append(listener)
+
+    def _changed(self) -> None:
+        for listener in self.listeners:
+            listener()
+
+    def register(self, spec: ToolSpec) -> ToolSpec:
+        """ツールを登録（同名のツールがあればエラー）"""
+        if spec.name in self.tools:
+            raise ValueError(f"Tool already registered: {spec.name}")
+        self.tools[spec.name] = spec
+        self._changed()
+        return spec
+
+    def unregister(self, name: str) -> bool:
+        """ツールの登録を解除（登録されていなければ False）"""
+        if self.tools.pop(name, None) is None:
+            return False
+        self._changed()
+        return True
+
+    def tool(
+        self,
+        name: str,
+        description: str,
+        properties: Optional[Dict[str, Any]] = None,
+        required: Optional[List[str]] = None,
+        backend: Optional[str] = None,
+        cache: bool = False,
+        coalesce: bool = False,
+        timeout: Optional[float] = None,
+    ) -> Callable[[ToolHandler], ToolHandler]:
+        """関数をツールとして登録するデコレーター"""
+        def decorator(handler: ToolHandler) -> ToolHandler:
+            self.register(ToolSpec(
+                name=name,
+                description=description,
+                handler=handler,
+                properties=properties or {},
+                required=required or [],
+                backend=backend,
+                cache=cache,
+                coalesce=coalesce,
+                timeout=timeout,
+            ))
+            return handler
+        return decorator
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.tools
+
+    def __len__(self) -> int:
+        return len(self.tools)
+
+    def execute(self, name: str, arguments: Dict[str, Any]) -> str:
+        """ツールを実行（ジェネレーターのツールはチャンクをつなげて返す）"""
+        spec = self.tools.get(name)
+        if spec is None:
+            raise ValueError(f"Unknown tool: {name}")
+        if spec.stream:
+            return "".join(chunk for chunk in spec.handler(arguments) if isinstance(chunk, str))
+        return spec.handler(arguments)
+
+    def iterate(self, name: str, arguments: Dict[str, Any]) -> Iterator[ToolChunk]:
+        """ツールを実行し、チャンクと進捗を順に返す（ジェネレーターでないツールは結果1つ）"""
+        spec = self.tools.get(name)
+        if spec is None:
+            raise ValueError(f"Unknown tool: {name}")
+        if spec.stream:
+            return spec.handler(arguments)
+        return iter((spec.handler(arguments),))
+
+    def streaming(self, name: str) -> bool:
+        """結果を少しずつ yield するツールか"""
+        spec = self.tools.get(name)
+        return spec is not None and spec.stream
+
+    def cacheable(self, name: str) -> bool:
+        """結果をキャッシュしてよいツールか"""
+        spec = self.tools.get(name)
+        return spec is not None and spec.cache
+
+    def coalescable(self, name: str) -> bool:
+        """同じ引数で実行中の呼び出しに相乗りしてよいツールか"""
+        spec = self.tools.get(name)
+        return spec is not None and (spec.coalesce or spec.cache)
+
+    def list_tools(self) -> List[Dict[str, Any]]:
+        """tools/list 用のツール定義一覧（登録順）"""
+        return [spec.to_dict() for spec in self.tools.values()]
+
+    def backends(self) -> Dict[str, str]:
+        """実行バックエンドが宣言されているツールの一覧"""
+        return {spec.name: spec.backend for spec in self.tools.values() if spec.backend}
+
+    def timeouts(self) -> Dict[str, float]:
+        """実行の期限が宣言されているツールの一覧"""
+        return {spec.name: spec.timeout for spec in self.tools.values() if spec.timeout is not None}
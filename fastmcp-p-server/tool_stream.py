@@ -0,0 +1,70 @@
+"""
+ツール出力のストリーミング
+実行プールのスレッドで動くジェネレーターから、イベントループへチャンクを1つずつ渡す
+
+    pipe = ChunkPipe(loop, maxsize=4)
+    worker = loop.run_in_executor(pool, pump, partial(tools.iterate, name, arguments), pipe)
+    while (item := await pipe.get()) is not ChunkPipe.END:
+        await send(item)
+    await worker            # ツールの例外はここで送出される
+
+- パイプの容量は maxsize 個までで、いっぱいのときはスレッド側が待つ
+  （クライアントへの送信が遅ければツールの生成も遅くなり、チャンクは溜まらない）
+- 受け手が途中でやめる場合は close() を呼ぶ。スレッドは次の put() で止まり、
+  ジェネレーターは close() される
+"""
+import asyncio
+import threading
+from typing import Any, Callable, Iterator
+
+
+class ChunkPipe:
+    """スレッド → イベントループの容量付きチャンネル"""
+
+    # 終端を表す値
+    END = object()
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.closed = threading.Event()
+
+    def put(self, item: Any) -> bool:
+        """（スレッドから）チャンクを渡す。受け手がやめていれば False"""
+        if self.closed.is_set():
+            return False
+        asyncio.run_coroutine_threadsafe(self.queue.put(item), self.loop).result()
+        return not self.closed.is_set()
+
+    async def get(self) -> Any:
+        """（イベントループで）次のチャンクを受け取る"""
+        return await self.queue.get()
+
+    def close(self) -> None:
+        """
+        （イベントループで）受け取りをやめる
+
+        溜まっているチャンクを捨てて空きを作り、待っているスレッドを先に進ませる。
+        """
+        self.closed.set()
+        while not self.queue.empty():
+            self.queue.get_nowait()
+
+
+def pump(open_iterator: Callable[[], Iterator[Any]], pipe: ChunkPipe) -> None:
+    """
+    （実行プールのスレッドで）ジェネレーターを作って回し、パイプに流す
+
+    例外で終わった場合も END を流してから送出する。
+    """
+    iterator = None
+    try:
+        iterator = open_iterator()
+        for item in iterator:
+            if not pipe.put(item):
+                break
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+        pipe.put(ChunkPipe.END)
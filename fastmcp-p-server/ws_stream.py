@@ -0,0 +1,102 @@
+"""
+WebSocketストリーム
+1本のWebSocket接続で JSON-RPC メッセージを双方向に運ぶ
+
+- 受信したフレーム（テキストまたはバイナリ）は1つが JSON-RPC メッセージ1つ
+  （バッチ配列も可）で、受信時刻とともに on_message に渡す
+- セッションのキューのフレーム（エンコード済みのJSON）を1つずつテキストフレームとして送る
+- クライアントの切断（websocket.disconnect）か stop() で終了し、on_close を呼ぶ
+
+SSEStreamResponse と同じく送信キューはセッションが持ち、このクラスは
+接続1本分の送受信だけを受け持ちます。圧縮は uvicorn が交渉する
+permessage-deflate に任せます。
+"""
+import asyncio
+from typing import Awaitable, Callable, Optional, Union
+
+from starlette.websockets import WebSocket
+
+# 受信したメッセージの処理（データ, 受信時刻）
+MessageHandler = Callable[[Union[str, bytes], float], Awaitable[None]]
+
+# 正常終了の close code
+NORMAL_CLOSURE = 1000
+
+
+class WebSocketStream:
+    """
+    WebSocket接続1本分の送受信
+
+    受信は on_message が終わるまで次のフレームを読まないため、
+    処理が詰まったクライアントの送信は TCP のレベルで待たされます。
+    """
+
+    # SSEStreamResponse と同じ属性（WebSocket ではフレーム単位の圧縮をしない）
+    compressor = None
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        frames: asyncio.Queue,
+        on_message: MessageHandler,
+        on_sent: Optional[Callable[[bytes], None]] = None,
+        on_close: Optional[Callable[[], None]] = None,
+    ):
+        self.websocket = websocket
+        self.frames = frames
+        self.on_message = on_message
+        self.on_sent = on_sent
+        self.on_close = on_close
+        self.stopped = asyncio.Event()
+        self.close_code = NORMAL_CLOSURE
+        # run() を抜けたら立つ
+        self.finished = asyncio.Event()
+
+    async def _send_frames(self) -> None:
+        send = self.websocket.send
+        while True:
+            frame = await self.frames.get()
+            await send({"type": "websocket.send", "text": frame.decode("utf-8")})
+            if self.on_sent is not None:
+                self.on_sent(frame)
+
+    async def _receive_messages(self) -> None:
+        loop = asyncio.get_running_loop()
+        receive = self.websocket.receive
+        while True:
+            message = await receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            data = message.get("text")
+            if data is None:
+                data = message.get("bytes")
+            if data:
+                await self.on_message(data, loop.time())
+
+    def stop(self, code: int = NORMAL_CLOSURE) -> None:
+        """サーバー側から接続を閉じる"""
+        self.close_code = code
+        self.stopped.set()
+
+    async def run(self) -> None:
+        """接続が閉じるまで送受信する（accept 済みであること）"""
+        sender = asyncio.ensure_future(self._send_frames())
+        receiver = asyncio.ensure_future(self._receive_messages())
+        stopper = asyncio.ensure_future(self.stopped.wait())
+        tasks = (sender, receiver, stopper)
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            disconnected = receiver.done() and not receiver.cancelled() and receiver.exception() is None
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if not disconnected:
+                # サーバー側から閉じる（送信エラーで終わった場合も close を試みる）
+                try:
+                    await self.websocket.close(self.close_code)
+                except (OSError, RuntimeError):
+                    pass
+            self.finished.set()
+            if self.on_close is not None:
+                self.on_close()
@@ -7,6 +7,7 @@ from src.core.exceptions import (
     MCPToolError,
     ToolNotFoundError,
     ToolExecutionError,
+    ToolTimeoutError,
     ValidationError
 )
 
@@ -16,5 +17,6 @@ __all__ = [
     "MCPToolError",
     "ToolNotFoundError",
     "ToolExecutionError",
+    "ToolTimeoutError",
     "ValidationError",
 ]
\ No newline at end of file
@@ -1,9 +1,12 @@
 """
 改善された基底クラス
 """
+import asyncio
+import time
 from abc import ABC, abstractmethod
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from mcp.types import Tool, TextContent
+from src.core.exceptions import ToolTimeoutError
 from src.utils.logger import StructuredLogger
 from src.utils.validators import InputValidator
 
@@ -11,6 +14,10 @@ from src.utils.validators import InputValidator
 class BaseTool(ABC):
     """すべてのツールの基底クラス"""
     
+    # 実行の期限（秒）。None なら無期限
+    # config/tools.yaml の tools.<name>.timeout で上書きできる
+    timeout: Optional[float] = None
+    
     def __init__(self):
         self.logger = StructuredLogger(self.__class__.__name__)
         self.validator = InputValidator()
@@ -49,10 +56,31 @@ class BaseTool(ABC):
         required = self.input_schema.get("required", [])
         self.validator.validate_required_fields(arguments, required)
     
-    async def execute(self, arguments: Dict[str, Any]) -> list[TextContent]:
+    def get_deadline(self, deadline: Optional[float] = None) -> Optional[float]:
+        """
+        実行の期限（time.monotonic() の時刻）を決める
+        
+        呼び出し元の期限（リクエストの受信時に決めたもの）があれば、
+        今から timeout 秒後と比べて早いほうを使う
+        """
+        if self.timeout is None:
+            return deadline
+        own_deadline = time.monotonic() + self.timeout
+        return own_deadline if deadline is None else min(deadline, own_deadline)
+    
+    async def execute(
+        self,
+        arguments: Dict[str, Any],
+        deadline: Optional[float] = None
+    ) -> list[TextContent]:
         """
         ツールを実行（テンプレートメソッドパターン）
+        
+        期限までに終わらない場合は ToolTimeoutError を送出する
+        （前処理の時間も期限に含まれ、期限切れなら実行しない）
         """
+        deadline = self.get_deadline(deadline)
+        
         # 1. バリデーション
         self.validate_input(arguments)
         
@@ -61,7 +89,7 @@ class BaseTool(ABC):
         
         # 3. 実行
         try:
-            result = await self._execute(arguments)
+            result = await self._execute_until(arguments, deadline)
         except Exception as e:
             self.logger.error("Tool execution failed", error=e)
             raise
@@ -71,6 +99,25 @@ class BaseTool(ABC):
         
         return result
     
+    async def _execute_until(
+        self,
+        arguments: Dict[str, Any],
+        deadline: Optional[float]
+    ) -> list[TextContent]:
+        """期限までに _execute が終わらなければ取り消して ToolTimeoutError"""
+        if deadline is None:
+            return await self._execute(arguments)
+        try:
+            return await asyncio.wait_for(
+                self._execute(arguments),
+                deadline - time.monotonic()
+            )
+        except asyncio.TimeoutError:
+            if time.monotonic() < deadline:
+                # ツール自身が送出した TimeoutError
+                raise
+            raise ToolTimeoutError(self.name, self.timeout) from None
+    
     async def before_execute(self, arguments: Dict[str, Any]) -> None:
         """実行前の処理（フック）"""
         pass
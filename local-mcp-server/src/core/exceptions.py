@@ -24,6 +24,15 @@ class ToolExecutionError(MCPToolError):
         )
 
 
+class ToolTimeoutError(MCPToolError):
+    """ツールの実行が期限までに終わらなかった"""
+    def __init__(self, tool_name: str, timeout: float = None):
+        self.tool_name = tool_name
+        self.timeout = timeout
+        limit = f" ({timeout:g}s)" if timeout is not None else ""
+        super().__init__(f"Tool '{tool_name}' did not finish before its deadline{limit}")
+
+
 class ValidationError(MCPToolError):
     """バリデーションエラー"""
     def __init__(self, message: str, field: str = None):
@@ -1,10 +1,10 @@
 """
 改善されたツールレジストリ
 """
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
 from mcp.types import Tool, TextContent
 from src.core.base import BaseTool
-from src.core.exceptions import ToolNotFoundError, ToolExecutionError
+from src.core.exceptions import ToolNotFoundError, ToolExecutionError, ToolTimeoutError
 from src.core.middleware import ToolMiddleware
 from src.utils.logger import StructuredLogger
 
@@ -40,6 +40,24 @@ class ToolRegistry:
             del self.tools[tool_name]
             self.logger.info(f"Tool unregistered", tool=tool_name)
     
+    def configure(self, config: Dict[str, Any]) -> None:
+        """
+        設定（config/tools.yaml）を登録済みのツールに反映
+        
+        tools.<name>.timeout があればその秒数を期限にする（0 は無期限）
+        なければ、ツール側で timeout を宣言していないツールに execution.default_timeout を使う
+        """
+        default_timeout = (config.get("execution") or {}).get("default_timeout")
+        tool_settings = config.get("tools") or {}
+        for name, tool in self.tools.items():
+            timeout = (tool_settings.get(name) or {}).get("timeout")
+            if timeout is None:
+                if tool.timeout is not None or default_timeout is None:
+                    continue
+                timeout = default_timeout
+            tool.timeout = float(timeout) if timeout else None
+            self.logger.info("Tool timeout configured", tool=name, timeout=tool.timeout)
+    
     def get_tool(self, name: str) -> Optional[BaseTool]:
         """ツールを取得"""
         return self.tools.get(name)
@@ -52,16 +70,23 @@ class ToolRegistry:
     async def execute_tool(
         self,
         name: str,
-        arguments: Dict
+        arguments: Dict,
+        deadline: Optional[float] = None
     ) -> List[TextContent]:
-        """ツールを実行"""
+        """
+        ツールを実行
+        
+        deadline はリクエストを受信した時点で決めた期限（time.monotonic() の時刻）
+        """
         tool = self.get_tool(name)
         
         if not tool:
             raise ToolNotFoundError(name)
         
         try:
-            return await tool.execute(arguments)
+            return await tool.execute(arguments, deadline=deadline)
+        except ToolTimeoutError:
+            raise
         except Exception as e:
             raise ToolExecutionError(name, e)
     
@@ -3,6 +3,7 @@
 MCPサーバーのエントリーポイント
 """
 import asyncio
+from pathlib import Path
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
 from mcp.types import Tool, TextContent
@@ -12,8 +13,12 @@ from src.core.exceptions import MCPToolError
 from src.tools.hello import HelloTool
 from src.tools.math import AddTool
 from src.tools.time import GetTimeTool
+from src.utils.config import load_config
 from src.utils.logger import StructuredLogger
 
+# 設定ファイル
+CONFIG_PATH = Path(__file__).resolve().parent.parent / "config" / "tools.yaml"
+
 # ロガーの初期化
 logger = StructuredLogger("server")
 
@@ -27,6 +32,7 @@ registry.register_multiple([
     AddTool(),
     GetTimeTool(),
 ])
+registry.configure(load_config(CONFIG_PATH))
 
 
 @app.list_tools()
@@ -3,5 +3,6 @@ Utilities module
 """
 from src.utils.logger import StructuredLogger
 from src.utils.validators import InputValidator
+from src.utils.config import load_config
 
-__all__ = ["StructuredLogger", "InputValidator"]
\ No newline at end of file
+__all__ = ["StructuredLogger", "InputValidator", "load_config"]
\ No newline at end of file
@@ -0,0 +1,15 @@
+"""
+設定ファイルの読み込み
+"""
+from pathlib import Path
+from typing import Any, Dict, Union
+import yaml
+
+
+def load_config(path: Union[str, Path]) -> Dict[str, Any]:
+    """YAMLの設定ファイルを読み込む（ファイルがなければ空の設定）"""
+    path = Path(path)
+    if not path.exists():
+        return {}
+    with path.open(encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
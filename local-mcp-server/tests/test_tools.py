@@ -1,11 +1,46 @@
 """
 ツールのユニットテスト
 """
+import asyncio
+import time
+from typing import Any, Dict
 import pytest
+from mcp.types import TextContent
+from src.core.base import BaseTool
+from src.core.registry import ToolRegistry
 from src.tools.hello import HelloTool
 from src.tools.math import AddTool
 from src.tools.time import GetTimeTool
-from src.core.exceptions import ValidationError
+from src.core.exceptions import ToolTimeoutError, ValidationError
+
+
+class SleepTool(BaseTool):
+    """指定した秒数だけ待つテスト用ツール"""
+    
+    def __init__(self):
+        super().__init__()
+        self.started = False
+    
+    @property
+    def name(self) -> str:
+        return "sleep"
+    
+    @property
+    def description(self) -> str:
+        return "指定した秒数だけ待ちます"
+    
+    @property
+    def input_schema(self) -> Dict[str, Any]:
+        return {
+            "type": "object",
+            "properties": {"seconds": {"type": "number"}},
+            "required": ["seconds"]
+        }
+    
+    async def _execute(self, arguments: Dict[str, Any]) -> list[TextContent]:
+        self.started = True
+        await asyncio.sleep(arguments["seconds"])
+        return [TextContent(type="text", text="done")]
 
 
 @pytest.mark.asyncio
@@ -73,4 +108,43 @@ def test_tool_definitions():
     # スキーマの確認
     assert "name" in hello.input_schema["properties"]
     assert "a" in add.input_schema["properties"]
-    assert "b" in add.input_schema["properties"]
\ No newline at end of file
+    assert "b" in add.input_schema["properties"]
+
+
+@pytest.mark.asyncio
+async def test_tool_timeout():
+    """期限のテスト"""
+    tool = SleepTool()
+    tool.timeout = 0.05
+    
+    # 正常系: 期限内に終わる
+    result = await tool.execute({"seconds": 0})
+    assert result[0].text == "done"
+    
+    # 異常系: 期限を過ぎる
+    with pytest.raises(ToolTimeoutError):
+        await tool.execute({"seconds": 1})
+    
+    # 異常系: 呼び出し元の期限が過ぎていれば実行しない
+    tool = SleepTool()
+    with pytest.raises(ToolTimeoutError):
+        await tool.execute({"seconds": 0}, deadline=time.monotonic() - 1)
+    assert not tool.started
+
+
+@pytest.mark.asyncio
+async def test_registry_timeout_config():
+    """設定ファイルの期限のテスト"""
+    registry = ToolRegistry()
+    registry.register_multiple([SleepTool(), HelloTool()])
+    registry.configure({
+        "execution": {"default_timeout": 30},
+        "tools": {"sleep": {"timeout": 0.05}}
+    })
+    
+    assert registry.get_tool("sleep").timeout == 0.05
+    assert registry.get_tool("hello").timeout == 30
+    
+    # 期限切れは ToolExecutionError に包まずに送出する
+    with pytest.raises(ToolTimeoutError):
+        await registry.execute_tool("sleep", {"seconds": 1})